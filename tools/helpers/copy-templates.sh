@@ -25,7 +25,7 @@
 #
 # Option: templates
 #    Possible values: 
-#        subjobfiles: ../templates/one-step.sh and ../templates/one-queue.sh are copied to ../../worflow/job-files/sub/
+#        subjobfiles: ../templates/one-step.sh, ../templates/one-queue.sh and ../templates/one-queue.py are copied to ../../worflow/job-files/sub/
 #        todofiles: ../templates/todo.all is copied to ../../workflow/ligand-collections/todo/todo.all and ../../workflow/ligand-collections/var/todo.original
 #        controlfiles: ../templates/all.ctrl is copied to ../../workflow/control/
 #        all: all of the above templates
@@ -71,7 +71,9 @@ central_todo_list_splitting_size="$(grep -m 1 "^central_todo_list_splitting_size
 if [[ "${1}" = "subjobfiles" || "${1}" = "all" ]]; then
     cp ../templates/one-step.sh ../../workflow/job-files/sub/
     cp ../templates/one-queue.sh ../../workflow/job-files/sub/
+    cp ../templates/one-queue.py ../../workflow/job-files/sub/
     chmod u+x ../../workflow/job-files/sub/one-step.sh
+    chmod u+x ../../workflow/job-files/sub/one-queue.py
 fi
 if [[ "${1}" = "todofiles" || "${1}" = "all" ]]; then
     split -a 4 -d -l ${central_todo_list_splitting_size} ../templates/todo.all ../../workflow/ligand-collections/todo/todo.all.
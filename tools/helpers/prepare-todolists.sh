@@ -319,6 +319,46 @@ if [[ ! "$*" = *"quiet"* ]]; then
     echo
 fi
 
+# Claiming the collections from the dispatcher if it is used
+todo_dispatcher="$(grep -m 1 "^todo_dispatcher=" ${vf_controlfile_temp} | tr -d '[[:space:]]' | awk -F '[=#]' '{print $2}')"
+if [[ "${todo_dispatcher}" == "sqlite" ]] && [[ -f ../../workflow/ligand-collections/todo/dispatcher.db ]]; then
+    start_time_seconds="$(date +%s)"
+    dispatcher_queues=""
+    for queue_no_2 in $(seq 1 ${steps_per_job}); do
+        for queue_no_3 in $(seq 1 ${queues_per_step}); do
+            dispatcher_queues="${dispatcher_queues} ${queue_no_1}-${queue_no_2}-${queue_no_3}:${ligands_todo[${queue_no_2}0000${queue_no_3}]}"
+        done
+    done
+    if (cd .. && python3 vf_dispatcher.py claim --ligands-per-queue ${ligands_todo_per_queue} --ligands-per-step ${ligands_per_refilling_step} ${dispatcher_queues}) > ${todo_file_temp}.claimed; then
+        while read -r queue_no next_ligand_collection no_to_add; do
+            queue_no_2="$(echo ${queue_no} | awk -F '-' '{print $2}')"
+            queue_no_3="$(echo ${queue_no} | awk -F '-' '{print $3}')"
+            mkdir -p ../../workflow/ligand-collections/todo/${queue_no_1}/${queue_no_2}/
+            echo "${next_ligand_collection} ${no_to_add}" >> ../../workflow/ligand-collections/todo/${queue_no_1}/${queue_no_2}/${queue_no}
+            ligands_todo[${queue_no_2}0000${queue_no_3}]=$(( ${ligands_todo[${queue_no_2}0000${queue_no_3}]} + ${no_to_add} ))
+            queue_collection_numbers[${queue_no_2}0000${queue_no_3}]=$((queue_collection_numbers[${queue_no_2}0000${queue_no_3}] + 1 ))
+        done < ${todo_file_temp}.claimed
+
+        if [[ ! "$*" = *"quiet"* ]]; then
+            for queue_no_2 in $(seq 1 ${steps_per_job}); do
+                for queue_no_3 in $(seq 1 ${queues_per_step}); do
+                    queue_no="${queue_no_1}-${queue_no_2}-${queue_no_3}"
+                    echo "After (re)filling the todolists the queue ${queue_no} has ${ligands_todo[${queue_no_2}0000${queue_no_3}]} ligands todo distributed in ${queue_collection_numbers[${queue_no_2}0000${queue_no_3}]} collections."
+                done
+            done
+            echo
+            echo "The todo lists for the queues were (re)filled from the dispatcher in $(($(date +%s)-start_time_seconds)) second(s)."
+            echo
+        fi
+
+        # The central todo list was not touched
+        trap - EXIT
+        rm -r ${VF_TMPDIR_FAST}/${USER}/VFVS/${VF_JOBLETTER}/${VF_JOBLINE_NO}/prepare-todolists/ || true
+        exit 0
+    else
+        echo " * Warning: The dispatcher could not be used. Using the central todo list instead."
+    fi
+fi
 
 # Hiding the to-do.all list
 status="false";
@@ -0,0 +1,1152 @@
+#!/usr/bin/env python3
+
+# Copyright (C) 2019 Christoph Gorgulla
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# This file is part of VirtualFlow.
+#
+# VirtualFlow is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# VirtualFlow is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with VirtualFlow.  If not, see <https://www.gnu.org/licenses/>.
+
+# ---------------------------------------------------------------------------
+#
+# Description: Queue runner for the batch system path (queue_runner=python)
+#
+#              Does the same as one-queue.sh (same environment variables from
+#              one-step.sh, same todo/current/done files, status files,
+#              output files and resume behaviour) but in one process: the
+#              ligands of a collection are indexed in memory when the
+#              collection is extracted, the ligand checks, summaries and
+#              status files are handled in-process, and only the docking
+#              program is started per docking. The energy check of the best
+#              poses runs once per collection (vf_energy_check.py). Docking
+#              scenarios with adfr or plants are left to one-queue.sh
+#              (one-step.sh falls back to it).
+#
+# Revision history:
+# 2026-10-19  Original version
+#
+# ---------------------------------------------------------------------------
+
+
+import os
+import re
+import sys
+import glob
+import gzip
+import time
+import shutil
+import signal
+import tarfile
+import subprocess
+import traceback
+
+# Run from the tools folder like one-queue.sh
+sys.path.insert(0, os.getcwd())
+import vf_blocktar
+import vf_controlfile
+import vf_energy_check
+import vf_dispatcher
+import vf_compact_segments
+
+
+TIME_FORMAT = r" Docking timings \n-------------------------------------- \n user real system \n %U %e %S \n------------------------------------- \n"
+
+# Programs writing their log to stdout, the first line with ' 1 ' holds the best score
+VINA_PROGRAMS = ["qvina02", "qvina_w", "vina", "vina_carb", "vina_xb"]
+SUPPORTED_DOCKING_PROGRAMS = "vina, qvina02, qvina_w, smina, vina_xb, vina_carb, gwovina"
+BASH_ONLY_PROGRAMS = ["adfr", "plants"]
+
+little_time = False
+
+
+def time_near_limit(signum, frame):
+
+    # As in one-queue.sh the queue stops before the next ligand or docking
+    global little_time
+    little_time = True
+
+
+def get_control_value(controlfile, key):
+
+    # Same as grep -m 1 "^key=" | tr -d '[[:space:]]' | awk -F '[=#]' '{print $2}'
+    return vf_controlfile.get_control_value(controlfile, key)
+
+
+def date():
+
+    return time.strftime("%a %b %e %H:%M:%S %Z %Y")
+
+
+def time_ms():
+
+    return int(time.time() * 1000)
+
+
+def error_response_std(ctx, message):
+
+    print("Error was trapped", file=sys.stderr)
+    print("Error in python script one-queue.py", file=sys.stderr)
+    print(message, file=sys.stderr)
+
+    if(ctx['error_response'] == "next_job"):
+        print("\n * Trying to stop this queue without causing the jobline to fail...")
+        sys.exit(0)
+    elif(ctx['error_response'] == "fail"):
+        print("\n * Trying to stop this queue and causing the jobline to fail...")
+        sys.exit(1)
+
+    print("\n * Ignoring error. Trying to continue...")
+
+
+def determine_controlfile(ctx):
+
+    try:
+        controlfile = vf_controlfile.find_controlfile(ctx['jobline_no'])
+    except FileNotFoundError:
+        print("Error: No relevant control file was found...", file=sys.stderr)
+        sys.exit(1)
+
+    # Updating the temporary copy only if the control file changed
+    stat = os.stat(controlfile)
+    if(ctx.get('controlfile') != controlfile or ctx.get('controlfile_stat') != (stat.st_mtime_ns, stat.st_size)
+       or not os.path.isfile(ctx['controlfile_temp'])):
+        shutil.copyfile(controlfile, ctx['controlfile_temp'])
+        ctx['controlfile'] = controlfile
+        ctx['controlfile_stat'] = (stat.st_mtime_ns, stat.st_size)
+
+
+def get_config(ctx):
+
+    determine_controlfile(ctx)
+    controlfile = ctx['controlfile_temp']
+
+    ctx['minimum_time_remaining'] = int(get_control_value(controlfile, "minimum_time_remaining")) * 60
+    ctx['keep_ligand_summary_logs'] = get_control_value(controlfile, "keep_ligand_summary_logs")
+    ctx['ligand_check_interval'] = int(get_control_value(controlfile, "ligand_check_interval"))
+    ctx['cpus_per_queue'] = get_control_value(controlfile, "cpus_per_queue")
+    ctx['outputfiles_level'] = get_control_value(controlfile, "outputfiles_level")
+    ctx['ligand_library_format'] = get_control_value(controlfile, "ligand_library_format")
+    ctx['collection_folder'] = get_control_value(controlfile, "collection_folder")
+
+    names = get_control_value(controlfile, "docking_scenario_names").split(":")
+    programs = get_control_value(controlfile, "docking_scenario_programs").split(":")
+    replicas = get_control_value(controlfile, "docking_scenario_replicas").split(":")
+
+    if(len(names) != len(programs)):
+        print("ERROR:", file=sys.stderr)
+        print(f" * Some variables specified in the controlfile {controlfile} are not compatible.", file=sys.stderr)
+        print(f" * The variable docking_scenario_names has {len(names)} entries.", file=sys.stderr)
+        print(f" * The variable docking_scenario_programs has {len(programs)} entries.", file=sys.stderr)
+        sys.exit(1)
+    if(len(names) != len(replicas)):
+        print("ERROR:", file=sys.stderr)
+        print(f" * Some variables specified in the controlfile {controlfile} are not compatible.", file=sys.stderr)
+        print(f" * The variable docking_scenario_names has {len(names)} entries.", file=sys.stderr)
+        print(f" * The variable docking_scenario_replicas has {len(replicas)} entries.", file=sys.stderr)
+        sys.exit(1)
+
+    ctx['docking_scenarios'] = [
+        {'name': name, 'program': program, 'replicas': int(replica_count)}
+        for name, program, replica_count in zip(names, programs, replicas)
+    ]
+
+    for scenario in ctx['docking_scenarios']:
+        if(scenario['program'] in BASH_ONLY_PROGRAMS):
+            print(f"ERROR: The docking program {scenario['program']} is only supported by one-queue.sh (queue_runner=bash).", file=sys.stderr)
+            sys.exit(1)
+
+    if ctx['ligand_library_format'] not in ["mol2", "pdbqt"]:
+        print("ERROR:", file=sys.stderr)
+        print(f" * A variable specified in the controlfile {controlfile} are not specified correctly.", file=sys.stderr)
+        print(f" * The variable ligand_library_format has value {ctx['ligand_library_format']}.", file=sys.stderr)
+        print(" * Supported values are currently 'pdbqt' and 'mol2'", file=sys.stderr)
+        sys.exit(1)
+
+    ctx['energy_check'] = get_control_value(controlfile, "energy_check")
+    if(ctx['energy_check'] == "true"):
+        energy_max = get_control_value(controlfile, "energy_max")
+        if not re.match(r'^[0-9]+$', energy_max):
+            error_response_std(ctx, f" Error: The value ({energy_max}) for variable energy_max which was specified in the controlfile is invalid...")
+        ctx['energy_max'] = float(energy_max or 0)
+    elif(ctx['energy_check'] != "false"):
+        error_response_std(ctx, f" Error: The value ({ctx['energy_check']}) for variable energy_check which was specified in the controlfile is invalid...")
+
+
+# Paths
+
+def get_collection(collection_full_name):
+
+    tranche, collection_id = collection_full_name.split("_", 1)
+
+    return {
+        'full_name': collection_full_name,
+        'metatranche': tranche[:2],
+        'tranche': tranche,
+        'id': collection_id
+    }
+
+
+def get_output_folder(ctx, status, scenario_name, kind, collection):
+
+    return f"{ctx['queue_tmp']}/output-files/{status}/{scenario_name}/{kind}/{collection['metatranche']}/{collection['tranche']}"
+
+
+def get_status_path(ctx, collection):
+
+    return f"{ctx['queue_tmp']}/workflow/ligand-collections/ligand-lists/{collection['metatranche']}/{collection['tranche']}/{collection['id']}.status"
+
+
+def get_ligand_folder(ctx, collection):
+
+    return f"{ctx['queue_tmp']}/input-files/ligands/{collection['metatranche']}/{collection['tranche']}"
+
+
+def get_queue_list(ctx, list_type):
+
+    return f"../workflow/ligand-collections/{list_type}/{ctx['queue_no_1']}/{ctx['queue_no_2']}/{ctx['queue_no']}"
+
+
+def reset_folder(folder):
+
+    if os.path.isdir(folder):
+        for name in os.listdir(folder):
+            path = os.path.join(folder, name)
+            if os.path.isdir(path) and not os.path.islink(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+    else:
+        os.makedirs(folder)
+
+
+def remove_path(path):
+
+    try:
+        if os.path.isdir(path) and not os.path.islink(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+    except OSError:
+        pass
+
+
+# Tar helpers (tar -czf / tar -rf of one-queue.sh)
+
+def create_tar_gz(archive_path, base_dir, member):
+
+    with tarfile.open(archive_path, "w:gz") as tar:
+        tar.add(os.path.join(base_dir, member), arcname=member)
+
+
+def append_to_tar(archive_path, base_dir, member):
+
+    with tarfile.open(archive_path, "a", format=tarfile.GNU_FORMAT) as tar:
+        tar.add(os.path.join(base_dir, member), arcname=member)
+
+
+def store_in_tranche_archive(ctx, tmp_folder, shared_folder, collection, members):
+
+    # outputfiles_level=tranche: the shared tranche archive is copied, extended
+    # with the collection files and moved back
+    os.makedirs(shared_folder, exist_ok=True)
+    tranche_archive = f"{collection['tranche']}.tar"
+    if os.path.isfile(os.path.join(shared_folder, tranche_archive)):
+        shutil.copyfile(os.path.join(shared_folder, tranche_archive), os.path.join(tmp_folder, tranche_archive))
+    for member in members:
+        if os.path.exists(os.path.join(tmp_folder, member)):
+            try:
+                append_to_tar(os.path.join(tmp_folder, tranche_archive), tmp_folder, member)
+            except (OSError, tarfile.TarError) as err:
+                print(f"Error adding {member} to {tranche_archive}: {err}", file=sys.stderr)
+    shutil.move(os.path.join(tmp_folder, tranche_archive), os.path.join(shared_folder, tranche_archive))
+
+
+def store_completed_files(ctx, tmp_folder, shared_folder, collection, filenames):
+
+    # tmp_folder and shared_folder are the metatranche folders
+    if(ctx['outputfiles_level'] == "tranche"):
+        store_in_tranche_archive(ctx, tmp_folder, shared_folder, collection,
+                                 [f"{collection['tranche']}/{filename}" for filename in filenames])
+    elif(ctx['outputfiles_level'] == "segments"):
+        # One immutable file per collection, merged by vf_compact_segments.py
+        for filename in filenames:
+            path = os.path.join(tmp_folder, collection['tranche'], filename)
+            if os.path.isfile(path):
+                vf_compact_segments.add_segment(path, shared_folder, collection['tranche'], ctx['queue_no'])
+    elif(ctx['outputfiles_level'] == "collection"):
+        os.makedirs(os.path.join(shared_folder, collection['tranche']), exist_ok=True)
+        for filename in filenames:
+            path = os.path.join(tmp_folder, collection['tranche'], filename)
+            if os.path.isfile(path):
+                shutil.copy(path, os.path.join(shared_folder, collection['tranche']))
+    else:
+        print(f" * Error: The variable 'outputfiles_level' in the controlfile {ctx['controlfile']} has an invalid value ({ctx['outputfiles_level']})", file=sys.stderr)
+        sys.exit(1)
+
+
+# Ligand collections
+
+def next_ligand_collection(ctx):
+
+    ctx['needs_cleaning'] = False
+
+    determine_controlfile(ctx)
+
+    if(get_control_value(ctx['controlfile_temp'], "stop_after_collection") == "true"):
+        print()
+        print(f"This job line was stopped by the stop_after_collection flag in the controlfile for the queue {ctx['queue_no']} ({ctx['controlfile']}).")
+        print()
+        end_queue(ctx, 0)
+    print()
+    print("A new collection has to be used if there is one.")
+
+    todo_path = get_queue_list(ctx, "todo")
+    if not os.path.isfile(todo_path):
+        print()
+        print("This queue is stopped because there exists no todo file for this queue.")
+        print()
+        end_queue(ctx, 0)
+
+    with open(todo_path, "r") as read_file:
+        lines = read_file.readlines()
+
+    entries = [line for line in lines if line.strip() != ""]
+    if(len(entries) == 0 and get_control_value(ctx['controlfile_temp'], "todo_dispatcher") == "sqlite"
+       and os.path.isfile(vf_dispatcher.DISPATCHER_PATH)):
+        # Claiming more collections from the dispatcher
+        try:
+            ligands = int(get_control_value(ctx['controlfile_temp'], "ligands_per_refilling_step"))
+            if(vf_dispatcher.claim_for_queue(ctx['queue_no'], todo_path, ligands) > 0):
+                with open(todo_path, "r") as read_file:
+                    lines = read_file.readlines()
+                entries = [line for line in lines if line.strip() != ""]
+        except Exception as err:
+            print(f" * Warning: The dispatcher could not be used: {err}")
+    if(len(entries) == 0):
+        print()
+        print("This queue is stopped because there is no more ligand collection.")
+        print()
+        end_queue(ctx, 0)
+
+    fields = entries[0].split()
+    collection_full_name = fields[0]
+    collection_length = fields[1] if len(fields) > 1 else ""
+
+    # Removing the new collection from the todo file
+    pattern = re.compile(rf'{re.escape(collection_full_name)}\b')
+    with open(f"{todo_path}.tmp", "w") as write_file:
+        write_file.writelines(line for line in lines if not pattern.search(line))
+    os.replace(f"{todo_path}.tmp", todo_path)
+
+    with open(get_queue_list(ctx, "current"), "w") as write_file:
+        write_file.write(f"{collection_full_name} {collection_length}\n")
+
+    ctx['collection'] = get_collection(collection_full_name)
+    ctx['new_collection'] = True
+
+    print(f"The new ligand collection is {collection_full_name}.")
+
+
+def extract_collection_archive(ctx, collection):
+
+    metatranche_folder = f"{ctx['queue_tmp']}/input-files/ligands/{collection['metatranche']}"
+    collection_archive = f"{metatranche_folder}/{collection['tranche']}/{collection['id']}.tar"
+    tranche_archive = f"{metatranche_folder}/{collection['tranche']}.tar"
+    shared_tranche_archive = f"{ctx['collection_folder']}/{collection['metatranche']}/{collection['tranche']}.tar"
+
+    if not os.path.isfile(tranche_archive):
+        if not os.path.isfile(shared_tranche_archive):
+            error_response_std(ctx, f" * Error: The tranch archive file {shared_tranche_archive} does not exist...")
+            return None
+        for name in os.listdir(metatranche_folder):
+            remove_path(os.path.join(metatranche_folder, name))
+        shutil.copyfile(shared_tranche_archive, tranche_archive)
+
+    # Only the collection is needed from the tranche archive
+    os.makedirs(os.path.dirname(collection_archive), exist_ok=True)
+    with tarfile.open(tranche_archive, "r:") as tar:
+        member = tar.extractfile(f"{collection['tranche']}/{collection['id']}.tar.gz")
+        with gzip.open(member, "rb") as read_file, open(collection_archive, "wb") as write_file:
+            shutil.copyfileobj(read_file, write_file)
+
+    return collection_archive
+
+
+def prepare_collection_files_tmp(ctx):
+
+    collection = ctx['collection']
+    ctx['summaries'] = {scenario['name']: {} for scenario in ctx['docking_scenarios']}
+    ctx['status_lines'] = []
+    ctx['energy_pending'] = []
+
+    metatranche_folder = f"{ctx['queue_tmp']}/input-files/ligands/{collection['metatranche']}"
+    if not os.path.isdir(metatranche_folder):
+        os.makedirs(metatranche_folder)
+    elif os.path.isdir(get_ligand_folder(ctx, collection)):
+        shutil.rmtree(get_ligand_folder(ctx, collection))
+
+    for scenario in ctx['docking_scenarios']:
+        for kind in ["results", "logfiles", "summaries"]:
+            reset_folder(f"{get_output_folder(ctx, 'incomplete', scenario['name'], kind, collection)}/{collection['id']}")
+    reset_folder(os.path.dirname(get_status_path(ctx, collection)))
+
+    try:
+        collection_archive = extract_collection_archive(ctx, collection)
+    except (OSError, KeyError, tarfile.TarError) as err:
+        print(err, file=sys.stderr)
+        collection_archive = None
+    if(collection_archive is None or not os.path.isfile(collection_archive)):
+        error_response_std(ctx, f" * Error: The ligand collection {collection['full_name']} could not be prepared.")
+        ctx['ligands'] = []
+        ctx['ligand_positions'] = {}
+        return
+
+    # Extracting all the ligands at the same time and indexing them in the
+    # order of the archive (the order in which they are docked)
+    ligands = []
+    with tarfile.open(collection_archive, "r:") as tar:
+        members = tar.getmembers()
+        tar.extractall(get_ligand_folder(ctx, collection))
+    for member in members:
+        parts = member.name.split("/")
+        if member.isfile() and len(parts) > 1:
+            ligand = parts[1].split(".", 1)[0]
+            if(len(ligands) == 0 or ligands[-1] != ligand):
+                ligands.append(ligand)
+    ctx['ligands'] = ligands
+    ctx['ligand_positions'] = {ligand: index for index, ligand in enumerate(ligands)}
+
+    # Copying the required old output files if continuing an old collection
+    for scenario in ctx['docking_scenarios']:
+        if(ctx['new_collection']):
+            remove_path(get_summary_journal_path(ctx, scenario))
+            continue
+        for kind in ["results", "logfiles"]:
+            archive = f"../output-files/incomplete/{scenario['name']}/{kind}/{collection['metatranche']}/{collection['tranche']}/{collection['id']}.tar.gz"
+            try:
+                with tarfile.open(archive, "r:gz") as tar:
+                    tar.extractall(get_output_folder(ctx, "incomplete", scenario['name'], kind, collection))
+            except (OSError, tarfile.TarError):
+                pass
+        summary = f"../output-files/incomplete/{scenario['name']}/summaries/{collection['metatranche']}/{collection['tranche']}/{collection['id']}.txt.gz"
+        try:
+            with gzip.open(summary, "rt") as read_file:
+                ctx['summaries'][scenario['name']] = read_summary(read_file)
+        except OSError:
+            pass
+        replay_summary_journal(ctx, scenario)
+
+    shared_status = f"../workflow/ligand-collections/ligand-lists/{collection['metatranche']}/{collection['tranche']}/{collection['id']}.status"
+    if os.path.isfile(shared_status):
+        shutil.copy(shared_status, os.path.dirname(get_status_path(ctx, collection)))
+        with open(shared_status, "r") as read_file:
+            ctx['status_lines'] = [line.rstrip("\n") for line in read_file if line.strip() != ""]
+        restore_energy_checks(ctx)
+
+
+def clean_collection_files_tmp(ctx):
+
+    if not ctx['needs_cleaning']:
+        return
+
+    run_energy_checks(ctx)
+
+    collection = ctx['collection']
+    queue_tmp = ctx['queue_tmp']
+
+    if(ctx['collection_complete']):
+
+        print(f"\n * The collection {collection['full_name']} has been completed.")
+        print("    * Storing and cleaning corresponding files...")
+
+        for scenario in ctx['docking_scenarios']:
+            name = scenario['name']
+
+            # Results (with a member index for retrieving single poses, see vf_blocktar.py)
+            complete_folder = get_output_folder(ctx, "complete", name, "results", collection)
+            os.makedirs(complete_folder, exist_ok=True)
+            try:
+                vf_blocktar.create_archive(f"{complete_folder}/{collection['id']}.tar.gz",
+                                           get_output_folder(ctx, "incomplete", name, "results", collection), collection['id'])
+            except OSError as err:
+                print(f"Error creating the results archive: {err}", file=sys.stderr)
+            store_completed_files(ctx, os.path.dirname(complete_folder),
+                                  f"../output-files/complete/{name}/results/{collection['metatranche']}", collection,
+                                  [f"{collection['id']}.tar.gz", f"{collection['id']}.tar.gz{vf_blocktar.INDEX_SUFFIX}"])
+            remove_path(f"{complete_folder}/{collection['id']}.tar.gz")
+            remove_path(f"{complete_folder}/{collection['id']}.tar.gz{vf_blocktar.INDEX_SUFFIX}")
+            remove_path(f"{get_output_folder(ctx, 'incomplete', name, 'results', collection)}/{collection['id']}")
+
+            # Summaries
+            complete_folder = get_output_folder(ctx, "complete", name, "summaries", collection)
+            os.makedirs(complete_folder, exist_ok=True)
+            write_summary(ctx, scenario)
+            compress_summary(ctx, scenario, f"{complete_folder}/{collection['id']}.txt.gz")
+            store_completed_files(ctx, os.path.dirname(complete_folder),
+                                  f"../output-files/complete/{name}/summaries/{collection['metatranche']}", collection,
+                                  [f"{collection['id']}.txt.gz"])
+            remove_path(f"{complete_folder}/{collection['id']}.txt.gz")
+            remove_path(f"{get_output_folder(ctx, 'incomplete', name, 'summaries', collection)}/{collection['id']}")
+            remove_path(get_summary_journal_path(ctx, scenario))
+
+            # Logfiles
+            complete_folder = get_output_folder(ctx, "complete", name, "logfiles", collection)
+            os.makedirs(complete_folder, exist_ok=True)
+            try:
+                create_tar_gz(f"{complete_folder}/{collection['id']}.tar.gz",
+                              get_output_folder(ctx, "incomplete", name, "logfiles", collection), collection['id'])
+            except OSError as err:
+                print(f"Error creating the logfiles archive: {err}", file=sys.stderr)
+            store_completed_files(ctx, os.path.dirname(complete_folder),
+                                  f"../output-files/complete/{name}/logfiles/{collection['metatranche']}", collection,
+                                  [f"{collection['id']}.tar.gz"])
+            remove_path(f"{complete_folder}/{collection['id']}.tar.gz")
+            remove_path(f"{get_output_folder(ctx, 'incomplete', name, 'logfiles', collection)}/{collection['id']}")
+
+            # Removing incomplete shared files
+            for kind, suffix in [("results", ".tar.gz"), ("summaries", ".txt.gz"), ("logfiles", ".tar.gz")]:
+                path = f"../output-files/incomplete/{name}/{kind}/{collection['metatranche']}/{collection['tranche']}/{collection['id']}{suffix}"
+                if os.path.isfile(path):
+                    remove_path(path)
+
+        # Updating the ligand collection files
+        open(get_queue_list(ctx, "current"), "w").close()
+        status_lines = ctx['status_lines']
+        ligands_started = len({line.split()[0] for line in status_lines})
+        ligands_succeeded = len({line.split()[0] for line in status_lines if "succeeded" in line})
+        ligands_failed = len({line.split()[0] for line in status_lines if "failed" in line})
+        dockings_succeeded = sum(1 for line in status_lines if "succeeded" in line)
+        dockings_failed = sum(1 for line in status_lines if "failed" in line)
+        with open(get_queue_list(ctx, "done"), "a") as write_file:
+            write_file.write(f"{collection['full_name']} was completed by queue {ctx['queue_no']} on {date()}. "
+                             f"Ligands-started:{ligands_started} Ligands-succeeded:{ligands_succeeded} Ligands-failed:{ligands_failed}  "
+                             f"Dockings-started:{len(status_lines)} Dockings-succeeded:{dockings_succeeded} Dockings-failed:{dockings_failed}\n")
+
+        if(ctx['keep_ligand_summary_logs'] == "true"):
+
+            # Compressing and archiving the status file (next to the output
+            # files of the last docking scenario, as one-queue.sh does)
+            status_path = get_status_path(ctx, collection)
+            with open(status_path, "rb") as read_file, gzip.open(f"{status_path}.gz", "wb") as write_file:
+                shutil.copyfileobj(read_file, write_file)
+            os.remove(status_path)
+            store_completed_files(ctx, f"{queue_tmp}/workflow/ligand-collections/ligand-lists/{collection['metatranche']}",
+                                  f"../output-files/complete/{ctx['docking_scenarios'][-1]['name']}/ligand-lists/{collection['metatranche']}",
+                                  collection, [f"{collection['id']}.status.gz"])
+
+        # Removing possible old status files
+        remove_path(f"../workflow/ligand-collections/ligand-lists/{collection['metatranche']}/{collection['tranche']}/{collection['id']}.status")
+
+    else:
+        for scenario in ctx['docking_scenarios']:
+            name = scenario['name']
+
+            for kind in ["results", "logfiles"]:
+                folder = get_output_folder(ctx, "incomplete", name, kind, collection)
+                try:
+                    create_tar_gz(f"{folder}/{collection['id']}.tar.gz", folder, collection['id'])
+                except OSError as err:
+                    print(f"Error creating the {kind} archive: {err}", file=sys.stderr)
+                shared_folder = f"../output-files/incomplete/{name}/{kind}/{collection['metatranche']}/{collection['tranche']}"
+                os.makedirs(shared_folder, exist_ok=True)
+                shutil.copy(f"{folder}/{collection['id']}.tar.gz", shared_folder)
+                remove_path(f"{folder}/{collection['id']}")
+
+            folder = get_output_folder(ctx, "incomplete", name, "summaries", collection)
+            write_summary(ctx, scenario)
+            compress_summary(ctx, scenario, f"{folder}/{collection['id']}.txt.gz")
+            shared_folder = f"../output-files/incomplete/{name}/summaries/{collection['metatranche']}/{collection['tranche']}"
+            os.makedirs(shared_folder, exist_ok=True)
+            shutil.copy(f"{folder}/{collection['id']}.txt.gz", shared_folder)
+            remove_path(f"{folder}/{collection['id']}")
+            remove_path(get_summary_journal_path(ctx, scenario))
+
+        shared_folder = f"../workflow/ligand-collections/ligand-lists/{collection['metatranche']}/{collection['tranche']}"
+        os.makedirs(shared_folder, exist_ok=True)
+        if os.path.isfile(get_status_path(ctx, collection)):
+            shutil.copy(get_status_path(ctx, collection), shared_folder)
+
+    remove_path(get_ligand_folder(ctx, collection))
+    for path in glob.glob(f"{get_status_path(ctx, collection)}*"):
+        remove_path(path)
+
+    ctx['needs_cleaning'] = False
+
+
+def clean_queue_files_tmp(ctx):
+
+    queue_folder = f"{ctx['queue_tmp']}/workflow/output-files/queues/{ctx['queue_no_1']}/{ctx['queue_no_2']}"
+    for path in glob.glob(f"{queue_folder}/queue-{ctx['queue_no']}.*"):
+        try:
+            shutil.copy(path, f"../workflow/output-files/queues/{ctx['queue_no_1']}/{ctx['queue_no_2']}/")
+        except OSError:
+            pass
+    time.sleep(1)
+    shutil.rmtree(ctx['queue_tmp'], ignore_errors=True)
+
+
+def end_queue(ctx, exitcode):
+
+    if(ctx['ligand_index'] > 1 and not ctx['new_collection']):
+        clean_collection_files_tmp(ctx)
+
+    sys.exit(exitcode)
+
+
+# Status file
+
+def write_status_lines(ctx):
+
+    status_path = get_status_path(ctx, ctx['collection'])
+    with open(f"{status_path}.tmp", "w") as write_file:
+        for line in ctx['status_lines']:
+            write_file.write(f"{line}\n")
+    os.replace(f"{status_path}.tmp", status_path)
+
+
+def add_status_line(ctx, line):
+
+    ctx['status_lines'].append(line)
+    with open(get_status_path(ctx, ctx['collection']), "a") as write_file:
+        write_file.write(f"{line}\n")
+    ctx['needs_cleaning'] = True
+
+
+def update_ligand_list_end(ctx, ligand, scenario_index, replica_index, entry, start_time_ms):
+
+    total_time_ms = time_ms() - start_time_ms
+    prefix = f"{ligand} {scenario_index} {replica_index} processing"
+
+    for index, line in enumerate(ctx['status_lines']):
+        if line.startswith(prefix):
+            ctx['status_lines'][index] = f"{ligand} {scenario_index} {replica_index} {entry} total-time:{total_time_ms}"
+    write_status_lines(ctx)
+
+    scenario = ctx['docking_scenarios'][scenario_index - 1]
+    print()
+    if(entry == "succeeded"):
+        print(f"Docking type  {scenario_index}/{len(ctx['docking_scenarios'])} ({scenario['name']}), replica {replica_index}/{scenario['replicas']} of {ligand} completed successfully on {date()}.")
+    else:
+        print(f"Docking type  {scenario_index}/{len(ctx['docking_scenarios'])} ({scenario['name']}), replica {replica_index}/{scenario['replicas']} of {ligand} {entry} on {date()}.")
+    print(f"Total time for this docking ({ligand}) in ms: {total_time_ms}")
+    print()
+
+
+# Summaries
+#
+# The scores of a collection are accumulated in memory and the formatted
+# summary is written once when the collection files are stored
+# (clean_collection_files_tmp). Each score is first appended to a journal
+# next to the summary, from which the scores are restored if the collection
+# files are prepared again before the summary was written.
+
+def read_summary(lines):
+
+    rows = {}
+    for line in lines:
+        fields = line.split()
+        if(len(fields) < 2 or fields[0] == "Tranch"):
+            continue
+        rows[fields[1]] = fields
+
+    return rows
+
+
+def format_summary(header, rows):
+
+    # Aligned like 'column -t'
+    table = [header] + rows
+    widths = {}
+    for fields in table:
+        for index, field in enumerate(fields[:-1]):
+            widths[index] = max(widths.get(index, 0), len(field))
+
+    return "".join("  ".join([field.ljust(widths[index]) for index, field in enumerate(fields[:-1])] + fields[-1:]) + "\n"
+                   for fields in table)
+
+
+def get_summary_path(ctx, scenario):
+
+    return f"{get_output_folder(ctx, 'incomplete', scenario['name'], 'summaries', ctx['collection'])}/{ctx['collection']['id']}.txt"
+
+
+def write_summary(ctx, scenario):
+
+    rows = ctx['summaries'][scenario['name']]
+    if(len(rows) == 0):
+        return
+
+    header = ["Tranch", "Compound", "SMILES", "average-score", "maximum-score", "number-of-dockings"] + \
+        [f"score-replica-{replica_index}" for replica_index in range(1, scenario['replicas'] + 1)]
+
+    summary_path = get_summary_path(ctx, scenario)
+    with open(f"{summary_path}.tmp", "w") as write_file:
+        write_file.write(format_summary(header, list(rows.values())))
+    os.replace(f"{summary_path}.tmp", summary_path)
+
+
+def compress_summary(ctx, scenario, path):
+
+    summary_path = get_summary_path(ctx, scenario)
+    if not os.path.isfile(summary_path):
+        return
+    with open(summary_path, "rb") as read_file, gzip.open(path, "wb") as write_file:
+        shutil.copyfileobj(read_file, write_file)
+
+
+def format_awk_number(value):
+
+    # awk prints integral values without decimals and others with %.6g
+    if(value == int(value)):
+        return str(int(value))
+    return f"{value:.6g}"
+
+
+def get_summary_journal_path(ctx, scenario):
+
+    return f"{get_summary_path(ctx, scenario)}.journal"
+
+
+def add_summary_score(ctx, scenario, ligand, smiles, replica_index, score_value):
+
+    rows = ctx['summaries'][scenario['name']]
+    collection_full_name = ctx['collection']['full_name']
+    score = float(score_value)
+
+    if(replica_index == 1 or ligand not in rows):
+        rows[ligand] = [collection_full_name, ligand, smiles, f"{score:3.1f}", f"{score:3.1f}", "1", f"{score:3.1f}"]
+    else:
+        scores = rows[ligand][6:] + [score_value]
+        values = [float(value) for value in scores]
+        score_maximum = scores[values.index(min(values))]
+        rows[ligand] = [collection_full_name, ligand, smiles, format_awk_number(sum(values) / len(values)),
+                        score_maximum, str(replica_index)] + scores
+
+
+def update_summary(ctx, scenario, ligand, smiles, replica_index, score_value):
+
+    with open(get_summary_journal_path(ctx, scenario), "a") as write_file:
+        write_file.write(f"{ligand} {smiles} {replica_index} {score_value}\n")
+
+    add_summary_score(ctx, scenario, ligand, smiles, replica_index, score_value)
+
+
+def replay_summary_journal(ctx, scenario):
+
+    try:
+        with open(get_summary_journal_path(ctx, scenario), "r") as read_file:
+            for line in read_file:
+                fields = line.split()
+                # A line cut short by a crash is skipped
+                if(len(fields) == 4 and line.endswith("\n")):
+                    add_summary_score(ctx, scenario, fields[0], fields[1], int(fields[2]), fields[3])
+    except OSError:
+        pass
+
+
+# Ligands
+
+def check_ligand(ctx, ligand):
+
+    # The checks of one-queue.sh on a single read of the ligand file.
+    # Returns the failure entry (or None) and the SMILES.
+    ligand_path = f"{get_ligand_folder(ctx, ctx['collection'])}/{ctx['collection']['id']}/{ligand}.{ctx['ligand_library_format']}"
+    with open(ligand_path, "r", errors="replace") as read_file:
+        content = read_file.read()
+
+    if " B " in content:
+        return "failed(ligand_elements:B)", None
+    lower_content = content.lower()
+    if " si " in lower_content:
+        return "failed(ligand_elements:Si)", None
+    if " sn " in lower_content:
+        return "failed(ligand_elements:Sn)", None
+
+    coordinates = set()
+    smiles = None
+    for line in content.splitlines():
+        if "ATOM" in line:
+            coordinate = tuple((line.split()[5:8] + ["", "", ""])[:3])
+            if coordinate in coordinates:
+                return "failed(ligand_coordinates)", None
+            coordinates.add(coordinate)
+        if(smiles is None and "SMILES" in line):
+            smiles = line.split()[-1]
+
+    return None, smiles or "NA"
+
+
+def get_next_ligand(ctx, last_ligand):
+
+    position = ctx['ligand_positions'].get(last_ligand)
+    if(position is None or position + 1 >= len(ctx['ligands'])):
+        return None
+
+    return ctx['ligands'][position + 1]
+
+
+def get_resume_point(ctx):
+
+    # Where to continue a collection from the last line of its status file
+    if(len(ctx['status_lines']) == 0):
+        return ctx['ligands'][0] if ctx['ligands'] else None, 1, 1
+
+    fields = ctx['status_lines'][-1].split()
+    last_ligand = fields[0]
+
+    if(len(fields) >= 4 and fields[3] == "processing"):
+        # The last docking might not have completed, it is run again
+        ctx['status_lines'].pop()
+        write_status_lines(ctx)
+        return last_ligand, int(fields[1]), int(fields[2])
+
+    if(len(fields) >= 3 and fields[1].isdigit() and fields[2].isdigit()):
+        scenario_index, replica_index = int(fields[1]), int(fields[2])
+        if(replica_index < ctx['docking_scenarios'][scenario_index - 1]['replicas']):
+            return last_ligand, scenario_index, replica_index + 1
+        if(scenario_index < len(ctx['docking_scenarios'])):
+            return last_ligand, scenario_index + 1, 1
+
+    return get_next_ligand(ctx, last_ligand), 1, 1
+
+
+def check_time(ctx, message):
+
+    if(little_time):
+        print()
+        print(f"{message} because a signal was caught indicating this queue should stop now.")
+        print()
+        end_queue(ctx, 0)
+
+    if(ctx['timelimit_seconds'] - int(time.time()) + ctx['start_time_seconds'] < ctx['minimum_time_remaining']):
+        print()
+        print(f"{message} because there is less than the minimum time remaining ({ctx['minimum_time_remaining']} s) for the job (by internal calculation).")
+        print()
+        end_queue(ctx, 0)
+
+
+# Docking
+
+def get_docking_command(ctx, scenario, ligand_path, output_base):
+
+    program = scenario['program']
+    config = f"{ctx['step_tmp']}/input-files/../input-files/{scenario['name']}/config.txt"
+    log_path = output_base['log']
+    result_path = output_base['result']
+
+    if program in VINA_PROGRAMS or program.startswith("gwovina"):
+        binary = "gwovina" if program.startswith("gwovina") else program
+        command = ["bin/time_bin", "-f", TIME_FORMAT, f"bin/{binary}", "--cpu", ctx['cpus_per_queue'],
+                   "--config", config, "--ligand", ligand_path, "--out", result_path]
+        return command, log_path
+
+    if program.startswith("smina"):
+        command = ["bin/time_bin", "-f", TIME_FORMAT, "bin/smina", "--cpu", ctx['cpus_per_queue'],
+                   "--config", config, "--ligand", ligand_path, "--out", result_path,
+                   "--out_flex", f"{output_base['result_base']}.flexres.pdb", "--log", log_path,
+                   "--atom_terms", f"{output_base['result_base']}.atomterms"]
+        return command, None
+
+    return None, None
+
+
+def get_score(scenario, log_path):
+
+    try:
+        with open(log_path, "r", errors="replace") as read_file:
+            lines = read_file.readlines()
+    except OSError:
+        return None
+
+    if scenario['program'].startswith("smina"):
+        for line in reversed(lines):
+            if line.startswith("1    "):
+                return line.split()[1]
+        return None
+
+    for line in lines:
+        if " 1 " in line:
+            return line.split()[1]
+
+    return None
+
+
+# Energy check
+#
+# The best poses of a collection are checked together when the collection
+# files are stored (clean_collection_files_tmp). Until then the dockings have
+# the status 'energy-check:pending score:<score>' and their scores are not in
+# the summary. The pending dockings are restored from the status file when a
+# collection is continued.
+
+def add_energy_check(ctx, scenario_index, ligand, replica_index, result_path, score_value, smiles):
+
+    ctx['energy_pending'].append({
+        'scenario_index': scenario_index,
+        'ligand': ligand,
+        'replica_index': replica_index,
+        'result': result_path,
+        'score': score_value,
+        'smiles': smiles
+    })
+
+
+def restore_energy_checks(ctx):
+
+    collection = ctx['collection']
+    for line in ctx['status_lines']:
+        fields = line.split()
+        if(len(fields) < 5 or fields[3] != "energy-check:pending" or not fields[4].startswith("score:")):
+            continue
+        ligand, scenario_index, replica_index = fields[0], int(fields[1]), int(fields[2])
+        scenario = ctx['docking_scenarios'][scenario_index - 1]
+        result_path = f"{get_output_folder(ctx, 'incomplete', scenario['name'], 'results', collection)}/{collection['id']}/{ligand}_replica-{replica_index}.{ctx['ligand_library_format']}"
+        add_energy_check(ctx, scenario_index, ligand, replica_index, result_path,
+                         fields[4].split(":", 1)[1], check_ligand(ctx, ligand)[1] or "NA")
+
+
+def run_energy_checks(ctx):
+
+    if(len(ctx['energy_pending']) == 0):
+        return
+
+    print(f"\n * Checking the potential energy of the best docking poses of {len(ctx['energy_pending'])} dockings.")
+    try:
+        results = vf_energy_check.check_energies([pending['result'] for pending in ctx['energy_pending']],
+                                                 ctx['energy_max'], work_dir=ctx['queue_tmp'])
+    except RuntimeError as err:
+        # The dockings stay pending and are checked when the collection is continued
+        error_response_std(ctx, f" Error: The energy check could not be run ({err})...")
+        return
+
+    for pending in ctx['energy_pending']:
+        ligand, scenario_index, replica_index = pending['ligand'], pending['scenario_index'], pending['replica_index']
+        passed, energy = results[pending['result']]
+        if(passed):
+            update_summary(ctx, ctx['docking_scenarios'][scenario_index - 1], ligand, pending['smiles'], replica_index, pending['score'])
+            entry = "succeeded"
+        else:
+            print(f"    * Warning: Docking type {scenario_index}, replica {replica_index} of {ligand} did not pass the energy-check (energy: {energy}).")
+            remove_path(pending['result'])
+            entry = "energy-check:failed"
+
+        prefix = f"{ligand} {scenario_index} {replica_index} energy-check:pending"
+        for index, line in enumerate(ctx['status_lines']):
+            if line.startswith(prefix):
+                ctx['status_lines'][index] = f"{ligand} {scenario_index} {replica_index} {entry} {line.split()[-1]}"
+
+    write_status_lines(ctx)
+    ctx['energy_pending'] = []
+
+
+def run_docking(ctx, scenario, scenario_index, ligand, replica_index):
+
+    collection = ctx['collection']
+    ligand_path = f"{get_ligand_folder(ctx, collection)}/{collection['id']}/{ligand}.{ctx['ligand_library_format']}"
+    result_base = f"{get_output_folder(ctx, 'incomplete', scenario['name'], 'results', collection)}/{collection['id']}/{ligand}_replica-{replica_index}"
+    output_base = {
+        'result_base': result_base,
+        'result': f"{result_base}.{ctx['ligand_library_format']}",
+        'log': f"{get_output_folder(ctx, 'incomplete', scenario['name'], 'logfiles', collection)}/{collection['id']}/{ligand}_replica-{replica_index}"
+    }
+
+    start_time_ms = time_ms()
+    add_status_line(ctx, f"{ligand} {scenario_index} {replica_index} processing")
+
+    print()
+    print(f"   ***   Starting new docking run: docking type {scenario_index}/{len(ctx['docking_scenarios'])} ({scenario['name']}), replica {replica_index}/{scenario['replicas']}   ***   ")
+    print()
+
+    command, stdout_path = get_docking_command(ctx, scenario, ligand_path, output_base)
+    if(command is None):
+        print(f"An error occurred during the docking procedure ({scenario['name']}).", file=sys.stderr)
+        print(f"An unsupported docking program ({scenario['program']}) has been specified.", file=sys.stderr)
+        print(f"Supported docking programs are: {SUPPORTED_DOCKING_PROGRAMS}", file=sys.stderr)
+        print("Aborting the virtual screening procedure...", file=sys.stderr)
+        update_ligand_list_end(ctx, ligand, scenario_index, replica_index, "failed(docking_program)", start_time_ms)
+        sys.exit(1)
+
+    # stderr goes to the queue log and to output.tmp as with the tee in one-queue.sh
+    sys.stdout.flush()
+    try:
+        if(stdout_path is not None):
+            with open(stdout_path, "w") as stdout_file:
+                process = subprocess.run(command, stdout=stdout_file, stderr=subprocess.PIPE)
+        else:
+            process = subprocess.run(command, stderr=subprocess.PIPE)
+        returncode = process.returncode
+        stderr = process.stderr
+    except OSError as err:
+        returncode = 1
+        stderr = f"{err}\n".encode()
+    with open(f"{ctx['queue_tmp']}/output.tmp", "wb") as write_file:
+        write_file.write(stderr)
+    sys.stdout.write(stderr.decode(errors="replace"))
+
+    score_value = get_score(scenario, output_base['log'])
+
+    if(returncode != 0 or score_value is None):
+        print(f"An error occurred during the docking procedure ({scenario['name']}).")
+        print("Skipping this ligand and continuing with next one.")
+        update_ligand_list_end(ctx, ligand, scenario_index, replica_index, "failed(docking)", start_time_ms)
+        return
+
+    if(ctx['energy_check'] == "true" and ctx['ligand_library_format'] == "pdbqt"):
+        # Checked with the other dockings of the collection, see run_energy_checks
+        add_energy_check(ctx, scenario_index, ligand, replica_index, output_base['result'], score_value, ctx['smiles'])
+        update_ligand_list_end(ctx, ligand, scenario_index, replica_index, f"energy-check:pending score:{score_value}", start_time_ms)
+        return
+
+    update_summary(ctx, scenario, ligand, ctx['smiles'], replica_index, score_value)
+    update_ligand_list_end(ctx, ligand, scenario_index, replica_index, "succeeded", start_time_ms)
+
+
+def process_ligand(ctx, ligand, scenario_index_start, replica_index_start):
+
+    failure, smiles = check_ligand(ctx, ligand)
+    if(failure is not None):
+        print()
+        if failure.startswith("failed(ligand_elements"):
+            print(f"The ligand contains elements ({failure.split(':')[1][:-1]}) which cannot be handled by quickvina.")
+        else:
+            print("The ligand contains elements with the same coordinates.")
+        print("Skipping this ligand and continuing with next one.")
+        add_status_line(ctx, f"{ligand} {failure}")
+        print(f"Ligand {ligand} {failure} on {date()}.")
+        return
+    ctx['smiles'] = smiles
+
+    for scenario_index in range(scenario_index_start, len(ctx['docking_scenarios']) + 1):
+        scenario = ctx['docking_scenarios'][scenario_index - 1]
+        for replica_index in range(replica_index_start, scenario['replicas'] + 1):
+            check_time(ctx, "This queue was ended")
+            run_docking(ctx, scenario, scenario_index, ligand, replica_index)
+        replica_index_start = 1
+
+
+def process(ctx):
+
+    ctx['ligand_index'] = 0
+    current_path = get_queue_list(ctx, "current")
+
+    while True:
+
+        ctx['new_collection'] = False
+        ctx['collection_complete'] = False
+        ctx['ligand_index'] += 1
+        scenario_index_start, replica_index_start = 1, 1
+
+        if(ctx['ligand_index'] == 1):
+            if not os.path.isfile(current_path) or os.path.getsize(current_path) == 0:
+                next_ligand_collection(ctx)
+                prepare_collection_files_tmp(ctx)
+                next_ligand = ctx['ligands'][0] if ctx['ligands'] else None
+            else:
+                # Continuing the collection of the last job of this queue
+                with open(current_path, "r") as read_file:
+                    ctx['collection'] = get_collection(read_file.read().split()[0])
+                prepare_collection_files_tmp(ctx)
+                ctx['needs_cleaning'] = True
+                next_ligand, scenario_index_start, replica_index_start = get_resume_point(ctx)
+        else:
+            last_ligand = ctx['status_lines'][-1].split()[0] if ctx['status_lines'] else None
+            next_ligand = get_next_ligand(ctx, last_ligand)
+
+        if(next_ligand is None):
+            ctx['collection_complete'] = True
+            clean_collection_files_tmp(ctx)
+            next_ligand_collection(ctx)
+            prepare_collection_files_tmp(ctx)
+            next_ligand = ctx['ligands'][0] if ctx['ligands'] else None
+            scenario_index_start, replica_index_start = 1, 1
+            if(next_ligand is None):
+                error_response_std(ctx, f" * Error: The ligand collection {ctx['collection']['full_name']} has no ligands.")
+                continue
+
+        print("")
+        print(f"      Ligand {ctx['ligand_index']} of job {ctx['old_job_no']} belonging to collection {ctx['collection']['full_name']}: {next_ligand}")
+        print("*****************************************************************************************")
+
+        if(ctx['ligand_index'] % ctx['ligand_check_interval'] == 0):
+            determine_controlfile(ctx)
+            if(get_control_value(ctx['controlfile_temp'], "stop_after_next_check_interval") == "true"):
+                print()
+                print(f" * This queue will be stopped due to the stop_after_next_check_interval flag in the controlfile {ctx['controlfile']}.")
+                print()
+                end_queue(ctx, 0)
+
+        check_time(ctx, " * This queue will be ended")
+
+        process_ligand(ctx, next_ligand, scenario_index_start, replica_index_start)
+
+
+def main():
+
+    for signum in [signal.SIGHUP, signal.SIGINT, signal.SIGQUIT, signal.SIGUSR1, signal.SIGUSR2, signal.SIGTERM]:
+        signal.signal(signum, time_near_limit)
+
+    step_tmp = f"{os.environ['VF_TMPDIR']}/{os.environ['USER']}/VFVS/{os.environ['VF_JOBLETTER']}/{os.environ['VF_QUEUE_NO_12']}"
+
+    ctx = {
+        'step_tmp': step_tmp,
+        'queue_tmp': f"{step_tmp}/{os.environ['VF_QUEUE_NO']}",
+        'queue_no': os.environ['VF_QUEUE_NO'],
+        'queue_no_1': os.environ['VF_QUEUE_NO_1'],
+        'queue_no_2': os.environ['VF_QUEUE_NO_2'],
+        'jobline_no': int(os.environ['VF_JOBLINE_NO']),
+        'old_job_no': os.environ.get('VF_OLD_JOB_NO', ""),
+        'timelimit_seconds': int(os.environ['VF_TIMELIMIT_SECONDS']),
+        'start_time_seconds': int(os.environ['VF_START_TIME_SECONDS']),
+        'error_response': os.environ.get('VF_ERROR_RESPONSE', "fail"),
+        'ligand_index': 0,
+        'new_collection': False,
+        'needs_cleaning': False,
+        'status_lines': []
+    }
+    ctx['controlfile_temp'] = f"{ctx['queue_tmp']}/controlfile"
+    os.makedirs(ctx['queue_tmp'], exist_ok=True)
+
+    try:
+        get_config(ctx)
+
+        print()
+        print()
+        print("*****************************************************************************************")
+        print(f"              Beginning of a new job (job {ctx['old_job_no']}) in queue {ctx['queue_no']}")
+        print("*****************************************************************************************")
+        print()
+        print("Control files in use")
+        print("-------------------------")
+        print(f"Controlfile = {ctx['controlfile_temp']}")
+        print()
+        print(f"Contents of the VF_CONTROLFILE_TEMP {ctx['controlfile_temp']}")
+        print("-----------------------------------------------")
+        with open(ctx['controlfile_temp'], "r") as read_file:
+            print(read_file.read())
+        print()
+
+        process(ctx)
+
+    except Exception:
+        traceback.print_exc()
+        error_response_std(ctx, "Error in the queue runner")
+        sys.exit(1)
+
+    finally:
+        sys.stdout.flush()
+        clean_queue_files_tmp(ctx)
+
+
+if __name__ == '__main__':
+    main()
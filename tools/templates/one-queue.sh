@@ -253,34 +253,181 @@ update_ligand_list_end() {
     ligand_list_entry=""
 }
 
-update_summary() {
+# Energy check of a whole collection
+# If python3 is available, the best poses of a collection are checked together with one vf_energy_check.py call when the collection files are stored (clean_collection_files_tmp), instead of one obenergy call per docking (obabel_check_energy).
+# Until then the dockings have the status 'energy-check:pending score:<score>' and their scores are not in the summary. The pending dockings are read from the status file, so they are also checked when a collection is continued.
+check_energy_collection() {
     trap 'error_response_std $LINENO' ERR
 
-    if [ ! -f ${VF_TMPDIR}/${USER}/VFVS/${VF_JOBLETTER}/${VF_QUEUE_NO_12}/${VF_QUEUE_NO}/output-files/incomplete/${docking_scenario_name}/summaries/${next_ligand_collection_metatranch}/${next_ligand_collection_tranch}/${next_ligand_collection_ID}.txt ]; then
-        printf "Tranch   Compound   SMILES   average-score   maximum-score   number-of-dockings" >> ${VF_TMPDIR}/${USER}/VFVS/${VF_JOBLETTER}/${VF_QUEUE_NO_12}/${VF_QUEUE_NO}/output-files/incomplete/${docking_scenario_name}/summaries/${next_ligand_collection_metatranch}/${next_ligand_collection_tranch}/${next_ligand_collection_ID}.txt
-        for k in $(seq 1 ${docking_replica_index_end}); do 
-            printf "   score-replica-$k" >>  ${VF_TMPDIR}/${USER}/VFVS/${VF_JOBLETTER}/${VF_QUEUE_NO_12}/${VF_QUEUE_NO}/output-files/incomplete/${docking_scenario_name}/summaries/${next_ligand_collection_metatranch}/${next_ligand_collection_tranch}/${next_ligand_collection_ID}.txt
-        done
-        printf "\n" >> ${VF_TMPDIR}/${USER}/VFVS/${VF_JOBLETTER}/${VF_QUEUE_NO_12}/${VF_QUEUE_NO}/output-files/incomplete/${docking_scenario_name}/summaries/${next_ligand_collection_metatranch}/${next_ligand_collection_tranch}/${next_ligand_collection_ID}.txt
+    # Variables
+    local collection_metatranch="${1}"
+    local collection_tranch="${2}"
+    local collection_ID="${3}"
+    local queue_tmp=${VF_TMPDIR}/${USER}/VFVS/${VF_JOBLETTER}/${VF_QUEUE_NO_12}/${VF_QUEUE_NO}
+    local status_file=${queue_tmp}/workflow/ligand-collections/ligand-lists/${collection_metatranch}/${collection_tranch}/${collection_ID}.status
+    local result_list=${queue_tmp}/energy-check.list
+    local ligand scenario_index replica_index entry score rest scenario_name result_file energy check smiles
+    local -A pending=()
+
+    if ! grep -q " energy-check:pending " ${status_file} 2>/dev/null; then
+        return
     fi
-    if [ "${docking_replica_index}" -eq "1" ]; then
-        printf "${next_ligand_collection} ${next_ligand} ${next_ligand_smiles} %3.1f %3.1f %5s %3.1f\n" "${score_value}" "${score_value}" "1" "${score_value}" >> ${VF_TMPDIR}/${USER}/VFVS/${VF_JOBLETTER}/${VF_QUEUE_NO_12}/${VF_QUEUE_NO}/output-files/incomplete/${docking_scenario_name}/summaries/${next_ligand_collection_metatranch}/${next_ligand_collection_tranch}/${next_ligand_collection_ID}.txt
+
+    # Result files of the pending dockings
+    : > ${result_list}
+    while read -r ligand scenario_index replica_index entry score rest; do
+        if [ "${entry}" == "energy-check:pending" ]; then
+            scenario_name=${docking_scenario_names[((scenario_index - 1))]}
+            result_file=${queue_tmp}/output-files/incomplete/${scenario_name}/results/${collection_metatranch}/${collection_tranch}/${collection_ID}/${ligand}_replica-${replica_index}.${ligand_library_format}
+            pending[${result_file}]="${ligand} ${scenario_index} ${replica_index} ${score#score:}"
+            echo "${result_file}" >> ${result_list}
+        fi
+    done < ${status_file}
+
+    # Printing information
+    echo -e "\n * Checking the potential energy of the best docking poses of ${#pending[@]} dockings."
+
+    if ! python3 vf_energy_check.py --energy-max ${energy_max} --list ${result_list} > ${result_list}.out; then
+        # The dockings stay pending and are checked when the collection is continued
+        echo " Error: The energy check could not be run..." | tee -a /dev/stderr
+        rm ${result_list} ${result_list}.out &> /dev/null || true
+        error_response_std $LINENO
+        return
+    fi
+
+    # Each line of the output: <result file> <energy|NA> energy-check:success|failed
+    while read -r result_file energy check; do
+        read -r ligand scenario_index replica_index score <<< "${pending[${result_file}]}"
+        scenario_name=${docking_scenario_names[((scenario_index - 1))]}
+
+        if [ "${check}" == "energy-check:success" ]; then
+
+            # Updating the summary (as update_summary)
+            smiles="$(grep SMILES ${queue_tmp}/input-files/ligands/${collection_metatranch}/${collection_tranch}/${collection_ID}/${ligand}.${ligand_library_format} 2>/dev/null | awk '{print $NF}' || true)"
+            if [ "${replica_index}" -eq "1" ]; then
+                printf -v score "%3.1f" "${score}"
+            fi
+            echo "${ligand} ${smiles:-NA} ${replica_index} ${score}" >> ${queue_tmp}/output-files/incomplete/${scenario_name}/summaries/${collection_metatranch}/${collection_tranch}/${collection_ID}.txt.journal
+            add_summary_score "${scenario_name}" "${ligand}" "${smiles:-NA}" "${replica_index}" "${score}"
+            entry="succeeded"
+        else
+
+            # Printing some information
+            echo "    * Warning: Docking type ${scenario_index}, replica ${replica_index} of ${ligand} did not pass the energy-check (energy: ${energy})."
+
+            # Removing the pdb file
+            rm ${result_file} &>/dev/null || true
+            entry="energy-check:failed"
+        fi
+
+        # Updating the ligand list
+        perl -pi -e "s/^${ligand} ${scenario_index} ${replica_index} energy-check:pending score:\\S+/${ligand} ${scenario_index} ${replica_index} ${entry}/" ${status_file}
+    done < ${result_list}.out
+
+    rm ${result_list} ${result_list}.out &> /dev/null || true
+}
+
+# Summaries
+# The scores of a collection are accumulated in memory (summary_scores, summary_smiles, summary_ligands) and the summary file is written once when the collection files are stored (clean_collection_files_tmp).
+# Each score is first appended to a journal next to the summary file, from which the scores are restored if the collection files are prepared again before the summary file was written.
+add_summary_score() {
+
+    # Variables
+    local scenario_name="${1}"
+    local ligand="${2}"
+    local smiles="${3}"
+    local replica_index="${4}"
+    local score="${5}"
+
+    if [[ -z "${summary_scores[${scenario_name}/${ligand}]+x}" ]]; then
+        summary_ligands[${scenario_name}]="${summary_ligands[${scenario_name}]:-} ${ligand}"
+        summary_scores[${scenario_name}/${ligand}]="${score}"
+    elif [[ "${replica_index}" -eq "1" ]]; then
+        summary_scores[${scenario_name}/${ligand}]="${score}"
     else
-        scores_previous=$(grep ${next_ligand} ${VF_TMPDIR}/${USER}/VFVS/${VF_JOBLETTER}/${VF_QUEUE_NO_12}/${VF_QUEUE_NO}/output-files/incomplete/${docking_scenario_name}/summaries/${next_ligand_collection_metatranch}/${next_ligand_collection_tranch}/${next_ligand_collection_ID}.txt | tr -s " " | cut -d " " -f 7-)
-        read -a scores_all <<< "${scores_previous} ${score_value}"
-        
-        # Computing the new average value
-        score_average=$(echo "${scores_all[@]}" | tr -s " " "\n" | awk '{ sum += $1 } END { if (NR > 0) print sum / NR }')
-        
-        # Computing the new maximum value
-        score_maximum=$(echo "${scores_all[@]}" | awk '{m=$1;for(i=1;i<=NF;i++)if($i<m)m=$i;print m}')
-        
-        # Upating the line
-        scores_all_expanded="${scores_all[@]}"
-        perl -pi -e "s/${next_ligand_collection} *${next_ligand} .*/${next_ligand_collection} ${next_ligand} ${next_ligand_smiles} ${score_average} ${score_maximum} ${docking_replica_index} ${scores_all_expanded}/g" ${VF_TMPDIR}/${USER}/VFVS/${VF_JOBLETTER}/${VF_QUEUE_NO_12}/${VF_QUEUE_NO}/output-files/incomplete/${docking_scenario_name}/summaries/${next_ligand_collection_metatranch}/${next_ligand_collection_tranch}/${next_ligand_collection_ID}.txt
+        summary_scores[${scenario_name}/${ligand}]="${summary_scores[${scenario_name}/${ligand}]} ${score}"
+    fi
+    summary_smiles[${scenario_name}/${ligand}]="${smiles}"
+}
+
+update_summary() {
+    trap 'error_response_std $LINENO' ERR
+
+    # The first score is stored with one decimal
+    if [ "${docking_replica_index}" -eq "1" ]; then
+        printf -v score_value "%3.1f" "${score_value}"
     fi
-    column -t ${VF_TMPDIR}/${USER}/VFVS/${VF_JOBLETTER}/${VF_QUEUE_NO_12}/${VF_QUEUE_NO}/output-files/incomplete/${docking_scenario_name}/summaries/${next_ligand_collection_metatranch}/${next_ligand_collection_tranch}/${next_ligand_collection_ID}.txt > ${VF_TMPDIR}/${USER}/VFVS/${VF_JOBLETTER}/${VF_QUEUE_NO_12}/${VF_QUEUE_NO}/output-files/incomplete/${docking_scenario_name}/summaries/${next_ligand_collection_metatranch}/${next_ligand_collection_tranch}/${next_ligand_collection_ID}.txt.tmp
-    mv ${VF_TMPDIR}/${USER}/VFVS/${VF_JOBLETTER}/${VF_QUEUE_NO_12}/${VF_QUEUE_NO}/output-files/incomplete/${docking_scenario_name}/summaries/${next_ligand_collection_metatranch}/${next_ligand_collection_tranch}/${next_ligand_collection_ID}.txt.tmp ${VF_TMPDIR}/${USER}/VFVS/${VF_JOBLETTER}/${VF_QUEUE_NO_12}/${VF_QUEUE_NO}/output-files/incomplete/${docking_scenario_name}/summaries/${next_ligand_collection_metatranch}/${next_ligand_collection_tranch}/${next_ligand_collection_ID}.txt
+
+    echo "${next_ligand} ${next_ligand_smiles:-NA} ${docking_replica_index} ${score_value}" >> ${VF_TMPDIR}/${USER}/VFVS/${VF_JOBLETTER}/${VF_QUEUE_NO_12}/${VF_QUEUE_NO}/output-files/incomplete/${docking_scenario_name}/summaries/${next_ligand_collection_metatranch}/${next_ligand_collection_tranch}/${next_ligand_collection_ID}.txt.journal
+    add_summary_score "${docking_scenario_name}" "${next_ligand}" "${next_ligand_smiles:-NA}" "${docking_replica_index}" "${score_value}"
+}
+
+# Restoring the scores of a collection from its summary file and journal
+load_summary() {
+
+    # Variables
+    local scenario_name="${1}"
+    local summary_file="${2}"
+
+    if [ -f ${summary_file} ]; then
+        while read -r collection ligand smiles score_average score_maximum number_of_dockings scores; do
+            if [[ -z "${scores}" || "${collection}" == "Tranch" ]]; then
+                continue
+            fi
+            summary_ligands[${scenario_name}]="${summary_ligands[${scenario_name}]:-} ${ligand}"
+            summary_scores[${scenario_name}/${ligand}]="${scores}"
+            summary_smiles[${scenario_name}/${ligand}]="${smiles}"
+        done < ${summary_file}
+    fi
+    if [ -f ${summary_file}.journal ]; then
+        while read -r ligand smiles replica_index score; do
+            if [ -n "${score}" ]; then
+                add_summary_score "${scenario_name}" "${ligand}" "${smiles}" "${replica_index}" "${score}"
+            fi
+        done < ${summary_file}.journal
+    fi
+}
+
+# Writing the summary file of a collection
+write_summary() {
+    trap 'error_response_std $LINENO' ERR
+
+    # Variables
+    local scenario_name="${1}"
+    local collection="${2}"
+    local summary_file="${3}"
+    local replicas=1
+
+    if [ -z "${summary_ligands[${scenario_name}]:-}" ]; then
+        return
+    fi
+    for i in "${!docking_scenario_names[@]}"; do
+        if [ "${docking_scenario_names[${i}]}" == "${scenario_name}" ]; then
+            replicas=${docking_scenario_replicas_total[${i}]}
+        fi
+    done
+
+    {
+        printf "Tranch   Compound   SMILES   average-score   maximum-score   number-of-dockings"
+        for k in $(seq 1 ${replicas}); do
+            printf "   score-replica-$k"
+        done
+        printf "\n"
+        for ligand in ${summary_ligands[${scenario_name}]}; do
+            echo "${collection} ${ligand} ${summary_smiles[${scenario_name}/${ligand}]} ${summary_scores[${scenario_name}/${ligand}]}"
+        done | awk '{
+            if (NF == 4) {
+                printf "%s %s %s %3.1f %3.1f %5s %3.1f\n", $1, $2, $3, $4, $4, "1", $4
+            } else {
+                sum = 0; m = $4
+                for (i = 4; i <= NF; i++) { sum += $i; if ($i < m) m = $i }
+                printf "%s %s %s %s %s %s", $1, $2, $3, sum / (NF - 3), m, NF - 3
+                for (i = 4; i <= NF; i++) printf " %s", $i
+                printf "\n"
+            }
+        }'
+    } | column -t > ${summary_file}.tmp
+    mv ${summary_file}.tmp ${summary_file}
 }
 
 # Obtaining the next ligand collection.
@@ -292,7 +439,7 @@ next_ligand_collection() {
     determine_controlfile
 
     # Checking if this jobline should be stopped now
-    stop_after_collection="$(grep -m 1 "^stop_after_collection=" ${VF_CONTROLFILE_TEMP} | tr -d '[[:space:]]' | awk -F '[=#]' '{print $2}')"
+    stop_after_collection="${control_values[stop_after_collection]:-}"
     if [ "${stop_after_collection}" = "true" ]; then
         echo
         echo "This job line was stopped by the stop_after_collection flag in the controlfile for the queue ${VF_QUEUE_NO} (${VF_CONTROLFILE})."
@@ -316,6 +463,16 @@ next_ligand_collection() {
 
        # Checking if there is one more ligand collection to be done
         no_collections_remaining="$(grep -cv '^\s*$' ../workflow/ligand-collections/todo/${VF_QUEUE_NO_1}/${VF_QUEUE_NO_2}/${VF_QUEUE_NO} || true)"
+        if [[ "${no_collections_remaining}" = "0" ]]; then
+
+            # Claiming more collections from the dispatcher if it is used
+            todo_dispatcher="${control_values[todo_dispatcher]:-}"
+            if [[ "${todo_dispatcher}" == "sqlite" ]] && [[ -f ../workflow/ligand-collections/todo/dispatcher.db ]]; then
+                ligands_per_refilling_step="${control_values[ligands_per_refilling_step]:-}"
+                python3 vf_dispatcher.py claim --ligands-per-queue ${ligands_per_refilling_step} --ligands-per-step ${ligands_per_refilling_step} ${VF_QUEUE_NO} | awk '{print $2, $3}' >> ../workflow/ligand-collections/todo/${VF_QUEUE_NO_1}/${VF_QUEUE_NO_2}/${VF_QUEUE_NO} || true
+                no_collections_remaining="$(grep -cv '^\s*$' ../workflow/ligand-collections/todo/${VF_QUEUE_NO_1}/${VF_QUEUE_NO_2}/${VF_QUEUE_NO} || true)"
+            fi
+        fi
         if [[ "${no_collections_remaining}" = "0" ]]; then
             # Renaming the todo file to its original name
             no_more_ligand_collection
@@ -436,6 +593,18 @@ prepare_collection_files_tmp() {
             tar -xzf ../output-files/incomplete/${docking_scenario_name}/logfiles/${next_ligand_collection_metatranch}/${next_ligand_collection_tranch}/${next_ligand_collection_ID}.tar.gz -C ${VF_TMPDIR}/${USER}/VFVS/${VF_JOBLETTER}/${VF_QUEUE_NO_12}/${VF_QUEUE_NO}/output-files/incomplete/${docking_scenario_name}/logfiles/${next_ligand_collection_metatranch}/${next_ligand_collection_tranch}/ || true
         fi
     done
+
+    # Restoring the scores of the collection
+    summary_scores=()
+    summary_smiles=()
+    summary_ligands=()
+    for docking_scenario_name in "${docking_scenario_names[@]}"; do
+        if [ "${new_collection}" = "false" ]; then
+            load_summary ${docking_scenario_name} ${VF_TMPDIR}/${USER}/VFVS/${VF_JOBLETTER}/${VF_QUEUE_NO_12}/${VF_QUEUE_NO}/output-files/incomplete/${docking_scenario_name}/summaries/${next_ligand_collection_metatranch}/${next_ligand_collection_tranch}/${next_ligand_collection_ID}.txt
+        else
+            rm ${VF_TMPDIR}/${USER}/VFVS/${VF_JOBLETTER}/${VF_QUEUE_NO_12}/${VF_QUEUE_NO}/output-files/incomplete/${docking_scenario_name}/summaries/${next_ligand_collection_metatranch}/${next_ligand_collection_tranch}/${next_ligand_collection_ID}.txt* &> /dev/null || true
+        fi
+    done
     if [[ -f  ../workflow/ligand-collections/ligand-lists/${next_ligand_collection_metatranch}/${next_ligand_collection_tranch}/${next_ligand_collection_ID}.status ]]; then
         cp ../workflow/ligand-collections/ligand-lists/${next_ligand_collection_metatranch}/${next_ligand_collection_tranch}/${next_ligand_collection_ID}.status ${VF_TMPDIR}/${USER}/VFVS/${VF_JOBLETTER}/${VF_QUEUE_NO_12}/${VF_QUEUE_NO}/workflow/ligand-collections/ligand-lists/${next_ligand_collection_metatranch}/${next_ligand_collection_tranch}/
     fi
@@ -457,6 +626,21 @@ no_more_ligand_collection() {
     end_queue 0
 }
 
+# Storing a completed collection file as an immutable segment of its tranche (outputfiles_level=segments)
+# The segments are merged into the tranche archives by vf_compact_segments.py
+add_segment() {
+
+    # Variables
+    segment_file=${1}
+    segment_folder=${2}/${3}.segments
+    segment_name="$(basename ${segment_file})"
+
+    mkdir -p ${segment_folder}
+    cp ${segment_file} ${segment_folder}/.${segment_name}.${VF_QUEUE_NO}.tmp
+    mv ${segment_folder}/.${segment_name}.${VF_QUEUE_NO}.tmp ${segment_folder}/${segment_name}
+    echo "${segment_name} $(stat -c %s ${segment_file}) ${VF_QUEUE_NO} $(date +%s)" >> ${segment_folder}/manifest
+}
+
 # Tidying up collection folders and files in ${VF_TMPDIR}
 clean_collection_files_tmp() {
 
@@ -467,6 +651,11 @@ clean_collection_files_tmp() {
         local_ligand_collection_metatranch="${local_ligand_collection_tranch:0:2}"
         local_ligand_collection_ID="${local_ligand_collection/*_}"
 
+        # Energy check of the dockings of the collection
+        if [[ "${energy_check}" == "true" && "${energy_check_batched}" == "true" ]]; then
+            check_energy_collection ${local_ligand_collection_metatranch} ${local_ligand_collection_tranch} ${local_ligand_collection_ID}
+        fi
+
         # Checking if all the folders required are there
         if [ "${collection_complete}" = "true" ]; then
 
@@ -479,8 +668,13 @@ clean_collection_files_tmp() {
 
                 # Results
                 # Compressing the collection and saving in the complete folder
+                # (with a member index for retrieving single poses, see vf_blocktar.py)
                 mkdir -p ${VF_TMPDIR}/${USER}/VFVS/${VF_JOBLETTER}/${VF_QUEUE_NO_12}/${VF_QUEUE_NO}/output-files/complete/${docking_scenario_name}/results/${local_ligand_collection_metatranch}/${local_ligand_collection_tranch}/
-                tar -czf ${VF_TMPDIR}/${USER}/VFVS/${VF_JOBLETTER}/${VF_QUEUE_NO_12}/${VF_QUEUE_NO}/output-files/complete/${docking_scenario_name}/results/${local_ligand_collection_metatranch}/${local_ligand_collection_tranch}/${local_ligand_collection_ID}.tar.gz -C ${VF_TMPDIR}/${USER}/VFVS/${VF_JOBLETTER}/${VF_QUEUE_NO_12}/${VF_QUEUE_NO}/output-files/incomplete/${docking_scenario_name}/results/${local_ligand_collection_metatranch}/${local_ligand_collection_tranch}/ ${local_ligand_collection_ID} || true
+                if command -v python3 &> /dev/null; then
+                    python3 vf_blocktar.py create ${VF_TMPDIR}/${USER}/VFVS/${VF_JOBLETTER}/${VF_QUEUE_NO_12}/${VF_QUEUE_NO}/output-files/complete/${docking_scenario_name}/results/${local_ligand_collection_metatranch}/${local_ligand_collection_tranch}/${local_ligand_collection_ID}.tar.gz -C ${VF_TMPDIR}/${USER}/VFVS/${VF_JOBLETTER}/${VF_QUEUE_NO_12}/${VF_QUEUE_NO}/output-files/incomplete/${docking_scenario_name}/results/${local_ligand_collection_metatranch}/${local_ligand_collection_tranch}/ ${local_ligand_collection_ID} || true
+                else
+                    tar -czf ${VF_TMPDIR}/${USER}/VFVS/${VF_JOBLETTER}/${VF_QUEUE_NO_12}/${VF_QUEUE_NO}/output-files/complete/${docking_scenario_name}/results/${local_ligand_collection_metatranch}/${local_ligand_collection_tranch}/${local_ligand_collection_ID}.tar.gz -C ${VF_TMPDIR}/${USER}/VFVS/${VF_JOBLETTER}/${VF_QUEUE_NO_12}/${VF_QUEUE_NO}/output-files/incomplete/${docking_scenario_name}/results/${local_ligand_collection_metatranch}/${local_ligand_collection_tranch}/ ${local_ligand_collection_ID} || true
+                fi
 
                 # Adding the completed collection archive to the tranch archive
                 if [ "${outputfiles_level}" == "tranche" ]; then
@@ -489,10 +683,21 @@ clean_collection_files_tmp() {
                         cp ../output-files/complete/${docking_scenario_name}/results/${local_ligand_collection_metatranch}/${local_ligand_collection_tranch}.tar ${VF_TMPDIR}/${USER}/VFVS/${VF_JOBLETTER}/${VF_QUEUE_NO_12}/${VF_QUEUE_NO}/output-files/complete/${docking_scenario_name}/results/${local_ligand_collection_metatranch}/${local_ligand_collection_tranch}.tar
                     fi
                     tar -rf ${VF_TMPDIR}/${USER}/VFVS/${VF_JOBLETTER}/${VF_QUEUE_NO_12}/${VF_QUEUE_NO}/output-files/complete/${docking_scenario_name}/results/${local_ligand_collection_metatranch}/${local_ligand_collection_tranch}.tar -C ${VF_TMPDIR}/${USER}/VFVS/${VF_JOBLETTER}/${VF_QUEUE_NO_12}/${VF_QUEUE_NO}/output-files/complete/${docking_scenario_name}/results/${local_ligand_collection_metatranch} ${local_ligand_collection_tranch}/${local_ligand_collection_ID}.tar.gz || true
+                    if [ -f ${VF_TMPDIR}/${USER}/VFVS/${VF_JOBLETTER}/${VF_QUEUE_NO_12}/${VF_QUEUE_NO}/output-files/complete/${docking_scenario_name}/results/${local_ligand_collection_metatranch}/${local_ligand_collection_tranch}/${local_ligand_collection_ID}.tar.gz.idx.json ]; then
+                        tar -rf ${VF_TMPDIR}/${USER}/VFVS/${VF_JOBLETTER}/${VF_QUEUE_NO_12}/${VF_QUEUE_NO}/output-files/complete/${docking_scenario_name}/results/${local_ligand_collection_metatranch}/${local_ligand_collection_tranch}.tar -C ${VF_TMPDIR}/${USER}/VFVS/${VF_JOBLETTER}/${VF_QUEUE_NO_12}/${VF_QUEUE_NO}/output-files/complete/${docking_scenario_name}/results/${local_ligand_collection_metatranch} ${local_ligand_collection_tranch}/${local_ligand_collection_ID}.tar.gz.idx.json || true
+                    fi
                     mv ${VF_TMPDIR}/${USER}/VFVS/${VF_JOBLETTER}/${VF_QUEUE_NO_12}/${VF_QUEUE_NO}/output-files/complete/${docking_scenario_name}/results/${local_ligand_collection_metatranch}/${local_ligand_collection_tranch}.tar ../output-files/complete/${docking_scenario_name}/results/${local_ligand_collection_metatranch}/${local_ligand_collection_tranch}.tar
+                elif [ "${outputfiles_level}" == "segments" ]; then
+                    add_segment ${VF_TMPDIR}/${USER}/VFVS/${VF_JOBLETTER}/${VF_QUEUE_NO_12}/${VF_QUEUE_NO}/output-files/complete/${docking_scenario_name}/results/${local_ligand_collection_metatranch}/${local_ligand_collection_tranch}/${local_ligand_collection_ID}.tar.gz ../output-files/complete/${docking_scenario_name}/results/${local_ligand_collection_metatranch} ${local_ligand_collection_tranch}
+                    if [ -f ${VF_TMPDIR}/${USER}/VFVS/${VF_JOBLETTER}/${VF_QUEUE_NO_12}/${VF_QUEUE_NO}/output-files/complete/${docking_scenario_name}/results/${local_ligand_collection_metatranch}/${local_ligand_collection_tranch}/${local_ligand_collection_ID}.tar.gz.idx.json ]; then
+                        add_segment ${VF_TMPDIR}/${USER}/VFVS/${VF_JOBLETTER}/${VF_QUEUE_NO_12}/${VF_QUEUE_NO}/output-files/complete/${docking_scenario_name}/results/${local_ligand_collection_metatranch}/${local_ligand_collection_tranch}/${local_ligand_collection_ID}.tar.gz.idx.json ../output-files/complete/${docking_scenario_name}/results/${local_ligand_collection_metatranch} ${local_ligand_collection_tranch}
+                    fi
                 elif [ "${outputfiles_level}" == "collection" ]; then
                     mkdir -p ../output-files/complete/${docking_scenario_name}/results/${local_ligand_collection_metatranch}/${local_ligand_collection_tranch}/
                     cp ${VF_TMPDIR}/${USER}/VFVS/${VF_JOBLETTER}/${VF_QUEUE_NO_12}/${VF_QUEUE_NO}/output-files/complete/${docking_scenario_name}/results/${local_ligand_collection_metatranch}/${local_ligand_collection_tranch}/${local_ligand_collection_ID}.tar.gz ../output-files/complete/${docking_scenario_name}/results/${local_ligand_collection_metatranch}/${local_ligand_collection_tranch}/
+                    if [ -f ${VF_TMPDIR}/${USER}/VFVS/${VF_JOBLETTER}/${VF_QUEUE_NO_12}/${VF_QUEUE_NO}/output-files/complete/${docking_scenario_name}/results/${local_ligand_collection_metatranch}/${local_ligand_collection_tranch}/${local_ligand_collection_ID}.tar.gz.idx.json ]; then
+                        cp ${VF_TMPDIR}/${USER}/VFVS/${VF_JOBLETTER}/${VF_QUEUE_NO_12}/${VF_QUEUE_NO}/output-files/complete/${docking_scenario_name}/results/${local_ligand_collection_metatranch}/${local_ligand_collection_tranch}/${local_ligand_collection_ID}.tar.gz.idx.json ../output-files/complete/${docking_scenario_name}/results/${local_ligand_collection_metatranch}/${local_ligand_collection_tranch}/
+                    fi
                 else
                     echo " * Error: The variable 'outputfiles_level' in the controlfile ${VF_CONTROLFILE} has an invalid value (${outputfiles_level})" | tee -a /dev/stderr
                     exit 1
@@ -500,11 +705,13 @@ clean_collection_files_tmp() {
 
                 # Cleaning up
                 rm ${VF_TMPDIR}/${USER}/VFVS/${VF_JOBLETTER}/${VF_QUEUE_NO_12}/${VF_QUEUE_NO}/output-files/complete/${docking_scenario_name}/results/${local_ligand_collection_metatranch}/${local_ligand_collection_tranch}/${local_ligand_collection_ID}.tar.gz &> /dev/null || true
+                rm ${VF_TMPDIR}/${USER}/VFVS/${VF_JOBLETTER}/${VF_QUEUE_NO_12}/${VF_QUEUE_NO}/output-files/complete/${docking_scenario_name}/results/${local_ligand_collection_metatranch}/${local_ligand_collection_tranch}/${local_ligand_collection_ID}.tar.gz.idx.json &> /dev/null || true
                 rm -r ${VF_TMPDIR}/${USER}/VFVS/${VF_JOBLETTER}/${VF_QUEUE_NO_12}/${VF_QUEUE_NO}/output-files/incomplete/${docking_scenario_name}/results/${local_ligand_collection_metatranch}/${local_ligand_collection_tranch}/${local_ligand_collection_ID} &> /dev/null || true
 
                 # Summaries
                 # Compressing the collection and saving in the complete folder
                 mkdir -p ${VF_TMPDIR}/${USER}/VFVS/${VF_JOBLETTER}/${VF_QUEUE_NO_12}/${VF_QUEUE_NO}/output-files/complete/${docking_scenario_name}/summaries/${local_ligand_collection_metatranch}/${local_ligand_collection_tranch}/
+                write_summary ${docking_scenario_name} ${local_ligand_collection} ${VF_TMPDIR}/${USER}/VFVS/${VF_JOBLETTER}/${VF_QUEUE_NO_12}/${VF_QUEUE_NO}/output-files/incomplete/${docking_scenario_name}/summaries/${local_ligand_collection_metatranch}/${local_ligand_collection_tranch}/${local_ligand_collection_ID}.txt
                 gzip < ${VF_TMPDIR}/${USER}/VFVS/${VF_JOBLETTER}/${VF_QUEUE_NO_12}/${VF_QUEUE_NO}/output-files/incomplete/${docking_scenario_name}/summaries/${local_ligand_collection_metatranch}/${local_ligand_collection_tranch}/${local_ligand_collection_ID}.txt > ${VF_TMPDIR}/${USER}/VFVS/${VF_JOBLETTER}/${VF_QUEUE_NO_12}/${VF_QUEUE_NO}/output-files/complete/${docking_scenario_name}/summaries/${local_ligand_collection_metatranch}/${local_ligand_collection_tranch}/${local_ligand_collection_ID}.txt.gz || true
 
                 # Adding the completed collection archive to the tranch archive
@@ -515,6 +722,8 @@ clean_collection_files_tmp() {
                     fi
                     tar -rf ${VF_TMPDIR}/${USER}/VFVS/${VF_JOBLETTER}/${VF_QUEUE_NO_12}/${VF_QUEUE_NO}/output-files/complete/${docking_scenario_name}/summaries/${local_ligand_collection_metatranch}/${local_ligand_collection_tranch}.tar -C ${VF_TMPDIR}/${USER}/VFVS/${VF_JOBLETTER}/${VF_QUEUE_NO_12}/${VF_QUEUE_NO}/output-files/complete/${docking_scenario_name}/summaries/${local_ligand_collection_metatranch} ${local_ligand_collection_tranch}/${local_ligand_collection_ID}.txt.gz || true
                     mv ${VF_TMPDIR}/${USER}/VFVS/${VF_JOBLETTER}/${VF_QUEUE_NO_12}/${VF_QUEUE_NO}/output-files/complete/${docking_scenario_name}/summaries/${local_ligand_collection_metatranch}/${local_ligand_collection_tranch}.tar ../output-files/complete/${docking_scenario_name}/summaries/${local_ligand_collection_metatranch}/${local_ligand_collection_tranch}.tar
+                elif [ "${outputfiles_level}" == "segments" ]; then
+                    add_segment ${VF_TMPDIR}/${USER}/VFVS/${VF_JOBLETTER}/${VF_QUEUE_NO_12}/${VF_QUEUE_NO}/output-files/complete/${docking_scenario_name}/summaries/${local_ligand_collection_metatranch}/${local_ligand_collection_tranch}/${local_ligand_collection_ID}.txt.gz ../output-files/complete/${docking_scenario_name}/summaries/${local_ligand_collection_metatranch} ${local_ligand_collection_tranch}
                 elif [ "${outputfiles_level}" == "collection" ]; then
                     mkdir -p ../output-files/complete/${docking_scenario_name}/summaries/${local_ligand_collection_metatranch}/${local_ligand_collection_tranch}/
                     cp ${VF_TMPDIR}/${USER}/VFVS/${VF_JOBLETTER}/${VF_QUEUE_NO_12}/${VF_QUEUE_NO}/output-files/complete/${docking_scenario_name}/summaries/${local_ligand_collection_metatranch}/${local_ligand_collection_tranch}/${local_ligand_collection_ID}.txt.gz ../output-files/complete/${docking_scenario_name}/summaries/${local_ligand_collection_metatranch}/${local_ligand_collection_tranch}/
@@ -526,6 +735,7 @@ clean_collection_files_tmp() {
                 # Cleaning up
                 rm ${VF_TMPDIR}/${USER}/VFVS/${VF_JOBLETTER}/${VF_QUEUE_NO_12}/${VF_QUEUE_NO}/output-files/complete/${docking_scenario_name}/summaries/${local_ligand_collection_metatranch}/${local_ligand_collection_tranch}/${local_ligand_collection_ID}.tar.gz &> /dev/null || true
                 rm -r ${VF_TMPDIR}/${USER}/VFVS/${VF_JOBLETTER}/${VF_QUEUE_NO_12}/${VF_QUEUE_NO}/output-files/incomplete/${docking_scenario_name}/summaries/${local_ligand_collection_metatranch}/${local_ligand_collection_tranch}/${local_ligand_collection_ID} &> /dev/null || true
+                rm ${VF_TMPDIR}/${USER}/VFVS/${VF_JOBLETTER}/${VF_QUEUE_NO_12}/${VF_QUEUE_NO}/output-files/incomplete/${docking_scenario_name}/summaries/${local_ligand_collection_metatranch}/${local_ligand_collection_tranch}/${local_ligand_collection_ID}.txt.journal &> /dev/null || true
 
                 # Logfiles
                 # Compressing the collection and saving in the complete folder
@@ -540,6 +750,8 @@ clean_collection_files_tmp() {
                     fi
                     tar -rf ${VF_TMPDIR}/${USER}/VFVS/${VF_JOBLETTER}/${VF_QUEUE_NO_12}/${VF_QUEUE_NO}/output-files/complete/${docking_scenario_name}/logfiles/${local_ligand_collection_metatranch}/${local_ligand_collection_tranch}.tar -C ${VF_TMPDIR}/${USER}/VFVS/${VF_JOBLETTER}/${VF_QUEUE_NO_12}/${VF_QUEUE_NO}/output-files/complete/${docking_scenario_name}/logfiles/${local_ligand_collection_metatranch} ${local_ligand_collection_tranch}/${local_ligand_collection_ID}.tar.gz || true
                     mv ${VF_TMPDIR}/${USER}/VFVS/${VF_JOBLETTER}/${VF_QUEUE_NO_12}/${VF_QUEUE_NO}/output-files/complete/${docking_scenario_name}/logfiles/${local_ligand_collection_metatranch}/${local_ligand_collection_tranch}.tar  ../output-files/complete/${docking_scenario_name}/logfiles/${local_ligand_collection_metatranch}/${local_ligand_collection_tranch}.tar
+                elif [ "${outputfiles_level}" == "segments" ]; then
+                    add_segment ${VF_TMPDIR}/${USER}/VFVS/${VF_JOBLETTER}/${VF_QUEUE_NO_12}/${VF_QUEUE_NO}/output-files/complete/${docking_scenario_name}/logfiles/${local_ligand_collection_metatranch}/${local_ligand_collection_tranch}/${local_ligand_collection_ID}.tar.gz ../output-files/complete/${docking_scenario_name}/logfiles/${local_ligand_collection_metatranch} ${local_ligand_collection_tranch}
                 elif [ "${outputfiles_level}" == "collection" ]; then
                     mkdir -p ../output-files/complete/${docking_scenario_name}/logfiles/${local_ligand_collection_metatranch}/${local_ligand_collection_tranch}/
                     cp ${VF_TMPDIR}/${USER}/VFVS/${VF_JOBLETTER}/${VF_QUEUE_NO_12}/${VF_QUEUE_NO}/output-files/complete/${docking_scenario_name}/logfiles/${local_ligand_collection_metatranch}/${local_ligand_collection_tranch}/${local_ligand_collection_ID}.tar.gz ../output-files/complete/${docking_scenario_name}/logfiles/${local_ligand_collection_metatranch}/${local_ligand_collection_tranch}/
@@ -592,6 +804,8 @@ clean_collection_files_tmp() {
                     fi
                     tar -rf ${VF_TMPDIR}/${USER}/VFVS/${VF_JOBLETTER}/${VF_QUEUE_NO_12}/${VF_QUEUE_NO}/workflow/ligand-collections/ligand-lists/${local_ligand_collection_metatranch}/${local_ligand_collection_tranch}.tar -C ${VF_TMPDIR}/${USER}/VFVS/${VF_JOBLETTER}/${VF_QUEUE_NO_12}/${VF_QUEUE_NO}/workflow/ligand-collections/ligand-lists/${local_ligand_collection_metatranch}/ ${local_ligand_collection_tranch}/${local_ligand_collection_ID}.status.gz || true
                     mv ${VF_TMPDIR}/${USER}/VFVS/${VF_JOBLETTER}/${VF_QUEUE_NO_12}/${VF_QUEUE_NO}/workflow/ligand-collections/ligand-lists/${local_ligand_collection_metatranch}/${local_ligand_collection_tranch}.tar ../output-files/complete/${docking_scenario_name}//ligand-lists/${local_ligand_collection_metatranch}/${local_ligand_collection_tranch}.tar
+                elif [ "${outputfiles_level}" == "segments" ]; then
+                    add_segment ${VF_TMPDIR}/${USER}/VFVS/${VF_JOBLETTER}/${VF_QUEUE_NO_12}/${VF_QUEUE_NO}/workflow/ligand-collections/ligand-lists/${local_ligand_collection_metatranch}/${local_ligand_collection_tranch}/${local_ligand_collection_ID}.status.gz ../output-files/complete/${docking_scenario_name}/ligand-lists/${local_ligand_collection_metatranch} ${local_ligand_collection_tranch}
                 elif [ "${outputfiles_level}" == "collection" ]; then
                     mkdir -p ../output-files/complete/${docking_scenario_name}/ligand-lists/${local_ligand_collection_metatranch}/${local_ligand_collection_tranch}/
                     cp ${VF_TMPDIR}/${USER}/VFVS/${VF_JOBLETTER}/${VF_QUEUE_NO_12}/${VF_QUEUE_NO}/workflow/ligand-collections/ligand-lists/${local_ligand_collection_metatranch}/${local_ligand_collection_tranch}/${local_ligand_collection_ID}.status.gz ../output-files/complete/${docking_scenario_name}/ligand-lists/${local_ligand_collection_metatranch}/${local_ligand_collection_tranch}/
@@ -621,6 +835,7 @@ clean_collection_files_tmp() {
 
                 # Summaries
                 # Compressing the collection
+                write_summary ${docking_scenario_name} ${local_ligand_collection} ${VF_TMPDIR}/${USER}/VFVS/${VF_JOBLETTER}/${VF_QUEUE_NO_12}/${VF_QUEUE_NO}/output-files/incomplete/${docking_scenario_name}/summaries/${local_ligand_collection_metatranch}/${local_ligand_collection_tranch}/${local_ligand_collection_ID}.txt
                 gzip < ${VF_TMPDIR}/${USER}/VFVS/${VF_JOBLETTER}/${VF_QUEUE_NO_12}/${VF_QUEUE_NO}/output-files/incomplete/${docking_scenario_name}/summaries/${local_ligand_collection_metatranch}/${local_ligand_collection_tranch}/${local_ligand_collection_ID}.txt > ${VF_TMPDIR}/${USER}/VFVS/${VF_JOBLETTER}/${VF_QUEUE_NO_12}/${VF_QUEUE_NO}/output-files/incomplete/${docking_scenario_name}/summaries/${local_ligand_collection_metatranch}/${local_ligand_collection_tranch}/${local_ligand_collection_ID}.txt.gz || true
 
                 # Copying the files which should be kept in the permanent storage location
@@ -629,6 +844,7 @@ clean_collection_files_tmp() {
 
                 # Cleaning up
                 rm -r ${VF_TMPDIR}/${USER}/VFVS/${VF_JOBLETTER}/${VF_QUEUE_NO_12}/${VF_QUEUE_NO}/output-files/incomplete/${docking_scenario_name}/summaries/${local_ligand_collection_metatranch}/${local_ligand_collection_tranch}/${local_ligand_collection_ID} &> /dev/null || true
+                rm ${VF_TMPDIR}/${USER}/VFVS/${VF_JOBLETTER}/${VF_QUEUE_NO_12}/${VF_QUEUE_NO}/output-files/incomplete/${docking_scenario_name}/summaries/${local_ligand_collection_metatranch}/${local_ligand_collection_tranch}/${local_ligand_collection_ID}.txt.journal &> /dev/null || true
 
                 # Logfiles
                 # Compressing the collection
@@ -676,8 +892,37 @@ end_queue() {
     exit ${exitcode}
 }
 
+# Reading all values of the temporary control file into control_values
+# With one call of vf_controlfile.py, or by reading the file once in bash if python3 is not available
+load_control_values() {
+
+    control_values=()
+    if control_assignments="$(python3 vf_controlfile.py export --array control_values ${VF_CONTROLFILE_TEMP} 2>/dev/null)"; then
+        eval "${control_assignments}"
+    else
+        while IFS= read -r line; do
+            line="${line//[[:space:]]/}"
+            if [[ "${line}" == \#* || "${line}" != *=* || "${line}" == =* ]]; then
+                continue
+            fi
+            key="${line%%=*}"
+            value="${line#*=}"
+            value="${value%%[=#]*}"
+            if [[ -z "${control_values[${key}]+x}" ]]; then
+                control_values[${key}]="${value}"
+            fi
+        done < ${VF_CONTROLFILE_TEMP}
+    fi
+}
+
 determine_controlfile() {
 
+    # Nothing to do if neither the control folder nor the control file changed since the last time
+    control_state_new="$(stat -c '%Y %s' ../workflow/control ${VF_CONTROLFILE} 2>/dev/null || true)"
+    if [[ -n "${control_state:-}" && "${control_state_new}" == "${control_state}" && -f ${VF_CONTROLFILE_TEMP} ]]; then
+        return
+    fi
+
     # Determining the VF_CONTROLFILE to use for this jobline
     VF_CONTROLFILE_OLD=${VF_CONTROLFILE}
     VF_CONTROLFILE=""
@@ -711,6 +956,8 @@ determine_controlfile() {
 
     # Updating the temporary controlfile
     cp ${VF_CONTROLFILE} ${VF_CONTROLFILE_TEMP}
+    load_control_values
+    control_state="$(stat -c '%Y %s' ../workflow/control ${VF_CONTROLFILE} 2>/dev/null || true)"
 
 }
 
@@ -720,35 +967,40 @@ if [ "${VF_VERBOSITY_LOGFILES}" = "debug" ]; then
 fi
 
 # Determining the control file
+declare -A control_values
+control_state=""
 export VF_CONTROLFILE_TEMP=${VF_TMPDIR}/${USER}/VFVS/${VF_JOBLETTER}/${VF_QUEUE_NO_12}/${VF_QUEUE_NO}/controlfile
 determine_controlfile
 
 # Variables
-minimum_time_remaining="$(grep -m 1 "^minimum_time_remaining=" ${VF_CONTROLFILE_TEMP} | tr -d '[[:space:]]' | awk -F '[=#]' '{print $2}')"
-keep_ligand_summary_logs="$(grep -m 1 "^keep_ligand_summary_logs=" ${VF_CONTROLFILE_TEMP} | tr -d '[[:space:]]' | awk -F '[=#]' '{print $2}')"
-ligand_check_interval="$(grep -m 1 "^ligand_check_interval=" ${VF_CONTROLFILE_TEMP} | tr -d '[[:space:]]' | awk -F '[=#]' '{print $2}')"
-cpus_per_queue="$(grep -m 1 "^cpus_per_queue=" ${VF_CONTROLFILE_TEMP} | tr -d '[[:space:]]' | awk -F '[=#]' '{print $2}')"
-outputfiles_level="$(grep -m 1 "^outputfiles_level=" ${VF_CONTROLFILE_TEMP} | tr -d '[[:space:]]' | awk -F '[=#]' '{print $2}')"
-ligand_library_format="$(grep -m 1 "^ligand_library_format=" ${VF_CONTROLFILE_TEMP} | tr -d '[[:space:]]' | awk -F '[=#]' '{print $2}')"
+minimum_time_remaining="${control_values[minimum_time_remaining]:-}"
+keep_ligand_summary_logs="${control_values[keep_ligand_summary_logs]:-}"
+ligand_check_interval="${control_values[ligand_check_interval]:-}"
+cpus_per_queue="${control_values[cpus_per_queue]:-}"
+outputfiles_level="${control_values[outputfiles_level]:-}"
+ligand_library_format="${control_values[ligand_library_format]:-}"
 
 # Docking
 supported_docking_programs="vina, qvina02, qvina_w, smina, vina_xb, vina_carb, gwovina, adfr"
 needs_cleaning="false"
+declare -A summary_scores
+declare -A summary_smiles
+declare -A summary_ligands
 
 # Determining the names of each docking type
-docking_scenario_names="$(grep -m 1 "^docking_scenario_names=" ${VF_CONTROLFILE_TEMP} | tr -d '[[:space:]]' | awk -F '[=#]' '{print $2}')"
+docking_scenario_names="${control_values[docking_scenario_names]:-}"
 IFS=':' read -a docking_scenario_names <<< "$docking_scenario_names"
 
 # Determining the number of docking types
 docking_scenario_index_end=${#docking_scenario_names[@]}
 
 # Determining the docking programs to use for each docking type
-docking_scenario_programs="$(grep -m 1 "^docking_scenario_programs=" ${VF_CONTROLFILE_TEMP} | tr -d '[[:space:]]' | awk -F '[=#]' '{print $2}')"
+docking_scenario_programs="${control_values[docking_scenario_programs]:-}"
 IFS=':' read -a docking_scenario_programs <<< "$docking_scenario_programs"
 docking_scenario_programs_length=${#docking_scenario_programs[@]}
 
 # Determining the docking type replicas
-docking_scenario_replicas_total="$(grep -m 1 "^docking_scenario_replicas=" ${VF_CONTROLFILE_TEMP} | tr -d '[[:space:]]' | awk -F '[=#]' '{print $2}')"
+docking_scenario_replicas_total="${control_values[docking_scenario_replicas]:-}"
 IFS=':' read -a docking_scenario_replicas_total <<< "$docking_scenario_replicas_total"
 docking_scenario_replicas_total_length=${#docking_scenario_replicas_total[@]}
 
@@ -758,20 +1010,25 @@ docking_scenario_replicas_total_length=${#docking_scenario_replicas_total[@]}
 #done
 
 # Potential energy check
-energy_check="$(grep -m 1 "^energy_check=" ${VF_CONTROLFILE_TEMP} | tr -d '[[:space:]]' | awk -F '[=#]' '{print $2}')"
+energy_check="${control_values[energy_check]:-}"
+energy_check_batched="false"
 if [ "${energy_check}" == "true" ]; then
-    energy_max="$(grep -m 1 "^energy_max=" ${VF_CONTROLFILE_TEMP} | tr -d '[[:space:]]' | awk -F '[=#]' '{print $2}')"
+    energy_max="${control_values[energy_max]:-}"
     if ! [[ "${energy_max}" =~ ^[0-9]+$ ]]; then
         echo -e " Error: The value (${energy_max}) for variable energy_max which was specified in the controlfile is invalid..."
         error_response_std $LINENO
     fi
+    # Once per collection with vf_energy_check.py (check_energy_collection), otherwise per docking (obabel_check_energy)
+    if command -v python3 &> /dev/null && [ -f vf_energy_check.py ]; then
+        energy_check_batched="true"
+    fi
 elif [[ "${energy_check}" != "false" ]]; then
     echo -e " Error: The value (${energy_check}) for variable energy_check which was specified in the controlfile is invalid..."
     error_response_std $LINENO
 fi
 
 # Getting the value for the variable minimum_time_remaining
-minimum_time_remaining="$(grep -m 1 "^minimum_time_remaining=" ${VF_CONTROLFILE_TEMP} | tr -d '[[:space:]]' | awk -F '[=#]' '{print $2}')"
+minimum_time_remaining="${control_values[minimum_time_remaining]:-}"
 minimum_time_remaining=$((minimum_time_remaining * 60)) # Conversion from minutes to seconds
 
 # Checking the variables for errors
@@ -816,7 +1073,7 @@ echo
 echo
 
 # Getting the folder where the collections are
-collection_folder="$(grep -m 1 "^collection_folder=" ${VF_CONTROLFILE_TEMP} | tr -d '[[:space:]]' | awk -F '[=#]' '{print $2}')"
+collection_folder="${control_values[collection_folder]:-}"
 
 # Loop for each ligand
 ligand_index=0
@@ -951,7 +1208,7 @@ while true; do
         determine_controlfile
 
         # Checking if this queue line should be stopped immediately
-        stop_after_next_check_interval="$(grep -m 1 "^stop_after_next_check_interval=" ${VF_CONTROLFILE_TEMP} | tr -d '[[:space:]]' | awk -F '[=#]' '{print $2}')"
+        stop_after_next_check_interval="${control_values[stop_after_next_check_interval]:-}"
         if [ "${stop_after_next_check_interval}" = "true" ]; then
             echo
             echo " * This queue will be stopped due to the stop_after_next_check_interval flag in the controlfile ${VF_CONTROLFILE}."
@@ -1118,6 +1375,15 @@ while true; do
             # Checking if the potential energy should be checked
             if [[ "${energy_check}" == "true" ]]; then
 
+                # Checked with the other dockings of the collection, see check_energy_collection
+                if [[ "${energy_check_batched}" == "true" && "${ligand_library_format}" == "pdbqt" ]]; then
+                    ligand_list_entry="energy-check:pending score:${score_value}"
+                    update_ligand_list_end false
+                    needs_cleaning="true"
+                    cd "${VF_DIR}" || true
+                    continue
+                fi
+
                 # Checking the energy
                 obabel_check_energy || continue
             fi
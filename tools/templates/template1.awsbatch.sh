@@ -24,6 +24,7 @@
 #
 # Revision history:
 # 2020-06-27  Original version
+# 2026-10-19  exec vf_aws_run.py so that it receives the SIGTERM of AWS Batch
 #
 # ---------------------------------------------------------------------------
 
@@ -34,4 +35,4 @@
 df -h
 
 cd /opt/vf/tools/templates/
-./vf_aws_run.py
+exec ./vf_aws_run.py
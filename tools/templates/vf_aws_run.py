@@ -22,10 +22,23 @@
 #
 # Description: Main runner for the individual workunits/job lines
 #
+#              Runs from tools/templates in the container, but imports
+#              vf_blocktar.py, vf_energy_check.py and vf_controlfile.py from
+#              the tools folder above it, so they have to be in the image
+#              next to templates/ (docker/Dockerfile copies the whole tools
+#              folder and checks the imports). The control file of the job
+#              is read with the same parser as on the host.
+#
 # Revision history:
 # 2021-06-29  Original version
 # 2021-08-02  Added additional handling for case where there is only 
 #             a single subjob in a job
+# 2026-10-19  Fetch only this subjob's slice of the packed task file
+# 2026-10-19  Results archives with a member index (vf_blocktar.py)
+# 2026-10-19  Batched energy check of the best poses (vf_energy_check.py)
+# 2026-10-19  Drain on SIGTERM or aws_batch_drain_after_seconds: partial
+#             outputs and a list of the remaining dockings for the retry
+# 2026-10-19  Read the control file with vf_controlfile.py
 #
 # ---------------------------------------------------------------------------
 
@@ -42,24 +55,26 @@ import subprocess
 import botocore
 import logging
 import time
+import sys
+import queue
+import signal
 from pathlib import Path
 
+# Shared modules in the tools folder (see the description above)
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import vf_blocktar
+import vf_energy_check
+from vf_controlfile import parse_config
 
-# Given a config file, parse out all of the configuration options
-
-def parse_config(filename):
-
-    config = {}
 
-    with open(filename, "r") as read_file:
-        for index, line in enumerate(read_file):
-            match = re.search(
-                r'^(?P<parameter>.*?)\s*=\s*(?P<parameter_value>.*?)\s*$', line)
-            if(match):
-                matches = match.groupdict()
-                config[matches['parameter']] = matches['parameter_value']
+# Collections which could not be completed before draining are uploaded below
+# this prefix instead of 'output', together with a list of the dockings which
+# remain (see upload_collection)
+PARTIAL_OUTPUT = "output-partial"
+REMAINING_SUFFIX = ".remaining.json.gz"
 
-    return config
+drain_requested = False
+current_docking = None
 
 
 def process_config(ctx):
@@ -129,9 +144,79 @@ def get_config_file(temp_dir, s3, bucket_name, object_name):
     return f"{temp_dir}/vf_input/all.ctrl"
 
 
+# Packed task file layout (written by vf_aws_prepare_todolists.py):
+#
+#   VFTASKS1 <subjob count, 8 digits>\n                      (header)
+#   <offset, 12 digits> <length, 12 digits>\n  (one per subjob, in subjob order)
+#   <JSON task list of subjob 0><JSON task list of subjob 1>...
+
+TASKS_HEADER_MAGIC = "VFTASKS1"
+TASKS_HEADER_LEN = len(f"{TASKS_HEADER_MAGIC} {0:08d}\n")
+TASKS_INDEX_ENTRY_LEN = len(f"{0:012d} {0:012d}\n")
+
+
+def get_object_range(ctx, object_name, start, length):
+
+    response = ctx['s3'].get_object(
+        Bucket=ctx['config']['object_store_bucket'],
+        Key=object_name,
+        Range=f"bytes={start}-{start + length - 1}"
+    )
+
+    return response['Body'].read()
+
+
 # Get only the collection information with the subjob specified
 
 def get_subjob(ctx, workunit_id, subjob_id):
+
+    input_path = [
+        ctx['config']['object_store_job_data_prefix'],
+        "input",
+        "tasks",
+        f"{workunit_id}.tasks"
+    ]
+    object_name = "/".join(input_path)
+
+    # Read the header and the index up to (and including) our entry, then
+    # fetch only our own slice of the packed file
+
+    try:
+        index_length = TASKS_HEADER_LEN + \
+            TASKS_INDEX_ENTRY_LEN * (int(subjob_id) + 1)
+        index_data = get_object_range(
+            ctx, object_name, 0, index_length).decode("utf-8")
+    except botocore.exceptions.ClientError as error:
+        if error.response['Error']['Code'] in ("NoSuchKey", "404"):
+            logging.info(
+                f"No packed task file {object_name}, falling back to the workunit tarball")
+            return get_subjob_tarball(ctx, workunit_id, subjob_id)
+        logging.error(
+            f"Failed to download from S3 {ctx['config']['object_store_bucket']}/{object_name} ({error})")
+        return None
+
+    magic, subjob_count = index_data[:TASKS_HEADER_LEN].split()
+    if(magic != TASKS_HEADER_MAGIC or int(subjob_id) >= int(subjob_count)):
+        logging.error(
+            f"ERR: {object_name} has no entry for subjob {subjob_id}")
+        return None
+
+    offset, length = index_data[-TASKS_INDEX_ENTRY_LEN:].split()
+
+    try:
+        subjob = json.loads(get_object_range(
+            ctx, object_name, int(offset), int(length)))
+    except Exception as err:
+        logging.error(
+            f"ERR: Cannot read subjob {subjob_id} from {object_name}. type: {str(type(err))}, err: {str(err)}")
+        return None
+
+    return subjob
+
+
+# Workunits published before the packed task files were introduced
+
+def get_subjob_tarball(ctx, workunit_id, subjob_id):
     # Download from S3
 
     input_path = [
@@ -230,14 +315,9 @@ def program_runstring_array(task):
 
     return cmd
 
-# Individual tasks that will be completed in parallel
-
-
-def process_ligand(task):
-
-    start_time = time.perf_counter()
+def new_completion_event(task):
 
-    completion_event = {
+    return {
         'collection_key': task['collection_key'],
         'ligand_key': task['ligand_key'],
         'scenario_key': task['scenario_key'],
@@ -248,11 +328,53 @@ def process_ligand(task):
         'status': "failed(docking)"
     }
 
+
+# Draining
+#
+# AWS Batch sends SIGTERM before a job is stopped (e.g. when a spot instance
+# is reclaimed). The runner then stops starting new dockings, gives the
+# running ones aws_batch_drain_grace_seconds to finish and uploads what is
+# done. The same happens aws_batch_drain_after_seconds after the start if
+# that is set (e.g. a bit below the job timeout).
+
+def request_drain(signum, frame):
+
+    global drain_requested
+    drain_requested = True
+
+
+def init_docking_worker():
+
+    # The pool stops its workers with SIGTERM, which stops their docking program
+    signal.signal(signal.SIGTERM, stop_docking_worker)
+
+
+def stop_docking_worker(signum, frame):
+
+    if(current_docking is not None):
+        current_docking.kill()
+    os._exit(1)
+
+
+# Individual tasks that will be completed in parallel
+
+
+def process_ligand(task):
+
+    global current_docking
+
+    start_time = time.perf_counter()
+
+    completion_event = new_completion_event(task)
+
     cmd = program_runstring_array(task)
     logging.debug(cmd)
 
-    ret = subprocess.run(cmd, capture_output=True,
-                         text=True, cwd=task['input_files_dir'])
+    current_docking = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                       text=True, cwd=task['input_files_dir'])
+    stdout, stderr = current_docking.communicate()
+    ret = subprocess.CompletedProcess(cmd, current_docking.returncode, stdout, stderr)
+    current_docking = None
     if ret.returncode == 0:
 
         if(task['program'] == "qvina02"
@@ -300,6 +422,60 @@ def process_ligand(task):
     return completion_event
 
 
+# Runs the dockings in the pool, one task at a time per free process so that
+# no new dockings are started once draining begins. Returns the results of
+# the finished dockings (in the order of the tasks) and the tasks which were
+# not finished.
+
+def run_docking_tasks(ctx, tasklist, processes):
+
+    drain_after_seconds = int(ctx['config'].get('aws_batch_drain_after_seconds', 0) or 0)
+    grace_seconds = int(ctx['config'].get('aws_batch_drain_grace_seconds', 10) or 0)
+    deadline = ctx['start_time'] + drain_after_seconds if drain_after_seconds > 0 else None
+
+    completed = queue.Queue()
+    results = {}
+    next_index = 0
+    running = 0
+    drain_start = None
+
+    with multiprocessing.Pool(processes=processes, initializer=init_docking_worker) as pool:
+        while True:
+            if(drain_start is None and (drain_requested or (deadline is not None and time.time() >= deadline))):
+                drain_start = time.time()
+                logging.warning(f"Draining ({'SIGTERM' if drain_requested else 'aws_batch_drain_after_seconds'}): "
+                                f"{running} dockings running, {len(tasklist) - next_index} not started")
+
+            while(drain_start is None and running < processes and next_index < len(tasklist)):
+                pool.apply_async(process_ligand, (tasklist[next_index],),
+                                 callback=lambda result, index=next_index: completed.put((index, result)),
+                                 error_callback=lambda error, index=next_index: completed.put((index, error)))
+                next_index += 1
+                running += 1
+
+            if(running == 0):
+                break
+            if(drain_start is not None and time.time() - drain_start >= grace_seconds):
+                logging.warning(f"Stopping {running} dockings which did not finish in {grace_seconds} seconds")
+                break
+
+            try:
+                index, result = completed.get(timeout=1)
+            except queue.Empty:
+                continue
+            running -= 1
+
+            if isinstance(result, Exception):
+                logging.error(f"Docking of {tasklist[index]['ligand_key']} failed: {result}")
+                result = new_completion_event(tasklist[index])
+                result['seconds'] = 0.0
+            results[index] = result
+
+    remaining_tasks = [task for index, task in enumerate(tasklist) if index not in results]
+
+    return [results[index] for index in sorted(results)], remaining_tasks
+
+
 def preprocess_collection(ctx, collection_full_name, collection_count):
 
     subtasklist = []
@@ -390,20 +566,23 @@ def create_summary_file(ctx, scenario, collection, scenario_result):
             summmary_fp.write(f"{replica_str}")
         summmary_fp.write("\n")
 
-        # Now we need to go through each ligand
+        # Now we need to go through each ligand. The scores are keyed by the
+        # replica index, and replicas which were drained or failed (e.g. the
+        # energy check) are left out like in one-queue.sh
         for ligand_key in scenario_result['ligands']:
             ligand = scenario_result['ligands'][ligand_key]
 
             if(len(ligand['scores']) > 0):
 
-                max_score = max(ligand['scores'])
-                avg_score = sum(ligand['scores']) / len(ligand['scores'])
+                scores = [ligand['scores'][replica_index] for replica_index in sorted(ligand['scores'])]
+                max_score = max(scores)
+                avg_score = sum(scores) / len(scores)
 
                 summmary_fp.write(
-                    f"{collection['key']} {ligand_key}     {avg_score:3.1f}    {max_score:3.1f}     {len(ligand['scores']):5d}   ")
-                for replica_index in range(scenario['replicas']):
+                    f"{collection['key']} {ligand_key}     {avg_score:3.1f}    {max_score:3.1f}     {len(scores):5d}   ")
+                for score in scores:
                     summmary_fp.write(
-                        f"{ligand['scores'][replica_index]:3.1f}   ")
+                        f"{score:3.1f}   ")
                 summmary_fp.write("\n")
 
     return os.path.join(summary_dir, f"{collection['number']}.txt.gz")
@@ -473,6 +652,140 @@ def scenario_collection_output_directory_txt_gz(ctx, scenario, collection, resul
     return os.path.join(*scenario_collection_output(ctx, scenario, collection, result_type, skip_num=skip_num, tmp_prefix=tmp_prefix, append=".txt.gz"))
 
 
+# Partial outputs of a drained run
+#
+# A collection which was not completed (or whose summary could not be
+# written) is uploaded below PARTIAL_OUTPUT with
+# the same layout as below 'output', followed by the marker
+# PARTIAL_OUTPUT/ligand-lists/<tranche>/<collection name>/<number>.remaining.json.gz
+# with the dockings already done and the ones which remain. Since the
+# ligand-lists status of 'output' is not written, the collection is still
+# incomplete for vf_aws_get_status.py and vf_aws_resubmit_failed.py. The next
+# run of the collection (a retry of the job or a resubmission) continues from
+# the marker and removes the partial outputs once the collection is complete.
+
+def partial_output_path(dest_path):
+    return f"{PARTIAL_OUTPUT}{dest_path[len('output'):]}"
+
+
+def partial_marker_path(ctx, collection):
+    return partial_output_path(os.path.join(*collection_output(ctx, collection, "ligand-lists", append=REMAINING_SUFFIX)))
+
+
+def download_object(ctx, dest_path, local_path):
+
+    object_name = f"{ctx['config']['object_store_job_data_prefix']}/{dest_path}"
+
+    try:
+        with open(local_path, 'wb') as f:
+            ctx['s3'].download_fileobj(
+                ctx['config']['object_store_bucket'], object_name, f)
+    except botocore.exceptions.ClientError as error:
+        if os.path.isfile(local_path):
+            os.remove(local_path)
+        if error.response['Error']['Code'] in ("NoSuchKey", "404"):
+            return False
+        raise(error)
+
+    return True
+
+
+def load_partial_collection(ctx, collection):
+
+    # Returns the docking log entries of an earlier partial run of the
+    # collection (with their results and logs restored), or None
+    marker_path = os.path.join(ctx['temp_dir'], f"{collection['key']}{REMAINING_SUFFIX}")
+    if not download_object(ctx, partial_marker_path(ctx, collection), marker_path):
+        return None
+
+    with gzip.open(marker_path, "rt") as read_file:
+        marker = json.load(read_file)
+
+    for scenario_key in ctx['config']['docking_scenarios']:
+        scenario = ctx['config']['docking_scenarios'][scenario_key]
+        for result_type in ["results", "logfiles"]:
+            tarpath = scenario_collection_output_directory_tgz(ctx, scenario, collection, result_type, tmp_prefix=1)
+            os.makedirs(os.path.dirname(tarpath), exist_ok=True)
+            dest_path = scenario_collection_output_directory_tgz(ctx, scenario, collection, result_type, tmp_prefix=0)
+            if not download_object(ctx, partial_output_path(dest_path), tarpath):
+                continue
+            with tarfile.open(tarpath) as tar:
+                tar.extractall(os.path.dirname(tarpath))
+            os.remove(tarpath)
+
+    logging.info(f"Continuing {collection['key']}: {len(marker['completed'])} dockings done, "
+                 f"{len(marker['remaining'])} remaining")
+
+    return marker['completed']
+
+
+def get_collection_outputs(ctx, collection):
+
+    # (local file, destination) of all outputs of a collection, the
+    # ligand-lists status last since it marks the collection as complete
+    outputs = []
+    for scenario_key in ctx['config']['docking_scenarios']:
+        scenario = ctx['config']['docking_scenarios'][scenario_key]
+
+        for result_type, path_function, suffix in [
+                ('results', scenario_collection_output_directory_tgz, ""),
+                ('results', scenario_collection_output_directory_tgz, vf_blocktar.INDEX_SUFFIX),
+                ('logfiles', scenario_collection_output_directory_tgz, ""),
+                ('summaries', scenario_collection_output_directory_txt_gz, "")]:
+            outputs.append((
+                f"{path_function(ctx, scenario, collection, result_type, tmp_prefix=1)}{suffix}",
+                f"{path_function(ctx, scenario, collection, result_type, tmp_prefix=0)}{suffix}"))
+
+    for path_function in [collection_output_directory_status_gz, collection_output_directory_status_json_gz]:
+        outputs.append((
+            path_function(ctx, collection, "ligand-lists", tmp_prefix=1),
+            path_function(ctx, collection, "ligand-lists", tmp_prefix=0)))
+
+    return outputs
+
+
+def upload_collection(ctx, collection):
+
+    outputs = get_collection_outputs(ctx, collection)
+
+    if(len(collection['remaining']) == 0 and not collection['summary_failed']):
+        for src, dest_path in outputs:
+            copy_output(ctx, {'src': src, 'dest_path': dest_path})
+
+        # Remove what an earlier partial run left (not critical if it fails)
+        if(collection['resumed']):
+            for dest_path in [partial_marker_path(ctx, collection)] + \
+                    [partial_output_path(dest_path) for src, dest_path in outputs]:
+                try:
+                    ctx['s3'].delete_object(Bucket=ctx['config']['object_store_bucket'],
+                                            Key=f"{ctx['config']['object_store_job_data_prefix']}/{dest_path}")
+                except botocore.exceptions.ClientError as error:
+                    logging.warning(f"Could not remove the partial output {dest_path} ({error})")
+        return
+
+    # A summary which could not be written is missing here
+    for src, dest_path in outputs:
+        if os.path.isfile(src):
+            copy_output(ctx, {'src': src, 'dest_path': partial_output_path(dest_path)})
+
+    if(len(collection['remaining']) > 0):
+        reason = "SIGTERM" if drain_requested else "aws_batch_drain_after_seconds"
+    else:
+        reason = "summary"
+
+    marker = {
+        'collection': collection['key'],
+        'reason': reason,
+        'completed': [entry for entry in collection['log_json'] if 'scenario_key' in entry],
+        'remaining': collection['remaining']
+    }
+    marker_file = os.path.join(ctx['temp_dir'], f"{collection['key']}{REMAINING_SUFFIX}")
+    with gzip.open(marker_file, "wt") as write_file:
+        json.dump(marker, write_file)
+
+    copy_output(ctx, {'src': marker_file, 'dest_path': partial_marker_path(ctx, collection)})
+
+
 def process(ctx):
 
     # Figure out who I am...
@@ -524,8 +837,8 @@ def process(ctx):
             for ligand_key in collection['ligands']:
                 scenario_results[scenario_key][collection_key]['ligands'][ligand_key] = {
                 }
-                scenario_results[scenario_key][collection_key]['ligands'][ligand_key]['scores'] = [
-                ]
+                scenario_results[scenario_key][collection_key]['ligands'][ligand_key]['scores'] = {
+                }
 
     # See if any of the ligands in the collections are invalid for processing
 
@@ -579,6 +892,28 @@ def process(ctx):
         for ligand_key in ligands_to_skip:
             collection['ligands'].pop(ligand_key, None)
 
+    # Dockings already done by an earlier run which was drained
+
+    completed_dockings = set()
+    for collection_key in collections:
+        collection = collections[collection_key]
+        collection['remaining'] = []
+
+        completed_entries = load_partial_collection(ctx, collection)
+        collection['resumed'] = completed_entries is not None
+
+        for entry in completed_entries or []:
+            completed_dockings.add((collection_key, entry['ligand'], entry['scenario_key'], entry['replica_index']))
+            if(entry['status'] == "succeeded"):
+                scenario_results[entry['scenario_key']][collection_key]['ligands'][entry['ligand']]['scores'][
+                    entry['replica_index']] = entry['score']
+                collection['log'].append(
+                    f"{entry['ligand']} {entry['scenario_key']} {entry['replica_index']} succeeded total-time:{entry['seconds']}")
+            else:
+                collection['log'].append(
+                    f"{entry['ligand']} {entry['scenario_key']} {entry['replica_index']} {entry['status']} total-time:{entry['seconds']}")
+            collection['log_json'].append(entry)
+
     # Create the task list based on the scenarios and replicas required
     tasklist = []
     for scenario_key in ctx['config']['docking_scenarios']:
@@ -607,6 +942,9 @@ def process(ctx):
                 # For each replica
                 for replica_index in range(scenario['replicas']):
 
+                    if((collection_key, ligand_key, scenario_key, replica_index) in completed_dockings):
+                        continue
+
                     task = {
                         'collection_key': collection_key,
                         'ligand_key': ligand_key,
@@ -623,10 +961,40 @@ def process(ctx):
                     tasklist.append(task)
 
     # At this point we have all of the individual tasks generated. The next step is to divide these up to
-    # multiple processes in a pool. Each task will run independently and generate results
-
-    with multiprocessing.Pool(processes=int(vcpus_to_use)) as pool:
-        res = pool.map(process_ligand, tasklist)
+    # multiple processes in a pool. Each task will run independently and generate results.
+    # If the run is drained, the tasks which did not finish are returned separately
+
+    res, remaining_tasks = run_docking_tasks(ctx, tasklist, int(vcpus_to_use))
+
+    for task in remaining_tasks:
+        collections[task['collection_key']]['remaining'].append({
+            'ligand': task['ligand_key'], 'scenario_key': task['scenario_key'], 'replica_index': task['replica_index']
+        })
+
+    # Energy check of the best pose of all successful dockings, evaluated in
+    # batches instead of one obenergy process per ligand
+
+    if(ctx['config'].get('energy_check') == "true" and ligand_format == "pdbqt"):
+        checked_results = [task_result for task_result in res if task_result['status'] == "success"]
+        try:
+            energy_results = vf_energy_check.check_energies(
+                [task_result['output_path'] for task_result in checked_results],
+                float(ctx['config']['energy_max']), threads=int(vcpus_to_use), work_dir=ctx['temp_dir'])
+        except RuntimeError as err:
+            # Without the evaluator every pose would fail, keep the results unchecked
+            logging.error(f"ENERGY CHECK SKIPPED, the {len(checked_results)} docking results are not checked: {err}")
+            checked_results = []
+
+        # A failed replica loses its score, the summary of the ligand then
+        # lists only the other replicas (see create_summary_file)
+        for task_result in checked_results:
+            passed, energy = energy_results[task_result['output_path']]
+            if not passed:
+                logging.info(f"{task_result['collection_key']} {task_result['ligand_key']} {task_result['scenario_key']} "
+                             f"{task_result['replica_index']} failed the energy check (energy: {energy})")
+                task_result['status'] = "energy-check:failed"
+                if os.path.isfile(task_result['output_path']):
+                    os.remove(task_result['output_path'])
 
     # We are done with all of the docking now, we need to summarize them all
 
@@ -643,8 +1011,7 @@ def process(ctx):
         # Check to see if it was successful or not...
         if(task_result['status'] == "success"):
             score = task_result['score']
-            scenario_results[scenario_key][collection_key]['ligands'][ligand_key]['scores'].append(
-                score)
+            scenario_results[scenario_key][collection_key]['ligands'][ligand_key]['scores'][replica_index] = score
             collection['log'].append(
                 f"{ligand_key} {scenario_key} {replica_index} succeeded total-time:{task_result['seconds']:.2f}")
             collection['log_json'].append({
@@ -657,19 +1024,35 @@ def process(ctx):
             collection['log_json'].append({'ligand': ligand_key, 'scenario_key': scenario_key, 'replica_index': replica_index,
                                           'status': task_result['status'], 'seconds': f"{task_result['seconds']:.2f}"})
 
-    # Now we can generate the summary files
+    # Now we can generate the summary files. A collection whose summary
+    # cannot be written is uploaded as a partial output so that its results
+    # are kept and the retry writes the summary again
+
+    for collection_key in collections:
+        collections[collection_key]['summary_failed'] = False
+
     for scenario_key in ctx['config']['docking_scenarios']:
         scenario = ctx['config']['docking_scenarios'][scenario_key]
         for collection_key in collections:
             collection = collections[collection_key]
             scenario_result = scenario_results[scenario_key][collection_key]
 
-            output_name = create_summary_file(
-                ctx, scenario, collection, scenario_result)
+            try:
+                output_name = create_summary_file(
+                    ctx, scenario, collection, scenario_result)
+            except Exception as err:
+                logging.error(
+                    f"ERR: Cannot write the {scenario_key} summary of {collection_key}. type: {str(type(err))}, err: {str(err)}")
+                collection['summary_failed'] = True
+                output_name = scenario_collection_output_directory_txt_gz(
+                    ctx, scenario, collection, "summaries", tmp_prefix=1)
+                if os.path.isfile(output_name):
+                    os.remove(output_name)
 
     # Generate the compressed files
 
     for scenario_key in ctx['config']['docking_scenarios']:
+        scenario = ctx['config']['docking_scenarios'][scenario_key]
         for collection_key in collections:
             collection = collections[collection_key]
 
@@ -683,37 +1066,6 @@ def process(ctx):
 
             # Summaries are already gzipped when written
 
-    # Now we need to move these data files -- S3 or elsewhere on the filesystem
-
-    for scenario_key in ctx['config']['docking_scenarios']:
-        for collection_key in collections:
-            collection = collections[collection_key]
-
-
-            logging.info(f"Completed scenario: {scenario_key}, collection: {collection_key}")
-
-            # Copy the results..
-            copy_output(ctx,
-                        {
-                            'src': scenario_collection_output_directory_tgz(ctx, scenario, collection, 'results', tmp_prefix=1),
-                            'dest_path': scenario_collection_output_directory_tgz(ctx, scenario, collection, 'results', tmp_prefix=0),
-                        }
-                        )
-
-            copy_output(ctx,
-                        {
-                            'src': scenario_collection_output_directory_tgz(ctx, scenario, collection, 'logfiles', tmp_prefix=1),
-                            'dest_path': scenario_collection_output_directory_tgz(ctx, scenario, collection, 'logfiles', tmp_prefix=0),
-                        }
-                        )
-
-            copy_output(ctx,
-                        {
-                            'src': scenario_collection_output_directory_txt_gz(ctx, scenario, collection, 'summaries', tmp_prefix=1),
-                            'dest_path': scenario_collection_output_directory_txt_gz(ctx, scenario, collection, 'summaries', tmp_prefix=0),
-                        }
-                        )
-
     # We also have one file at the collection level
     for collection_key in collections:
         collection = collections[collection_key]
@@ -732,24 +1084,39 @@ def process(ctx):
             for log_entry in collection['log']:
                 summmary_fp.write(f"{log_entry}\n")
 
-        # Now transfer over txt file
-        copy_output(ctx,
-                    {
-                        'src': ligand_log_file,
-                        'dest_path': collection_output_directory_status_gz(ctx, collection, "ligand-lists", tmp_prefix=0),
-                    }
-                    )
-
         with gzip.open(ligand_log_file_json, "wt") as summmary_fp:
             json.dump(collection['log_json'], summmary_fp, indent=4)
 
-        # Now transfer over JSON file
-        copy_output(ctx,
-                    {
-                        'src': ligand_log_file_json,
-                        'dest_path': collection_output_directory_status_json_gz(ctx, collection, "ligand-lists", tmp_prefix=0),
-                    }
-                    )
+    # Now we need to move these data files -- S3 or elsewhere on the filesystem.
+    # Collections which were not completed are uploaded as partial outputs
+
+    for collection_key in collections:
+        collection = collections[collection_key]
+
+        if(len(collection['remaining']) > 0 and
+                not any('scenario_key' in entry for entry in collection['log_json'])):
+            logging.warning(f"Drained before any docking of collection {collection_key} completed")
+            continue
+
+        upload_collection(ctx, collection)
+
+        if(len(collection['remaining']) > 0):
+            logging.warning(f"Partial collection: {collection_key}, {len(collection['remaining'])} dockings remaining")
+        elif(collection['summary_failed']):
+            logging.warning(f"Partial collection: {collection_key}, summary missing")
+        else:
+            logging.info(f"Completed collection: {collection_key}")
+
+    # The job has to fail so that it is retried (or picked up by
+    # vf_aws_resubmit_failed.py) and the remaining dockings are run
+
+    if(len(remaining_tasks) > 0):
+        logging.error(f"Drained with {len(remaining_tasks)} dockings remaining")
+        exit(1)
+
+    if(any(collections[collection_key]['summary_failed'] for collection_key in collections)):
+        logging.error("Summaries missing for some collections")
+        exit(1)
 
 
 def copy_output(ctx, obj):
@@ -769,11 +1136,14 @@ def copy_output(ctx, obj):
     return True
 
 
+# Every member is compressed on its own and indexed in <tarfile>.idx.json, so
+# single poses can be fetched later with a range request (vf_blocktar.py get)
+
 def generate_tarfile(ctx, dir):
     os.chdir(str(Path(dir).parents[0]))
 
-    with tarfile.open(f"{os.path.basename(dir)}.tar.gz", "x:gz") as tar:
-        tar.add(os.path.basename(dir))
+    vf_blocktar.create_archive(
+        f"{os.path.basename(dir)}.tar.gz", ".", os.path.basename(dir))
 
     return os.path.join(str(Path(dir).parents[0]), f"{os.path.basename(dir)}.tar.gz")
 
@@ -785,6 +1155,10 @@ def main():
     log_level = os.environ.get('VF_LOGLEVEL', 'INFO').upper()
     logging.basicConfig(level=log_level)
 
+    # AWS Batch sends SIGTERM before stopping the job (e.g. spot interruption)
+    ctx['start_time'] = time.time()
+    signal.signal(signal.SIGTERM, request_drain)
+
 
     # Get the initial bootstrap information
     object_name = os.getenv('VF_CONFIG_OBJECT')
@@ -25,6 +25,15 @@
 #
 # Revision history:
 # 2021-06-29  Original version
+# 2026-10-19  Read and update the SQLite state store instead of status.json
+# 2026-10-19  Split out update_jobline_status for the submission daemon
+# 2026-10-19  Poll child status in bulk with list_jobs across joblines
+# 2026-10-19  Harvest changed result files only, with parallel download and parsing
+# 2026-10-19  Summary from running totals; added --watch
+# 2026-10-19  Throughput, ETA and utilization metrics as JSON and Prometheus text
+# 2026-10-19  Harvest only the collections of newly completed subjobs
+# 2026-10-19  Energy check failures counted on their own; snapshots downsampled
+# 2026-10-19  Collections without output are not requested again on every refresh
 #
 # ---------------------------------------------------------------------------
 
@@ -32,14 +41,24 @@
 import os
 import json
 import boto3
-import botocore
-import re
-import tempfile
 import gzip
 import time
+import argparse
+import concurrent.futures
+import vf_aws_state
 from botocore.config import Config
+from vf_controlfile import parse_config
 
 
+STATUS_THREADS = 16
+HARVEST_DOWNLOAD_THREADS = 32
+
+METRICS_JSON_PATH = "../workflow/metrics.json"
+METRICS_PROM_PATH = "../workflow/metrics.prom"
+METRICS_WINDOW_SECONDS = 3600
+# Snapshots older than the window are kept at this interval
+SNAPSHOT_DOWNSAMPLE_SECONDS = 3600
+
 batch_job_statuses = {
     'SUBMITTED': {
         'check_parent': 1,
@@ -86,52 +105,56 @@ batch_job_statuses = {
 }
 
 
-def parse_config(filename):
+def get_subjob_stats(subjob_status, vcpus, attempts):
 
-    config = {}
+    # Determine the cores used for this
+    if(batch_job_statuses[subjob_status]['completed'] != 1):
+        return None
 
-    with open(filename, "r") as read_file:
-        for index, line in enumerate(read_file):
-            match = re.search(
-                r'^(?P<parameter>.*?)\s*=\s*(?P<parameter_value>.*?)\s*$', line)
-            if(match):
-                matches = match.groupdict()
-                config[matches['parameter']] = matches['parameter_value']
+    vcpus = int(vcpus)
 
-    return config
+    vcpu_total_min = 0.0
+    vcpu_successful_attempt_min = 0.0
 
+    # Look at each attempt
+    for attempt in attempts:
+        if 'startedAt' not in attempt:
+            continue
 
-def process(config):
+        start_msec = int(attempt['startedAt'])
+        stop_msec = int(attempt['stoppedAt'])
 
-    aws_config = Config(
-        region_name=config['aws_region']
-    )
+        vcpu_min = ((stop_msec - start_msec) / 1000) * vcpus / 60
+
+        if(attempt['statusReason'] == "Essential container in task exited"):
+            vcpu_successful_attempt_min = vcpu_min
+
+        vcpu_total_min += vcpu_min
+
+    return {
+        'vcpu_min_from_completed': vcpu_total_min,
+        'vcpu_min_from_retried': vcpu_total_min - vcpu_successful_attempt_min
+    }
 
-    client = boto3.client('batch', config=aws_config)
 
-    # load the status file that is keeping track of the data
-    with open("../workflow/status.json", "r") as read_file:
-        status = json.load(read_file)
+# Check the parent status of each submitted jobline that is not complete yet
+# and record it in the state store. Returns the joblines whose subjobs need
+# to be looked at because their array status changed.
 
-    collections = status['collections']
-    workunits = status['workunits']
+def update_jobline_status(client, conn):
 
     workunits_to_check = []
 
-    for workunit_key in workunits:
-        current_workunit = workunits[workunit_key]
+    for workunit in vf_aws_state.get_submitted_workunits(conn):
 
         # Has this even been submitted?
-        if 'status' in current_workunit and current_workunit['status']['vf_job_status'] == "SUBMITTED":
-            if('aws_batch_status' not in current_workunit['status']
-               or batch_job_statuses[current_workunit['status']['aws_batch_status']]['check_parent'] == 1):
-                workunits_to_check.append(workunit_key)
+        if(workunit['aws_batch_status'] is None
+           or batch_job_statuses[workunit['aws_batch_status']]['check_parent'] == 1):
+            workunits_to_check.append(workunit)
 
     # Check the parent status of each one to see if anything has changed.
     # AWS Batch can handle up to 100 at a time
 
-    print("Looking for updated jobline status - starting")
-
     workunit_subjobs_to_check = []
 
     for status_index in range(0, len(workunits_to_check), 100):
@@ -139,98 +162,296 @@ def process(config):
         job_keys_to_check = []
         job_key_mapping = {}
 
-        for workunit_key in workunits_to_check[status_index:(status_index + 100)]:
-            workunit = workunits[workunit_key]
-            job_key_mapping[workunit['status']['job_id']] = workunit_key
-            job_keys_to_check.append(workunit['status']['job_id'])
+        for workunit in workunits_to_check[status_index:(status_index + 100)]:
+            job_key_mapping[workunit['job_id']] = workunit
+            job_keys_to_check.append(workunit['job_id'])
 
         response = client.describe_jobs(jobs=job_keys_to_check)
 
         if 'jobs' in response:
-            for job in response['jobs']:
+            with conn:
+                for job in response['jobs']:
+
+                    current_workunit = job_key_mapping[job['jobId']]
+
+                    # Do we need to check the overall subjob status? We don't need to unless the job has started
+                    # and it's different than the last time we checked
+
+                    # This status is one we should check the subjobs
+                    if(batch_job_statuses[job['status']]['check_subjobs'] == 1):
+                        # If we have never checked it before or it's different than what it was the
+                        # last time we checked
+                        if(current_workunit['aws_batch_status'] is None or
+                                job['arrayProperties']['statusSummary'] != json.loads(current_workunit['aws_batch_status_array'])):
+                            workunit_subjobs_to_check.append(
+                                current_workunit['workunit_key'])
+
+                    # Update the status
+                    vf_aws_state.set_workunit_batch_status(
+                        conn, current_workunit['workunit_key'], job['status'], job['arrayProperties']['statusSummary'])
+
+    return workunit_subjobs_to_check
+
+
+# Status of each child of an array job, by array index. Only the statuses
+# that the array status summary reports any children in are listed.
+
+def list_array_children(client, job_id, status_array):
+
+    children = {}
+
+    paginator = client.get_paginator('list_jobs')
+
+    for job_status, count in status_array.items():
+        if(count == 0 or job_status not in batch_job_statuses):
+            continue
+
+        for page in paginator.paginate(arrayJobId=job_id, jobStatus=job_status):
+            for job in page['jobSummaryList']:
+                children[job['arrayProperties']['index']] = job['status']
+
+    return children
+
+
+def describe_subjobs(client, units):
+
+    response = client.describe_jobs(
+        jobs=[f"{unit['job_id']}:{unit['subjob_key']}" for unit in units])
+
+    return response.get('jobs', [])
+
+
+# Count the events in a ligand-lists status file (runs in a worker process)
+
+def count_log_events(collection_status_path):
+
+    collection_status = {
+        'ligands_removed': 0,
+        'ligands_failed_docking': 0,
+        'ligands_succeeded_docking': 0,
+        'unknown_event': 0,
+        'ligands_failed_energy_check': 0,
+    }
+    docking_seconds = 0.0
+
+    with gzip.open(collection_status_path, 'rt') as f:
+        log_events = json.load(f)
+
+    for event in log_events:
+        if(event['status'] == "failed"):
+            collection_status['ligands_removed'] += 1
+        elif(event['status'] == "failed(docking)"):
+            collection_status['ligands_failed_docking'] += 1
+        elif(event['status'] == "succeeded"):
+            collection_status['ligands_succeeded_docking'] += 1
+        elif(event['status'] == "energy-check:failed"):
+            collection_status['ligands_failed_energy_check'] += 1
+        else:
+            collection_status['unknown_event'] += 1
+
+        docking_seconds += float(event.get('seconds', 0))
+
+    return collection_status, docking_seconds
+
+
+# Returns True if the output was downloaded, False if there is no output
+# and None if the download failed (it is tried again on the next refresh)
 
-                current_workunit = workunits[job_key_mapping[job['jobId']]]
+def download_collection_status(s3, bucket, object_name, collection_status_path):
 
-                # Do we need to check the overall subjob status? We don't need to unless the job has started
-                # and it's different than the last time we checked
+    os.makedirs(os.path.dirname(collection_status_path), exist_ok=True)
 
-                # This status is one we should check the subjobs
-                if(batch_job_statuses[job['status']]['check_subjobs'] == 1):
-                    # If we have never checked it before or it's different than what it was the
-                    # last time we checked
-                    if(('aws_batch_status' not in current_workunit['status'] or
-                            job['arrayProperties']['statusSummary'] != current_workunit['status']['aws_batch_status_array'])
-                       ):
-                        workunit_subjobs_to_check.append(
-                            job_key_mapping[job['jobId']])
+    # Download next to the destination and move it in place, so an
+    # interrupted download never leaves a truncated file behind
+    temp_path = f"{collection_status_path}.part"
 
-                # Update the status
-                current_workunit['status']['aws_batch_status'] = job['status']
-                current_workunit['status']['aws_batch_status_array'] = job['arrayProperties']['statusSummary']
+    try:
+        response = s3.get_object(Bucket=bucket, Key=object_name)
+        with open(temp_path, 'wb') as f:
+            for chunk in response['Body'].iter_chunks():
+                f.write(chunk)
+        os.replace(temp_path, collection_status_path)
+    except s3.exceptions.NoSuchKey:
+        return False
+    except Exception as err:
+        print(f"Error downloading {object_name} [this is likely temporary]: {err}")
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        return None
+
+    return True
+
+
+# Harvest the ligand-lists output of the collections of completed subjobs
+# that have not been harvested yet, so a refresh only costs what changed
+# since the last one. A subjob is marked processed (and not looked at again)
+# once the output of all of its collections has been harvested or found
+# missing. Missing outputs are only looked for again when the status of the
+# subjob changes; collections that are published again (e.g. by
+# vf_aws_resubmit_failed.py) are harvested again once their new subjob
+# completes.
+
+def harvest_collection_status(config, conn):
+
+    storage_workdir = "../workflow/completed_status"
+    os.makedirs(storage_workdir, exist_ok=True)
+
+    s3 = boto3.client('s3', config=Config(
+        max_pool_connections=HARVEST_DOWNLOAD_THREADS))
+
+    output_prefix = f"{config['object_store_job_data_prefix']}/output/ligand-lists/"
+
+    to_harvest = []
+    for collection_full_name in vf_aws_state.get_unharvested_collections(conn):
+        # {tranche}/{collection_name}/{collection_number}.json.gz
+        collection_tranche = collection_full_name[:2]
+        collection_name, collection_number = collection_full_name.split("_", 1)
+        object_name = f"{output_prefix}{collection_tranche}/{collection_name}/{collection_number}.json.gz"
+        collection_status_path = os.path.join(
+            storage_workdir, collection_tranche, collection_name, f"{collection_number}.json.gz")
+        to_harvest.append((collection_full_name, object_name, collection_status_path))
+
+    print(f"{len(to_harvest)} collections of completed subtasks not harvested yet")
+
+    if(len(to_harvest) == 0):
+        with conn:
+            vf_aws_state.update_processed_subjobs(conn)
+        return
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=HARVEST_DOWNLOAD_THREADS) as download_executor, \
+            concurrent.futures.ProcessPoolExecutor() as parse_executor:
+
+        download_futures = {}
+        for item in to_harvest:
+            download_futures[download_executor.submit(
+                download_collection_status, s3, config['object_store_bucket'], item[1], item[2])] = item
+
+        # Hand each file to the parsers as soon as it is downloaded
+        parse_futures = {}
+        missing = 0
+        for future in concurrent.futures.as_completed(download_futures):
+            item = download_futures[future]
+            downloaded = future.result()
+            if(downloaded):
+                parse_futures[parse_executor.submit(
+                    count_log_events, item[2])] = item
+            elif(downloaded is not None):
+                vf_aws_state.set_collection_output_missing(conn, item[0])
+                missing += 1
+
+        counter = 0
+        harvested = 0
+
+        for future in concurrent.futures.as_completed(parse_futures):
+            collection_full_name, object_name, collection_status_path = parse_futures[future]
+
+            counter += 1
+
+            try:
+                collection_status, docking_seconds = future.result()
+            except Exception as err:
+                print(f"Error opening {collection_status_path}: {err}")
+                if os.path.exists(collection_status_path):
+                    os.remove(collection_status_path)
+                continue
+
+            vf_aws_state.set_collection_status(
+                conn, collection_full_name, collection_status, docking_seconds)
+            harvested += 1
+
+            # Commit regularly so an interrupted harvest keeps its progress
+            if(counter % 1000 == 0):
+                conn.commit()
+                percent = (counter / len(parse_futures)) * 100
+                print(f".... {percent: .2f}%")
+
+    with conn:
+        vf_aws_state.update_processed_subjobs(conn)
+
+    print(f"Harvested {harvested} result files, {missing} collections without output")
+
+
+# Bring the state store up to date with AWS Batch. Only joblines that are not
+# complete yet are checked, and only the children of arrays whose status
+# changed are looked at.
+
+def refresh_status(client, conn):
+
+    print("Looking for updated jobline status - starting")
+
+    workunit_subjobs_to_check = update_jobline_status(client, conn)
 
     print("\nLooking for updated jobline status - done\n")
 
     print("Looking for updated subtask status - starting")
 
-    subjobids_to_check = []
+    workunits = [vf_aws_state.get_workunit(conn, workunit_key)
+                 for workunit_key in workunit_subjobs_to_check]
 
-    # For each case where the subjob information may have changed, add to the list to lookup
-    for workunit_key in workunit_subjobs_to_check:
-        workunit = workunits[workunit_key]
+    # Get the status of all children of each array job in bulk, several
+    # joblines at a time
+    with concurrent.futures.ThreadPoolExecutor(max_workers=STATUS_THREADS) as executor:
+        children_by_workunit = list(executor.map(
+            lambda x: list_array_children(client, x['job_id'], json.loads(x['aws_batch_status_array'])), workunits))
 
-        # Ignore ones that we already know are complete (SUCCEEDED and FAILED) from a previous run
-        for subjob_key in current_workunit['subjobs']:
-            subjob = workunit['subjobs'][subjob_key]
+    subjobids_to_check = []
+    counter = 0
 
-            if 'status' not in subjob:
-                subjob['status'] = 'UNKNOWN'
+    for workunit, children in zip(workunits, children_by_workunit):
 
-            if(subjob['status'] != "SUCCEEDED" and subjob['status'] != "FAILED"):
-                subjobids_to_check.append(
-                    {'workunit_key': workunit_key, 'subjob_key': subjob_key})
+        workunit_key = workunit['workunit_key']
 
-    # Lookup status in batches of 100
-    counter = 0
-    for status_index in range(0, len(subjobids_to_check), 100):
+        with conn:
+            for subjob in vf_aws_state.get_subjobs(conn, workunit_key):
 
-        job_keys_to_check = []
-        job_key_mapping = {}
+                subjob_status = children.get(subjob['subjob_key'])
 
-        for unit in subjobids_to_check[status_index:(status_index + 100)]:
+                if(subjob_status is None or subjob_status == subjob['status']):
+                    continue
 
-            workunit = workunits[unit['workunit_key']]
+                if(batch_job_statuses[subjob_status]['completed'] == 1):
+                    # The vCPU accounting needs the attempts of the subjob
+                    subjobids_to_check.append(
+                        {'workunit_key': workunit_key, 'subjob_key': subjob['subjob_key'], 'job_id': workunit['job_id']})
+                else:
+                    vf_aws_state.set_subjob_status(
+                        conn, workunit_key, subjob['subjob_key'], subjob_status, workunit['vcpus'] or 8)
 
-            job_key_mapping[f"{workunit['status']['job_id']}:{unit['subjob_key']}"] = unit
-            job_keys_to_check.append(
-                f"{workunit['status']['job_id']}:{unit['subjob_key']}")
+        counter += 1
 
-        response = client.describe_jobs(jobs=job_keys_to_check)
+        if(counter % 100 == 0):
+            percent = (counter / len(workunits)) * 100
+            print(f".... {percent: .2f}%")
 
-        if 'jobs' in response:
-            for job in response['jobs']:
+    print(f"Looking up the attempts of {len(subjobids_to_check)} completed subtasks")
 
-                workunit_key = job_key_mapping[job['jobId']]['workunit_key']
-                subjob_key = job_key_mapping[job['jobId']]['subjob_key']
+    # Lookup status in batches of 100
+    batches = [subjobids_to_check[status_index:(status_index + 100)]
+               for status_index in range(0, len(subjobids_to_check), 100)]
 
-                workunit = workunits[workunit_key]
-                subjob = workunit['subjobs'][subjob_key]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=STATUS_THREADS) as executor:
+        for batch, jobs in zip(batches, executor.map(lambda x: describe_subjobs(client, x), batches)):
 
-                subjob['status'] = job['status']
-                subjob['detailed_status'] = {
-                    'container': {
-                        'vcpus': job['container']['vcpus']
-                    },
-                    'attempts': job['attempts']
-                }
+            job_key_mapping = {}
+            for unit in batch:
+                job_key_mapping[f"{unit['job_id']}:{unit['subjob_key']}"] = unit
 
-        counter += 100
+            with conn:
+                for job in jobs:
 
-        if(counter % 1000 == 0):
-            percent = (counter / len(subjobids_to_check)) * 100
-            print(f".... {percent: .2f}%")
+                    workunit_key = job_key_mapping[job['jobId']]['workunit_key']
+                    subjob_key = job_key_mapping[job['jobId']]['subjob_key']
+
+                    vf_aws_state.set_subjob_status(
+                        conn, workunit_key, subjob_key, job['status'],
+                        job['container']['vcpus'], job['attempts'],
+                        get_subjob_stats(job['status'], job['container']['vcpus'], job['attempts']))
 
     print("\nLooking for updated subtask status - done")
 
+
+def print_summary(conn):
+
     print("Generating summary")
 
     # Update all of the status information
@@ -256,84 +477,31 @@ def process(config):
         for key in batch_job_statuses:
             total_stats_by_status[category][key] = 0
 
-    for workunit_key in workunits:
+    # Update workunit status
+    for job_status, job_count in vf_aws_state.get_job_totals(conn).items():
+        if job_status in batch_job_statuses:
+            total_stats_by_status['jobs'][job_status] += job_count
 
-        workunit = workunits[workunit_key]
+    # Subjobs that have not been looked up yet take the status of their parent
+    for subjob_status, subjob_totals in vf_aws_state.get_subjob_totals(conn).items():
 
-        if 'status' not in workunit:
+        if subjob_status not in batch_job_statuses:
             continue
 
-        # Update workunit status
-        total_stats_by_status['jobs'][workunit['status']
-                                      ['aws_batch_status']] += 1
-
-        for subjob_key in workunit['subjobs']:
-            subjob = workunit['subjobs'][subjob_key]
-
-            # How many ligands are there in this subjob
-            total_ligands_in_subjob = 0
-            for collection_record in subjob['collections']:
-                collection_key, collection_count = collection_record
-                total_ligands_in_subjob += collection_count
-
-            # What status is it in?
+        # Update Subjob status
+        total_stats_by_status['subjobs'][subjob_status] += subjob_totals['subjobs']
+        total_stats_by_status['ligands'][subjob_status] += int(
+            subjob_totals['ligand_count'])
 
-            # If we already have it set ... use that
-            subjob_status = "UNKNOWN"
-            if('status' in subjob):
-                subjob_status = subjob['status']
-            elif('aws_batch_status' in workunit['status']):
-                parent_status = workunit['status']['aws_batch_status']
-                subjob_status = parent_status
+        # Determine the cores used for this
+        if(batch_job_statuses[subjob_status]['completed'] == 1):
+            total_stats['total_reattempts'] += int(subjob_totals['reattempts'])
+            total_stats['vcpu_min_from_completed'] += subjob_totals['vcpu_min_from_completed']
+            total_stats['vcpu_min_from_retried'] += subjob_totals['vcpu_min_from_retried']
+            total_stats_by_status['vcpu_min'][subjob_status] += subjob_totals['vcpu_min_from_completed']
 
-            # Update Subjob status
-            total_stats_by_status['subjobs'][subjob_status] += 1
-            total_stats_by_status['ligands'][subjob_status] += int(
-                total_ligands_in_subjob)
-
-            # Determine the cores used for this
-            if(batch_job_statuses[subjob_status]['completed'] == 1):
-
-                # How many vcpus?
-                vcpus = int(subjob['detailed_status']['container']['vcpus'])
-
-                vcpu_total_min = 0.0
-                vcpu_successful_attempt_min = 0.0
-
-                # Look at each attempt
-                for attempt in subjob['detailed_status']['attempts']:
-                    if 'startedAt' not in attempt:
-                        continue
-
-                    start_msec = int(attempt['startedAt'])
-                    stop_msec = int(attempt['stoppedAt'])
-
-                    vcpu_min = ((stop_msec - start_msec) / 1000) * vcpus / 60
-
-                    if(attempt['statusReason'] == "Essential container in task exited"):
-                        vcpu_successful_attempt_min = vcpu_min
-
-                    vcpu_total_min += vcpu_min
-
-                # Update attempts #
-                total_stats['total_reattempts'] += len(
-                    subjob['detailed_status']['attempts']) - 1
-
-                # Update the summary
-                total_stats['vcpu_min_from_completed'] += vcpu_total_min
-                total_stats['vcpu_min_from_retried'] += vcpu_total_min - \
-                    vcpu_successful_attempt_min
-                total_stats_by_status['vcpu_min'][subjob_status] += vcpu_total_min
-
-                subjob['stats'] = {
-                    'vcpu_min_from_completed': vcpu_total_min,
-                    'vcpu_min_from_retried': vcpu_total_min - vcpu_successful_attempt_min
-                }
-
-            elif(subjob_status == "RUNNING"):
-                # How many vcpus?
-                vcpus = int(subjob['detailed_status']['container']['vcpus'])
-                total_stats['active_vcpus'] += vcpus
+        elif(subjob_status == "RUNNING"):
+            total_stats['active_vcpus'] += int(subjob_totals['vcpus'])
 
     for category in ("ligands", "jobs", "subjobs", "vcpu_min"):
         total_stats_by_status[category]['TOTAL'] = 0
@@ -385,131 +553,13 @@ def process(config):
     print("")
     print(f"Active vCPUs: {total_stats['active_vcpus']}")
 
-    # Now get the data from each of the runs and see how successful we have been
-
-    print("Processing results files")
-
-    storage_workdir = "../workflow/completed_status"
-    os.makedirs(storage_workdir, exist_ok=True)
-
-    s3 = boto3.client('s3')
-
-    # Start by getting the completed collection information
-
-    ligands_removed = 0
-    ligands_failed_docking = 0
-    ligands_succeeded_docking = 0
-    unknown_event = 0
-
-    counter = 0
-
-    for workunit_key in workunits:
-        workunit = workunits[workunit_key]
-
-        counter += 1
-
-        if(counter % 10 == 0):
-            percent = (counter / len(workunits)) * 100
-            print(f".... {percent: .2f}%")
-
-        if 'status' not in workunit:
-            continue
-
-        # Look at each subjob
-        for subjob_key in workunit['subjobs']:
-
-            subjob = workunit['subjobs'][subjob_key]
-
-            if('status' not in subjob):
-                continue
-
-            if(subjob['status'] == "SUCCEEDED" or subjob['status'] == "FAILED"):
-
-                if('processed' not in subjob or subjob['processed'] == 0):
-
-                    for collection_string in subjob['collections']:
-
-                        collection_full_name, collection_count = collection_string
-
-                        collection_tranche = collection_full_name[:2]
-                        collection_name, collection_number = collection_full_name.split(
-                            "_", 1)
-
-                        collection = collections[collection_full_name]
-                        if('status' not in collection):
-                            collection['status'] = {
-                                'ligands_removed': 0,
-                                'ligands_failed_docking': 0,
-                                'ligands_succeeded_docking': 0,
-                                'unknown_event': 0,
-                            }
-
-                        collection_status_path = os.path.join(
-                            storage_workdir, collection_tranche, collection_name, f"{collection_number}.json.gz")
-
-                        # Have we already downloaded the file?
-                        if(not os.path.exists(collection_status_path)):
-
-                            os.makedirs(os.path.join(
-                                storage_workdir, collection_tranche, collection_name), exist_ok=True)
-                            src_location = f"{config['object_store_job_data_prefix']}/output/ligand-lists/{collection_tranche}/{collection_name}/{collection_number}.json.gz"
-
-                            try:
-                                with open(collection_status_path, 'wb') as f:
-                                    s3.download_fileobj(
-                                        config['object_store_bucket'], src_location, f)
-                            except Exception as err:
-                                print(
-                                    f"Error downloading {src_location} [this is likely temporary]")
-                                print(
-                                    f"--> jobline: {workunit_key}, subjob_index: {subjob_key}, jobid: {workunit['status']['job_id']}:{subjob_key}")
-
-                                if os.path.exists(collection_status_path):
-                                    os.remove(collection_status_path)
-
-                                continue
-
-                        try:
-                            with gzip.open(collection_status_path, 'rt') as f:
-                                log_events = json.load(f)
-
-                                for event in log_events:
-                                    if(event['status'] == "failed"):
-                                        collection['status']['ligands_removed'] += 1
-                                    elif(event['status'] == "failed(docking)"):
-                                        collection['status']['ligands_failed_docking'] += 1
-                                    elif(event['status'] == "succeeded"):
-                                        collection['status']['ligands_succeeded_docking'] += 1
-                                    else:
-                                        collection['status']['unknown_event'] += 1
-
-                            subjob['processed'] = 1
-
-                        except Exception as err:
-                            print(f"Error opening {collection_status_path}")
-                            print(
-                                f"--> jobline: {workunit_key}, subjob_index: {subjob_key}, jobid: {workunit['status']['job_id']}:{subjob_key}")
-                            if os.path.exists(collection_status_path):
-                                os.remove(collection_status_path)
-
     # Roll up information from all collections
 
     total_collections = {
-        'status': {
-            'ligands_removed': 0,
-            'ligands_failed_docking': 0,
-            'ligands_succeeded_docking': 0,
-            'unknown_event': 0,
-        },
+        'status': vf_aws_state.get_collection_status_totals(conn),
         'status_percent': {}
     }
 
-    for collection_key in collections:
-        collection = collections[collection_key]
-        if('status' in collection):
-            for event_type in collection['status']:
-                total_collections['status'][event_type] += collection['status'][event_type]
-
     total_events = 0
     for event_type in total_collections['status']:
         total_events += total_collections['status'][event_type]
@@ -524,7 +574,8 @@ def process(config):
             total_collections['status_percent'][event_type] = "--"
 
     print("")
-    for category in ['ligands_succeeded_docking', 'ligands_removed', 'ligands_failed_docking', 'unknown_event']:
+    for category in ['ligands_succeeded_docking', 'ligands_removed', 'ligands_failed_docking',
+                     'ligands_failed_energy_check', 'unknown_event']:
         metric = total_collections['status'][category]
         metric_percent = total_collections['status_percent'][category]
         print(f"{category}: {metric} ({metric_percent}%)")
@@ -535,17 +586,154 @@ def process(config):
 #	print(f"vCPU seconds per ligand: {vcpu_seconds:0.2f} [excludes failed and removed - based on actual]")
 #
 
-    print("Writing the json status file out")
 
-    # Output all of the information about the workunits into JSON so we can easily grab this data in the future
-    with open("../workflow/status.json", "w") as json_out:
-        json.dump(status, json_out)
+# Record a snapshot of the totals and derive the rates over the last
+# METRICS_WINDOW_SECONDS from the snapshots. Written as JSON and in the
+# Prometheus text format (for the node_exporter textfile collector).
+
+def record_metrics(conn):
+
+    now = time.time()
+
+    subjob_totals = vf_aws_state.get_subjob_totals(conn)
+    collection_totals = vf_aws_state.get_collection_totals(conn)
+
+    def subjob_total(statuses, column):
+        return sum(subjob_totals[key][column] for key in statuses if key in subjob_totals)
+
+    snapshot = {
+        'timestamp': now,
+        'ligands_total': vf_aws_state.get_total_ligand_count(conn),
+        'ligands_completed': int(subjob_total(("SUCCEEDED", "FAILED"), 'ligand_count')),
+        'ligands_succeeded': int(subjob_total(("SUCCEEDED",), 'ligand_count')),
+        'dockings_succeeded': int(collection_totals['ligands_succeeded_docking']),
+        'vcpu_min_from_completed': subjob_total(("SUCCEEDED", "FAILED"), 'vcpu_min_from_completed'),
+        'docking_seconds': collection_totals['docking_seconds'],
+        'active_vcpus': int(subjob_total(("RUNNING",), 'vcpus'))
+    }
+    completed_ligands_by_queue = vf_aws_state.get_completed_ligands_by_queue(
+        conn)
+
+    with conn:
+        vf_aws_state.add_snapshot(conn, snapshot, completed_ligands_by_queue)
+        vf_aws_state.prune_snapshots(conn, now - METRICS_WINDOW_SECONDS, SNAPSHOT_DOWNSAMPLE_SECONDS)
+
+    window_start, window_start_queues = vf_aws_state.get_window_start_snapshot(
+        conn, now - METRICS_WINDOW_SECONDS)
+
+    metrics = dict(snapshot)
+    metrics['ligands_remaining'] = snapshot['ligands_total'] - \
+        snapshot['ligands_completed']
+    metrics['ligands_per_hour'] = None
+    metrics['eta_seconds'] = None
+    metrics['vcpu_utilization'] = None
+    metrics['queues'] = {}
+
+    window_seconds = now - window_start['timestamp']
+    if(window_seconds > 0):
+        metrics['window_seconds'] = window_seconds
+        metrics['ligands_per_hour'] = (
+            snapshot['ligands_completed'] - window_start['ligands_completed']) * 3600 / window_seconds
+        if(metrics['ligands_per_hour'] > 0):
+            metrics['eta_seconds'] = metrics['ligands_remaining'] * \
+                3600 / metrics['ligands_per_hour']
+
+    # Share of the billed vCPU time of completed subjobs that was spent docking
+    if(snapshot['vcpu_min_from_completed'] > 0):
+        metrics['vcpu_utilization'] = snapshot['docking_seconds'] / \
+            (snapshot['vcpu_min_from_completed'] * 60)
+
+    for job_queue, ligands_completed in completed_ligands_by_queue.items():
+        metrics['queues'][job_queue] = {'ligands_completed': ligands_completed}
+        if(window_seconds > 0):
+            metrics['queues'][job_queue]['ligands_per_hour'] = (
+                ligands_completed - window_start_queues.get(job_queue, 0)) * 3600 / window_seconds
+
+    with open(f"{METRICS_JSON_PATH}.tmp", "w") as json_out:
+        json.dump(metrics, json_out, indent=4)
+    os.replace(f"{METRICS_JSON_PATH}.tmp", METRICS_JSON_PATH)
+
+    prom_lines = []
+    for key in ('ligands_total', 'ligands_completed', 'ligands_succeeded', 'ligands_remaining', 'dockings_succeeded',
+                'vcpu_min_from_completed', 'docking_seconds', 'active_vcpus', 'ligands_per_hour', 'eta_seconds', 'vcpu_utilization'):
+        if(metrics[key] is not None):
+            prom_lines.append(f"vf_aws_{key} {metrics[key]}")
+    for job_queue, queue_metrics in metrics['queues'].items():
+        for key, value in queue_metrics.items():
+            prom_lines.append(f'vf_aws_queue_{key}{{queue="{job_queue}"}} {value}')
+
+    with open(f"{METRICS_PROM_PATH}.tmp", "w") as prom_out:
+        prom_out.write("\n".join(prom_lines) + "\n")
+    os.replace(f"{METRICS_PROM_PATH}.tmp", METRICS_PROM_PATH)
+
+    return metrics
+
+
+def print_metrics(metrics):
+
+    if(metrics['ligands_per_hour'] is not None):
+        print(
+            f"Ligands per hour (last {metrics['window_seconds'] / 60:.0f} min): {metrics['ligands_per_hour']:.0f}")
+    if(metrics['eta_seconds'] is not None):
+        print(
+            f"Estimated time to completion: {metrics['eta_seconds'] / 3600:.1f} hours ({metrics['ligands_remaining']} ligands remaining)")
+    if(metrics['vcpu_utilization'] is not None):
+        print(
+            f"vCPU utilization (docking time / billed vCPU time): {metrics['vcpu_utilization'] * 100:.1f}%")
+    for job_queue, queue_metrics in sorted(metrics['queues'].items()):
+        if('ligands_per_hour' in queue_metrics):
+            print(
+                f"  {job_queue}: {queue_metrics['ligands_per_hour']:.0f} ligands per hour")
+    print("")
+
+
+def process(config, watch_interval=None):
+
+    aws_config = Config(
+        region_name=config['aws_region'],
+        max_pool_connections=STATUS_THREADS
+    )
+
+    client = boto3.client('batch', config=aws_config)
+
+    # open the state store that is keeping track of the data
+    conn = vf_aws_state.open_state()
+
+    while True:
+        refresh_status(client, conn)
+
+        # Now get the data from each of the runs and see how successful we have been
+
+        print("Processing results files")
+
+        harvest_collection_status(config, conn)
+
+        if(watch_interval is not None):
+            # Clear the screen before drawing the summary
+            print("\033[2J\033[H", end="")
+            print(time.strftime('%Y-%m-%d %H:%M:%S'))
+
+        print_summary(conn)
+        print_metrics(record_metrics(conn))
+
+        if(watch_interval is None):
+            break
+
+        time.sleep(watch_interval)
+
+    conn.close()
 
 
 def main():
 
+    parser = argparse.ArgumentParser(
+        description="Get the status of the AWS Batch jobs")
+    parser.add_argument("--watch", type=int, metavar="N",
+                        help="keep running and redraw the summary every N seconds")
+    args = parser.parse_args()
+
     config = parse_config("../workflow/control/all.ctrl")
-    process(config)
+    process(config, args.watch)
 
 
 if __name__ == '__main__':
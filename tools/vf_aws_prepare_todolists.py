@@ -24,58 +24,69 @@
 #
 # Revision history:
 # 2021-06-29  Original version
+# 2026-10-19  Publish workunits as packed task files with a subjob index
+# 2026-10-19  Record workunits in the SQLite state store
+# 2026-10-19  Added --incremental to only publish new or changed collections
+# 2026-10-19  Split out pack_workunits for the resubmission of failed subjobs
+# 2026-10-19  Stop at the first task file that cannot be uploaded
 #
 # ---------------------------------------------------------------------------
 
 
 import tempfile
-import tarfile
-import os
 import json
-import re
 import boto3
+import botocore
 import logging
 import sys
+import argparse
+import vf_aws_state
+from vf_controlfile import parse_config
 
 
-def parse_config(filename):
+# Workunits are published as a single packed object so that each subjob can
+# fetch only its own task list with a byte-range GET. Layout:
+#
+#   VFTASKS1 <subjob count, 8 digits>\n                      (header)
+#   <offset, 12 digits> <length, 12 digits>\n  (one per subjob, in subjob order)
+#   <JSON task list of subjob 0><JSON task list of subjob 1>...
+#
+# Offsets are absolute byte positions within the object.
 
-    config = {}
+TASKS_HEADER_MAGIC = "VFTASKS1"
+TASKS_HEADER_LEN = len(f"{TASKS_HEADER_MAGIC} {0:08d}\n")
+TASKS_INDEX_ENTRY_LEN = len(f"{0:012d} {0:012d}\n")
 
-    with open(filename, "r") as read_file:
-        for index, line in enumerate(read_file):
-            match = re.search(
-                r'^(?P<parameter>.*?)\s*=\s*(?P<parameter_value>.*?)\s*$', line)
-            if(match):
-                matches = match.groupdict()
-                config[matches['parameter']] = matches['parameter_value']
 
-    return config
+def pack_workunit(workunit_subjobs):
 
+    payloads = []
+    for subjob_key in workunit_subjobs:
+        payloads.append(json.dumps(
+            workunit_subjobs[subjob_key]['collections']).encode("utf-8"))
 
-def publish_workunit(ctx, index, workunit_subjobs, status):
+    header = f"{TASKS_HEADER_MAGIC} {len(payloads):08d}\n".encode("utf-8")
 
-    # Create a temporary directory
-    temp_dir = tempfile.TemporaryDirectory()
-    temp_dir_tar = tempfile.TemporaryDirectory()
+    index = []
+    offset = TASKS_HEADER_LEN + TASKS_INDEX_ENTRY_LEN * len(payloads)
+    for payload in payloads:
+        index.append(f"{offset:012d} {len(payload):012d}\n".encode("utf-8"))
+        offset += len(payload)
 
-    for subjob_index, subjob_key in enumerate(workunit_subjobs):
+    return b"".join([header, *index, *payloads])
 
-        with open(f'{temp_dir.name}/{subjob_index}', 'w') as fp:
-            for collection, collection_count in workunit_subjobs[subjob_key]['collections']:
-                fp.write(f'{collection} {collection_count}\n')
-                status['collections'][collection] = {
-                    'workunit_key': index, 'subjob_key': subjob_index, 'count': collection_count}
 
-        with open(f'{temp_dir.name}/{subjob_index}.json', 'w') as json_out:
-            json.dump(workunit_subjobs[subjob_key]
-                      ['collections'], json_out, indent=4)
+# Returns False if the task file could not be uploaded; the workunit must
+# not be recorded in the state store then
 
-    # Generate the tarball
+def publish_workunit(ctx, index, workunit_subjobs):
 
-    out = tarfile.open(f'{temp_dir_tar.name}/{index}.tar.gz', mode='w')
-    out.add(temp_dir.name, arcname="vf_tasks")
-    out.close()
+    # Generate the packed task file
+
+    temp_dir = tempfile.TemporaryDirectory()
+
+    with open(f'{temp_dir.name}/{index}.tasks', 'wb') as fp:
+        fp.write(pack_workunit(workunit_subjobs))
 
     # Upload it to S3....
     #
@@ -83,90 +94,61 @@ def publish_workunit(ctx, index, workunit_subjobs, status):
         ctx['config']['object_store_job_data_prefix'],
         "input",
         "tasks",
-        f"{index}.tar.gz"
+        f"{index}.tasks"
     ]
     object_name = "/".join(object_path)
 
     try:
         response = ctx['s3'].upload_file(
-            f'{temp_dir_tar.name}/{index}.tar.gz', ctx['config']['object_store_bucket'], object_name)
-    except ClientError as e:
+            f'{temp_dir.name}/{index}.tasks', ctx['config']['object_store_bucket'], object_name)
+    except (botocore.exceptions.ClientError, botocore.exceptions.BotoCoreError,
+            boto3.exceptions.S3UploadFailedError) as e:
         logging.error(e)
+        return False
+    finally:
+        temp_dir.cleanup()
 
-    temp_dir.cleanup()
-    temp_dir_tar.cleanup()
+    return True
 
 
-def process(ctx):
+# Group collections into subjobs of about ligands_todo_per_queue ligands and
+# the subjobs into workunits of aws_batch_array_job_size subjobs. Yields the
+# subjobs of one workunit at a time.
 
-    config = ctx['config']
+def pack_workunits(config, collections):
 
-    status = {
-        'overall': {},
-        'workunits': {},
-        'collections': {}
-    }
-
-    workunits = status['workunits']
-
-    current_workunit_index = 1
     current_workunit_subjobs = {}
     current_subjob_index = 0
 
     leftover_count = 0
     leftover_subjob = []
 
-    counter = 0
-
-    total_lines = 0
-    with open('templates/todo.all') as fp:
-        for index, line in enumerate(fp):
-            total_lines += 1
-
-    print("Generating jobfiles....")
-
-    with open('templates/todo.all') as fp:
-        for index, line in enumerate(fp):
-            collection_name, collection_count = line.split()
-
-            collection_count = int(collection_count)
-
-            if(collection_count >= int(config['ligands_todo_per_queue'])):
-                # create a new collection just for this one
-                #current_workunit.append([ (collection_name, collection_count) ])
+    for collection_name, collection_count in collections:
+
+        if(collection_count >= int(config['ligands_todo_per_queue'])):
+            # create a new collection just for this one
+            #current_workunit.append([ (collection_name, collection_count) ])
+            current_workunit_subjobs[current_subjob_index] = {
+                'collections': [(collection_name, collection_count)]}
+            current_subjob_index += 1
+        else:
+            # add it to the 'leftover pile'
+            leftover_count += collection_count
+            leftover_subjob.append((collection_name, collection_count))
+
+            if(leftover_count >= int(config['ligands_todo_per_queue'])):
+                # current_workunit.append(leftover_subjob)
                 current_workunit_subjobs[current_subjob_index] = {
-                    'collections': [(collection_name, collection_count)]}
+                    'collections': leftover_subjob}
                 current_subjob_index += 1
-            else:
-                # add it to the 'leftover pile'
-                leftover_count += collection_count
-                leftover_subjob.append((collection_name, collection_count))
-
-                if(leftover_count >= int(config['ligands_todo_per_queue'])):
-                    # current_workunit.append(leftover_subjob)
-                    current_workunit_subjobs[current_subjob_index] = {
-                        'collections': leftover_subjob}
-                    current_subjob_index += 1
-                    leftover_subjob = []
-                    leftover_count = 0
-
-            if(len(current_workunit_subjobs) == int(config['aws_batch_array_job_size'])):
-                publish_workunit(ctx, current_workunit_index,
-                                 current_workunit_subjobs, status)
-                workunits[current_workunit_index] = {
-                    'subjobs': current_workunit_subjobs}
-
-                current_workunit_index += 1
-                current_subjob_index = 0
-                current_workunit_subjobs = {}
-
-            counter += 1
-
-            if(counter % 250 == 0):
-                print(".", end="", file=sys.stderr)
-            if(counter % 2000 == 0):
-                percent = (counter / total_lines) * 100
-                print(f" ({percent: .2f}%)", file=sys.stderr)
+                leftover_subjob = []
+                leftover_count = 0
+
+        if(len(current_workunit_subjobs) == int(config['aws_batch_array_job_size'])):
+            yield current_workunit_subjobs
+
+            current_subjob_index = 0
+            current_workunit_subjobs = {}
 
     # If we have leftovers -- process them
     if(leftover_count > 0):
@@ -176,28 +158,116 @@ def process(ctx):
 
     # If the current workunit has any items in it, we need to publish it
     if(len(current_workunit_subjobs) > 0):
-        publish_workunit(ctx, current_workunit_index,
-                         current_workunit_subjobs, status)
-        workunits[current_workunit_index] = {
-            'subjobs': current_workunit_subjobs}
+        yield current_workunit_subjobs
+
+
+def process(ctx, incremental=False):
 
-    print("Writing json")
+    config = ctx['config']
+    conn = ctx['state']
+
+    # In incremental mode the workunits that were already published (and
+    # possibly submitted) are kept as they are. Only collections that are
+    # new in todo.all, or whose ligand count changed, go into new workunits
+    # that are appended after the highest existing index.
+
+    if(incremental):
+        published_collections = vf_aws_state.get_published_collections(conn)
+        first_workunit_index = vf_aws_state.get_max_workunit_key(conn) + 1
+    else:
+        published_collections = {}
+        first_workunit_index = 1
+        vf_aws_state.reset_state(conn)
+
+    collection_counts = {'new': 0, 'changed': 0}
+
+    total_lines = 0
+    with open('templates/todo.all') as fp:
+        for index, line in enumerate(fp):
+            total_lines += 1
+
+    def todo_collections():
+
+        counter = 0
+
+        with open('templates/todo.all') as fp:
+            for index, line in enumerate(fp):
+                collection_name, collection_count = line.split()
+
+                collection_count = int(collection_count)
 
-    # Output all of the information about the workunits into JSON so we can easily grab this data in the future
-    with open("../workflow/status.json", "w") as json_out:
-        json.dump(status, json_out)
+                counter += 1
 
-    os.system('cp ../workflow/status.json ../workflow/status.todolists.json')
+                if(counter % 250 == 0):
+                    print(".", end="", file=sys.stderr)
+                if(counter % 2000 == 0):
+                    percent = (counter / total_lines) * 100
+                    print(f" ({percent: .2f}%)", file=sys.stderr)
 
-    print(f"Generated {current_workunit_index} workunits")
+                if collection_name in published_collections:
+                    if(published_collections[collection_name] == collection_count):
+                        continue
+                    collection_counts['changed'] += 1
+                else:
+                    collection_counts['new'] += 1
+
+                yield collection_name, collection_count
+
+    print("Generating jobfiles....")
+
+    current_workunit_index = first_workunit_index
+    publish_failed = False
+
+    for workunit_subjobs in pack_workunits(config, todo_collections()):
+        # The collections of a workunit that was not uploaded stay
+        # unpublished, so the next --incremental run picks them up again
+        if not publish_workunit(ctx, current_workunit_index, workunit_subjobs):
+            publish_failed = True
+            break
+        with conn:
+            vf_aws_state.add_workunit(
+                conn, current_workunit_index, workunit_subjobs)
+        current_workunit_index += 1
+
+    # Keep a copy of the state as it was right after the todolists were generated
+    vf_aws_state.snapshot(conn, "../workflow/status.todolists.db")
+
+    if(incremental):
+        print(
+            f"Found {collection_counts['new']} new and {collection_counts['changed']} changed collections")
+        if(collection_counts['changed'] > 0):
+            print("Changed collections are published again in the new workunits. If the workunits they were")
+            print("published in before have not been submitted yet, those will still process the old entries.")
+
+    if(current_workunit_index > first_workunit_index):
+        print(
+            f"Generated workunits {first_workunit_index} to {current_workunit_index - 1}")
+    else:
+        print("No workunits generated")
+
+    if(publish_failed):
+        print(f"Could not upload the task file of workunit {current_workunit_index}, stopped. Run again with --incremental.")
+
+    return not publish_failed
 
 
 def main():
 
+    parser = argparse.ArgumentParser(
+        description="Generate the AWS Batch workunits from templates/todo.all")
+    parser.add_argument("--incremental", action="store_true",
+                        help="keep the published workunits and only add workunits for new or changed collections")
+    args = parser.parse_args()
+
     ctx = {}
     ctx['s3'] = boto3.client('s3')
     ctx['config'] = parse_config("../workflow/control/all.ctrl")
-    process(ctx)
+    ctx['state'] = vf_aws_state.open_state()
+    published = process(ctx, args.incremental)
+    ctx['state'].close()
+
+    if not published:
+        sys.exit(1)
 
 
 if __name__ == '__main__':
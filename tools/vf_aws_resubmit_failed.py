@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+
+# Copyright (C) 2019 Christoph Gorgulla
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# This file is part of VirtualFlow.
+#
+# VirtualFlow is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# VirtualFlow is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with VirtualFlow.  If not, see <https://www.gnu.org/licenses/>.
+
+# ---------------------------------------------------------------------------
+#
+# Description: Resubmit only the collections of failed AWS Batch subjobs
+#
+#              Collects the collections of FAILED subjobs (and of SUCCEEDED
+#              subjobs whose ligand-lists output is missing), packs them
+#              into new workunits after the highest existing one, publishes
+#              their task files and submits them. Collections that have
+#              output are never resubmitted. Each resubmitted collection is
+#              linked to its original subjob in the 'retries' table of the
+#              state store.
+#
+#              Run vf_aws_get_status.py first so the subjob status is current.
+#
+# Revision history:
+# 2026-10-19  Original version
+# 2026-10-19  Stop at the first task file that cannot be uploaded
+#
+# ---------------------------------------------------------------------------
+
+
+import os
+import sys
+import boto3
+import botocore
+import argparse
+import concurrent.futures
+import vf_aws_state
+from vf_aws_prepare_todolists import pack_workunits, publish_workunit
+from vf_aws_submit_jobs import make_submit_context, recover_submitting, submit_joblines
+from vf_controlfile import parse_config
+
+
+def collection_output_exists(ctx, collection_full_name):
+
+    collection_tranche = collection_full_name[:2]
+    collection_name, collection_number = collection_full_name.split("_", 1)
+
+    # Already downloaded by vf_aws_get_status.py
+    if os.path.exists(os.path.join("../workflow/completed_status", collection_tranche, collection_name, f"{collection_number}.json.gz")):
+        return True
+
+    object_name = f"{ctx['config']['object_store_job_data_prefix']}/output/ligand-lists/{collection_tranche}/{collection_name}/{collection_number}.json.gz"
+
+    try:
+        ctx['s3'].head_object(
+            Bucket=ctx['config']['object_store_bucket'], Key=object_name)
+    except botocore.exceptions.ClientError as error:
+        if error.response['Error']['Code'] in ("NoSuchKey", "404"):
+            return False
+        raise error
+
+    return True
+
+
+def process(ctx, failed_only, dry_run, submit):
+
+    config = ctx['config']
+    conn = ctx['state']
+
+    candidates = vf_aws_state.get_retry_candidates(
+        conn, include_succeeded=not failed_only)
+
+    print(f"Checking the output of {len(candidates)} collections....")
+
+    # Only collections without any output are resubmitted
+    with concurrent.futures.ThreadPoolExecutor(max_workers=16) as executor:
+        output_exists = list(executor.map(
+            lambda x: collection_output_exists(ctx, x['collection_key']), candidates))
+
+    retry_collections = [candidate for candidate, exists in zip(
+        candidates, output_exists) if not exists]
+
+    failed_subjobs = {(candidate['workunit_key'], candidate['subjob_key'])
+                      for candidate in retry_collections}
+
+    print(
+        f"{len(retry_collections)} collections ({sum(candidate['count'] for candidate in retry_collections)} ligands) from {len(failed_subjobs)} subjobs need to be resubmitted")
+
+    if(dry_run or len(retry_collections) == 0):
+        return True
+
+    original_subjob = {candidate['collection_key']: (
+        candidate['workunit_key'], candidate['subjob_key']) for candidate in retry_collections}
+
+    first_workunit_index = vf_aws_state.get_max_workunit_key(conn) + 1
+    current_workunit_index = first_workunit_index
+    publish_failed = False
+
+    for workunit_subjobs in pack_workunits(config, [(candidate['collection_key'], candidate['count']) for candidate in retry_collections]):
+        # Collections that were not published stay with their original
+        # subjob and are picked up again by the next run
+        if not publish_workunit(ctx, current_workunit_index, workunit_subjobs):
+            print(f"Could not upload the task file of workunit {current_workunit_index}, stopped")
+            publish_failed = True
+            break
+
+        with conn:
+            vf_aws_state.add_workunit(
+                conn, current_workunit_index, workunit_subjobs)
+            for subjob_index, subjob in enumerate(workunit_subjobs.values()):
+                for collection_key, collection_count in subjob['collections']:
+                    vf_aws_state.add_retry(
+                        conn, collection_key, *original_subjob[collection_key], current_workunit_index, subjob_index)
+
+        current_workunit_index += 1
+
+    if(current_workunit_index == first_workunit_index):
+        return False
+
+    print(
+        f"Generated workunits {first_workunit_index} to {current_workunit_index - 1}")
+
+    if(not submit):
+        print("Submit them with vf_aws_submit_jobs.py")
+        return not publish_failed
+
+    submit_ctx = make_submit_context(config)
+    recover_submitting(submit_ctx, conn)
+    counts = submit_joblines(submit_ctx, conn, config, range(
+        first_workunit_index, current_workunit_index))
+
+    print(f"Submitted {counts['submitted']} joblines, {counts['failed']} failed")
+
+    return not publish_failed
+
+
+def main():
+
+    parser = argparse.ArgumentParser(
+        description="Resubmit the collections of failed AWS Batch subjobs in new, compact joblines")
+    parser.add_argument("--failed-only", action="store_true",
+                        help="only consider FAILED subjobs, not SUCCEEDED subjobs with missing output")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="only report what would be resubmitted")
+    parser.add_argument("--no-submit", action="store_true",
+                        help="publish the new joblines but do not submit them")
+    args = parser.parse_args()
+
+    ctx = {}
+    ctx['s3'] = boto3.client('s3')
+    ctx['config'] = parse_config("../workflow/control/all.ctrl")
+    ctx['state'] = vf_aws_state.open_state()
+    completed = process(ctx, args.failed_only, args.dry_run, not args.no_submit)
+    ctx['state'].close()
+
+    if not completed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
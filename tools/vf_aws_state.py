@@ -0,0 +1,733 @@
+#!/usr/bin/env python3
+
+# Copyright (C) 2019 Christoph Gorgulla
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# This file is part of VirtualFlow.
+#
+# VirtualFlow is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# VirtualFlow is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with VirtualFlow.  If not, see <https://www.gnu.org/licenses/>.
+
+# ---------------------------------------------------------------------------
+#
+# Description: Run state store for the AWS Batch tools (SQLite, WAL mode)
+#
+#              The workunits, their subjobs and the collections within each
+#              subjob are kept in ../workflow/status.db so that the tools
+#              only read and write the rows they are working on. Readers
+#              (e.g. a status check) can run while another tool is writing.
+#
+#              Usage: vf_aws_state.py import [status.json]
+#                     vf_aws_state.py snapshot <destination>
+#
+# Revision history:
+# 2026-10-19  Original version
+#
+# ---------------------------------------------------------------------------
+
+
+import os
+import json
+import sqlite3
+import argparse
+import sys
+
+
+STATE_DB_PATH = "../workflow/status.db"
+STATUS_JSON_PATH = "../workflow/status.json"
+
+# Bump this and add a step in migrate() whenever the schema changes
+SCHEMA_VERSION = 1
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS workunits (
+        workunit_key INTEGER PRIMARY KEY,
+        vf_job_status TEXT,
+        job_arn TEXT,
+        job_name TEXT,
+        job_id TEXT,
+        job_queue TEXT,
+        vcpus INTEGER,
+        aws_batch_status TEXT,
+        aws_batch_status_array TEXT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS subjobs (
+        workunit_key INTEGER NOT NULL,
+        subjob_key INTEGER NOT NULL,
+        ligand_count INTEGER NOT NULL DEFAULT 0,
+        status TEXT,
+        effective_status TEXT,
+        vcpus INTEGER,
+        attempts TEXT,
+        reattempts INTEGER NOT NULL DEFAULT 0,
+        vcpu_min_from_completed REAL NOT NULL DEFAULT 0,
+        vcpu_min_from_retried REAL NOT NULL DEFAULT 0,
+        processed INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (workunit_key, subjob_key)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS subjobs_status ON subjobs (status)",
+    "CREATE INDEX IF NOT EXISTS subjobs_workunit_status ON subjobs (workunit_key, status)",
+    # Completed subjobs whose collections have not all been harvested
+    """CREATE INDEX IF NOT EXISTS subjobs_unprocessed ON subjobs (workunit_key, subjob_key)
+       WHERE processed = 0 AND status IN ('SUCCEEDED', 'FAILED')""",
+    """
+    CREATE TABLE IF NOT EXISTS collections (
+        collection_key TEXT PRIMARY KEY,
+        workunit_key INTEGER NOT NULL,
+        subjob_key INTEGER NOT NULL,
+        position INTEGER NOT NULL,
+        count INTEGER NOT NULL,
+        ligands_removed INTEGER,
+        ligands_failed_docking INTEGER,
+        ligands_succeeded_docking INTEGER,
+        unknown_event INTEGER,
+        ligands_failed_energy_check INTEGER,
+        docking_seconds REAL,
+        output_missing INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS collections_subjob ON collections (workunit_key, subjob_key, position)",
+    # Links from resubmitted collections to their original subjob
+    """
+    CREATE TABLE IF NOT EXISTS retries (
+        collection_key TEXT NOT NULL,
+        workunit_key INTEGER NOT NULL,
+        subjob_key INTEGER NOT NULL,
+        retry_workunit_key INTEGER NOT NULL,
+        retry_subjob_key INTEGER NOT NULL,
+        PRIMARY KEY (collection_key, retry_workunit_key)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS retries_subjob ON retries (workunit_key, subjob_key)",
+    # Timestamped copies of the totals for the metrics
+    """
+    CREATE TABLE IF NOT EXISTS snapshots (
+        timestamp REAL PRIMARY KEY,
+        ligands_total INTEGER NOT NULL,
+        ligands_completed INTEGER NOT NULL,
+        ligands_succeeded INTEGER NOT NULL,
+        dockings_succeeded INTEGER NOT NULL,
+        vcpu_min_from_completed REAL NOT NULL,
+        docking_seconds REAL NOT NULL,
+        active_vcpus INTEGER NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS snapshot_queues (
+        timestamp REAL NOT NULL,
+        job_queue TEXT NOT NULL,
+        ligands_completed INTEGER NOT NULL,
+        PRIMARY KEY (timestamp, job_queue)
+    )
+    """,
+]
+
+COLLECTION_EVENT_TYPES = ('ligands_removed', 'ligands_failed_docking',
+                          'ligands_succeeded_docking', 'unknown_event',
+                          'ligands_failed_energy_check')
+
+# Running totals for the status summary. The triggers apply the difference
+# between the old and the new row on every change, so reading the summary
+# does not depend on the size of the run. A subjob is counted under its
+# 'effective_status': its own AWS Batch status, or the status of its parent
+# job as long as the subjob has not been looked up.
+
+SUBJOB_TOTAL_COLUMNS = ('ligand_count', 'reattempts', 'vcpu_min_from_completed',
+                        'vcpu_min_from_retried', 'vcpus')
+COLLECTION_TOTAL_COLUMNS = COLLECTION_EVENT_TYPES + ('docking_seconds',)
+
+
+def get_totals_schema():
+
+    def subjob_delta(row, sign):
+        assignments = [f"subjobs = subjobs {sign} 1"] + \
+            [f"{column} = {column} {sign} COALESCE({row}.{column}, 0)" for column in SUBJOB_TOTAL_COLUMNS]
+        return f"""INSERT OR IGNORE INTO subjob_totals (status) SELECT {row}.effective_status WHERE {row}.effective_status IS NOT NULL;
+                 UPDATE subjob_totals SET {', '.join(assignments)} WHERE status = {row}.effective_status;"""
+
+    def job_delta(row, sign):
+        return f"""INSERT OR IGNORE INTO job_totals (status)
+                     SELECT {row}.aws_batch_status WHERE {row}.vf_job_status = 'SUBMITTED' AND {row}.aws_batch_status IS NOT NULL;
+                 UPDATE job_totals SET jobs = jobs {sign} 1
+                     WHERE {row}.vf_job_status = 'SUBMITTED' AND status = {row}.aws_batch_status;"""
+
+    def collection_delta(row, sign):
+        assignments = [f"{column} = {column} {sign} COALESCE({row}.{column}, 0)"
+                       for column in COLLECTION_TOTAL_COLUMNS]
+        return f"UPDATE collection_totals SET {', '.join(assignments)};"
+
+    return [
+        f"""CREATE TABLE subjob_totals (
+               status TEXT PRIMARY KEY, subjobs INTEGER NOT NULL DEFAULT 0,
+               {', '.join(f'{column} REAL NOT NULL DEFAULT 0' for column in SUBJOB_TOTAL_COLUMNS)})""",
+        "CREATE TABLE job_totals (status TEXT PRIMARY KEY, jobs INTEGER NOT NULL DEFAULT 0)",
+        f"""CREATE TABLE collection_totals (
+               {', '.join(f'{column} REAL NOT NULL DEFAULT 0' for column in COLLECTION_TOTAL_COLUMNS)})""",
+        "INSERT INTO collection_totals DEFAULT VALUES",
+        f"CREATE TRIGGER subjobs_totals_insert AFTER INSERT ON subjobs BEGIN {subjob_delta('NEW', '+')} END",
+        f"CREATE TRIGGER subjobs_totals_delete AFTER DELETE ON subjobs BEGIN {subjob_delta('OLD', '-')} END",
+        f"""CREATE TRIGGER subjobs_totals_update AFTER UPDATE OF effective_status, {', '.join(SUBJOB_TOTAL_COLUMNS)} ON subjobs
+           BEGIN {subjob_delta('OLD', '-')} {subjob_delta('NEW', '+')} END""",
+        f"CREATE TRIGGER workunits_totals_insert AFTER INSERT ON workunits BEGIN {job_delta('NEW', '+')} END",
+        f"CREATE TRIGGER workunits_totals_delete AFTER DELETE ON workunits BEGIN {job_delta('OLD', '-')} END",
+        f"""CREATE TRIGGER workunits_totals_update AFTER UPDATE OF vf_job_status, aws_batch_status ON workunits
+           BEGIN {job_delta('OLD', '-')} {job_delta('NEW', '+')} END""",
+        f"CREATE TRIGGER collections_totals_insert AFTER INSERT ON collections BEGIN {collection_delta('NEW', '+')} END",
+        f"CREATE TRIGGER collections_totals_delete AFTER DELETE ON collections BEGIN {collection_delta('OLD', '-')} END",
+        f"""CREATE TRIGGER collections_totals_update AFTER UPDATE OF {', '.join(COLLECTION_TOTAL_COLUMNS)} ON collections
+           BEGIN {collection_delta('OLD', '-')} {collection_delta('NEW', '+')} END""",
+    ]
+
+
+# Total ligand count and completed ligands per job queue for the metrics,
+# maintained like the totals above. The job queue is a column of the
+# workunit, so a workunit that moves to another queue moves the ligands of
+# its completed subjobs with it.
+
+def get_queue_totals_schema():
+
+    completed = "effective_status IN ('SUCCEEDED', 'FAILED')"
+
+    def ligand_delta(row, sign):
+        return f"UPDATE ligand_totals SET ligands = ligands {sign} {row}.ligand_count;"
+
+    def subjob_queue_delta(row, sign):
+        return f"""INSERT OR IGNORE INTO queue_totals (job_queue)
+                     SELECT w.job_queue FROM workunits w
+                     WHERE w.workunit_key = {row}.workunit_key AND w.job_queue IS NOT NULL AND {row}.{completed};
+                 UPDATE queue_totals SET ligands_completed = ligands_completed {sign} {row}.ligand_count
+                     WHERE {row}.{completed}
+                       AND job_queue = (SELECT w.job_queue FROM workunits w WHERE w.workunit_key = {row}.workunit_key);"""
+
+    def workunit_queue_delta(row, sign):
+        return f"""INSERT OR IGNORE INTO queue_totals (job_queue) SELECT {row}.job_queue WHERE {row}.job_queue IS NOT NULL;
+                 UPDATE queue_totals SET ligands_completed = ligands_completed {sign}
+                     (SELECT COALESCE(SUM(s.ligand_count), 0) FROM subjobs s
+                      WHERE s.workunit_key = {row}.workunit_key AND s.{completed})
+                     WHERE job_queue = {row}.job_queue;"""
+
+    return [
+        "CREATE TABLE ligand_totals (ligands INTEGER NOT NULL DEFAULT 0)",
+        "INSERT INTO ligand_totals DEFAULT VALUES",
+        "CREATE TABLE queue_totals (job_queue TEXT PRIMARY KEY, ligands_completed INTEGER NOT NULL DEFAULT 0)",
+        f"""CREATE TRIGGER subjobs_queue_totals_insert AFTER INSERT ON subjobs
+           BEGIN {ligand_delta('NEW', '+')} {subjob_queue_delta('NEW', '+')} END""",
+        f"""CREATE TRIGGER subjobs_queue_totals_delete AFTER DELETE ON subjobs
+           BEGIN {ligand_delta('OLD', '-')} {subjob_queue_delta('OLD', '-')} END""",
+        f"""CREATE TRIGGER subjobs_queue_totals_update AFTER UPDATE OF workunit_key, effective_status, ligand_count ON subjobs
+           BEGIN {ligand_delta('OLD', '-')} {ligand_delta('NEW', '+')}
+                 {subjob_queue_delta('OLD', '-')} {subjob_queue_delta('NEW', '+')} END""",
+        f"""CREATE TRIGGER workunits_queue_totals_delete AFTER DELETE ON workunits
+           BEGIN {workunit_queue_delta('OLD', '-')} END""",
+        f"""CREATE TRIGGER workunits_queue_totals_update AFTER UPDATE OF job_queue ON workunits
+           BEGIN {workunit_queue_delta('OLD', '-')} {workunit_queue_delta('NEW', '+')} END""",
+    ]
+
+
+# The ligand count of a subjob is the sum of the counts of its collections.
+# When a collection is published again (add_workunit replaces its row) or
+# removed, its count is taken off the subjob it belonged to, so that the
+# ligands are not counted twice.
+
+SUBJOB_LIGAND_COUNT_SCHEMA = [
+    # A subjob whose status changes is harvested again, including the
+    # collections for which no output was found before
+    """CREATE TRIGGER subjobs_status_harvest AFTER UPDATE OF status ON subjobs
+       WHEN OLD.status IS NOT NEW.status
+       BEGIN
+           UPDATE subjobs SET processed = 0
+           WHERE workunit_key = NEW.workunit_key AND subjob_key = NEW.subjob_key;
+           UPDATE collections SET output_missing = 0
+           WHERE workunit_key = NEW.workunit_key AND subjob_key = NEW.subjob_key AND output_missing = 1;
+       END""",
+    """CREATE TRIGGER collections_ligand_count_delete AFTER DELETE ON collections
+       BEGIN
+           UPDATE subjobs SET ligand_count = ligand_count - OLD.count
+           WHERE workunit_key = OLD.workunit_key AND subjob_key = OLD.subjob_key;
+       END""",
+    """CREATE TRIGGER collections_ligand_count_update AFTER UPDATE OF workunit_key, subjob_key, count ON collections
+       BEGIN
+           UPDATE subjobs SET ligand_count = ligand_count - OLD.count
+           WHERE workunit_key = OLD.workunit_key AND subjob_key = OLD.subjob_key;
+           UPDATE subjobs SET ligand_count = ligand_count + NEW.count
+           WHERE workunit_key = NEW.workunit_key AND subjob_key = NEW.subjob_key;
+       END""",
+]
+
+
+def migrate(conn):
+
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+
+    if(version > SCHEMA_VERSION):
+        raise RuntimeError(
+            f"State store schema version {version} is newer than this tool supports ({SCHEMA_VERSION})")
+
+    if(version < 1):
+        with conn:
+            for statement in SCHEMA + get_totals_schema() + get_queue_totals_schema() + SUBJOB_LIGAND_COUNT_SCHEMA:
+                conn.execute(statement)
+            conn.execute("PRAGMA user_version = 1")
+
+
+def open_state(path=STATE_DB_PATH):
+
+    conn = sqlite3.connect(path, timeout=60)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute("PRAGMA busy_timeout = 60000")
+    # The triggers of the totals also run for rows removed by a REPLACE
+    conn.execute("PRAGMA recursive_triggers = ON")
+    migrate(conn)
+
+    return conn
+
+
+def reset_state(conn):
+
+    with conn:
+        for table in ("snapshot_queues", "snapshots", "retries", "collections", "subjobs", "workunits"):
+            conn.execute(f"DELETE FROM {table}")
+
+
+# Consistent point-in-time copy of the store (replaces the old 'cp status.json')
+
+def snapshot(conn, destination):
+
+    if os.path.exists(destination):
+        os.remove(destination)
+
+    target = sqlite3.connect(destination)
+    with target:
+        conn.backup(target)
+    target.close()
+
+
+# Workunits
+
+def add_workunit(conn, workunit_key, workunit_subjobs):
+
+    subjob_rows = []
+    collection_rows = {}
+
+    # A collection listed twice is kept in the last subjob it is listed in
+    for subjob_key, subjob in enumerate(workunit_subjobs.values()):
+        for position, (collection_key, collection_count) in enumerate(subjob['collections']):
+            collection_rows.pop(collection_key, None)
+            collection_rows[collection_key] = (
+                collection_key, workunit_key, subjob_key, position, int(collection_count))
+
+    for subjob_key in range(len(workunit_subjobs)):
+        subjob_rows.append((workunit_key, subjob_key, sum(
+            row[4] for row in collection_rows.values() if row[2] == subjob_key)))
+
+    conn.execute(
+        "INSERT INTO workunits (workunit_key) VALUES (?)", (workunit_key,))
+    conn.executemany(
+        "INSERT INTO subjobs (workunit_key, subjob_key, ligand_count) VALUES (?, ?, ?)", subjob_rows)
+    # A collection that is published again is taken off its old subjob by the
+    # delete trigger. Not INSERT OR REPLACE: the REPLACE would also apply to
+    # the INSERT OR IGNORE statements of the totals triggers and reset them.
+    conn.executemany(
+        "DELETE FROM collections WHERE collection_key = ?", [(collection_key,) for collection_key in collection_rows])
+    conn.executemany(
+        "INSERT INTO collections (collection_key, workunit_key, subjob_key, position, count) VALUES (?, ?, ?, ?, ?)",
+        list(collection_rows.values()))
+
+
+def get_workunit(conn, workunit_key):
+
+    return conn.execute(
+        "SELECT * FROM workunits WHERE workunit_key = ?", (workunit_key,)).fetchone()
+
+
+def get_max_workunit_key(conn):
+
+    return conn.execute("SELECT COALESCE(MAX(workunit_key), 0) FROM workunits").fetchone()[0]
+
+
+def get_workunit_count(conn):
+
+    return conn.execute("SELECT COUNT(*) FROM workunits").fetchone()[0]
+
+
+def get_subjob_count(conn, workunit_key):
+
+    return conn.execute(
+        "SELECT COUNT(*) FROM subjobs WHERE workunit_key = ?", (workunit_key,)).fetchone()[0]
+
+
+def get_max_subjob_ligand_count(conn, workunit_key):
+
+    return conn.execute(
+        "SELECT COALESCE(MAX(ligand_count), 0) FROM subjobs WHERE workunit_key = ?", (workunit_key,)).fetchone()[0]
+
+
+def get_job_vcpus(conn, job_ids):
+
+    job_vcpus = {}
+    job_ids = list(job_ids)
+
+    # Stay below the SQLite limit for the number of host parameters
+    for index in range(0, len(job_ids), 500):
+        chunk = job_ids[index:index + 500]
+        for row in conn.execute(
+                f"SELECT job_id, vcpus FROM workunits WHERE job_id IN ({', '.join('?' * len(chunk))})", chunk):
+            job_vcpus[row[0]] = row[1]
+
+    return job_vcpus
+
+
+def get_unsubmitted_workunit_keys(conn):
+
+    return [row[0] for row in conn.execute(
+        "SELECT workunit_key FROM workunits WHERE vf_job_status IS NULL ORDER BY workunit_key")]
+
+
+# Submitted workunits that AWS Batch has not completed yet
+
+def get_active_workunits(conn):
+
+    return conn.execute(
+        """SELECT w.*, (SELECT COUNT(*) FROM subjobs s WHERE s.workunit_key = w.workunit_key) AS subjob_count
+           FROM workunits w
+           WHERE w.vf_job_status = 'SUBMITTED'
+             AND (w.aws_batch_status IS NULL OR w.aws_batch_status NOT IN ('SUCCEEDED', 'FAILED'))""").fetchall()
+
+
+def get_submitted_workunits(conn):
+
+    return conn.execute(
+        "SELECT * FROM workunits WHERE vf_job_status = 'SUBMITTED' ORDER BY workunit_key").fetchall()
+
+
+def get_submitting_workunits(conn):
+
+    return conn.execute(
+        "SELECT * FROM workunits WHERE vf_job_status = 'SUBMITTING' ORDER BY workunit_key").fetchall()
+
+
+# A workunit is marked SUBMITTING before the submit call is made, so that a
+# run which is interrupted before it could record the job id can look the
+# job up by name instead of submitting it a second time
+
+def set_workunit_submitting(conn, workunit_key, job_name, job_queue, vcpus=None):
+
+    conn.execute(
+        """UPDATE workunits SET vf_job_status = 'SUBMITTING', job_name = ?, job_queue = ?, vcpus = ?
+           WHERE workunit_key = ?""",
+        (job_name, job_queue, vcpus, workunit_key))
+
+
+def set_workunit_submitted(conn, workunit_key, job_arn, job_name, job_id, job_queue=None):
+
+    conn.execute(
+        """UPDATE workunits SET vf_job_status = 'SUBMITTED', job_arn = ?, job_name = ?, job_id = ?,
+                  job_queue = COALESCE(?, job_queue)
+           WHERE workunit_key = ?""",
+        (job_arn, job_name, job_id, job_queue, workunit_key))
+
+
+def set_workunit_unsubmitted(conn, workunit_key):
+
+    conn.execute(
+        """UPDATE workunits SET vf_job_status = NULL, job_arn = NULL, job_name = NULL, job_id = NULL,
+                  job_queue = NULL, vcpus = NULL
+           WHERE workunit_key = ?""",
+        (workunit_key,))
+
+
+def set_workunit_batch_status(conn, workunit_key, aws_batch_status, aws_batch_status_array):
+
+    conn.execute(
+        "UPDATE workunits SET aws_batch_status = ?, aws_batch_status_array = ? WHERE workunit_key = ?",
+        (aws_batch_status, json.dumps(aws_batch_status_array, sort_keys=True), workunit_key))
+
+    # Subjobs that have not been looked up yet follow their parent
+    conn.execute(
+        """UPDATE subjobs SET effective_status = ?
+           WHERE workunit_key = ? AND status IS NULL AND effective_status IS NOT ?""",
+        (aws_batch_status, workunit_key, aws_batch_status))
+
+
+# Subjobs
+
+def get_subjobs(conn, workunit_key):
+
+    return conn.execute(
+        "SELECT * FROM subjobs WHERE workunit_key = ? ORDER BY subjob_key", (workunit_key,)).fetchall()
+
+
+def set_subjob_status(conn, workunit_key, subjob_key, status, vcpus=None, attempts=None, stats=None):
+
+    if stats is None:
+        stats = {}
+
+    conn.execute(
+        """UPDATE subjobs SET status = ?, effective_status = ?, vcpus = ?, attempts = ?, reattempts = ?,
+                  vcpu_min_from_completed = ?, vcpu_min_from_retried = ?
+           WHERE workunit_key = ? AND subjob_key = ?""",
+        (status, status, vcpus,
+         json.dumps(attempts) if attempts is not None else None,
+         len(attempts) - 1 if attempts else 0,
+         stats.get('vcpu_min_from_completed', 0.0),
+         stats.get('vcpu_min_from_retried', 0.0),
+         workunit_key, subjob_key))
+
+
+def set_subjob_processed(conn, workunit_key, subjob_key, processed=1):
+
+    conn.execute(
+        "UPDATE subjobs SET processed = ? WHERE workunit_key = ? AND subjob_key = ?",
+        (processed, workunit_key, subjob_key))
+
+
+# Completed subjobs for which the output of every collection has been
+# harvested or is known to be missing
+
+def update_processed_subjobs(conn):
+
+    conn.execute(
+        """UPDATE subjobs INDEXED BY subjobs_unprocessed SET processed = 1
+           WHERE processed = 0 AND status IN ('SUCCEEDED', 'FAILED')
+             AND NOT EXISTS (SELECT 1 FROM collections c
+                             WHERE c.workunit_key = subjobs.workunit_key AND c.subjob_key = subjobs.subjob_key
+                               AND c.ligands_removed IS NULL AND c.output_missing = 0)""")
+
+
+# Collections
+
+def get_subjob_collections(conn, workunit_key, subjob_key):
+
+    return [(row['collection_key'], row['count']) for row in conn.execute(
+        """SELECT collection_key, count FROM collections
+           WHERE workunit_key = ? AND subjob_key = ? ORDER BY position""",
+        (workunit_key, subjob_key))]
+
+
+def get_published_collections(conn):
+
+    return {row[0]: row[1] for row in conn.execute("SELECT collection_key, count FROM collections")}
+
+
+# Collections of completed subjobs whose output has not been harvested yet.
+# Collections without output are not looked at again until the status of
+# their subjob changes or they are published again.
+
+def get_unharvested_collections(conn):
+
+    return [row[0] for row in conn.execute(
+        """SELECT c.collection_key FROM subjobs s INDEXED BY subjobs_unprocessed
+           JOIN collections c ON c.workunit_key = s.workunit_key AND c.subjob_key = s.subjob_key
+           WHERE s.processed = 0 AND s.status IN ('SUCCEEDED', 'FAILED')
+             AND c.ligands_removed IS NULL AND c.output_missing = 0
+           ORDER BY c.workunit_key, c.subjob_key, c.position""")]
+
+
+def set_collection_status(conn, collection_key, collection_status, docking_seconds=None):
+
+    conn.execute(
+        f"""UPDATE collections SET {', '.join(f'{event_type} = ?' for event_type in COLLECTION_EVENT_TYPES)},
+                  docking_seconds = COALESCE(?, docking_seconds)
+           WHERE collection_key = ?""",
+        (*[collection_status[event_type] for event_type in COLLECTION_EVENT_TYPES],
+         docking_seconds, collection_key))
+
+
+def set_collection_output_missing(conn, collection_key):
+
+    conn.execute(
+        "UPDATE collections SET output_missing = 1 WHERE collection_key = ?", (collection_key,))
+
+
+# Collections of completed subjobs for which no results were harvested. With
+# include_succeeded also those of subjobs that AWS Batch reports as SUCCEEDED.
+
+def get_retry_candidates(conn, include_succeeded=True):
+
+    subjob_statuses = ('FAILED', 'SUCCEEDED') if include_succeeded else ('FAILED',)
+
+    return conn.execute(
+        f"""SELECT c.collection_key, c.count, c.workunit_key, c.subjob_key, s.status
+            FROM collections c
+            JOIN subjobs s ON s.workunit_key = c.workunit_key AND s.subjob_key = c.subjob_key
+            WHERE s.status IN ({', '.join('?' * len(subjob_statuses))}) AND c.ligands_removed IS NULL
+            ORDER BY c.workunit_key, c.subjob_key, c.position""", subjob_statuses).fetchall()
+
+
+def add_retry(conn, collection_key, workunit_key, subjob_key, retry_workunit_key, retry_subjob_key):
+
+    conn.execute(
+        """INSERT OR REPLACE INTO retries (collection_key, workunit_key, subjob_key, retry_workunit_key, retry_subjob_key)
+           VALUES (?, ?, ?, ?, ?)""",
+        (collection_key, workunit_key, subjob_key, retry_workunit_key, retry_subjob_key))
+
+
+def get_collection_status_totals(conn):
+
+    row = conn.execute(
+        f"SELECT {', '.join(COLLECTION_EVENT_TYPES)} FROM collection_totals").fetchone()
+
+    return {event_type: int(value) for event_type, value in zip(COLLECTION_EVENT_TYPES, row)}
+
+
+def get_subjob_totals(conn):
+
+    return {row['status']: row for row in conn.execute("SELECT * FROM subjob_totals")}
+
+
+def get_job_totals(conn):
+
+    return {row['status']: row['jobs'] for row in conn.execute("SELECT * FROM job_totals")}
+
+
+# Snapshots
+
+def get_collection_totals(conn):
+
+    return conn.execute("SELECT * FROM collection_totals").fetchone()
+
+
+def get_total_ligand_count(conn):
+
+    return conn.execute("SELECT ligands FROM ligand_totals").fetchone()[0]
+
+
+def get_completed_ligands_by_queue(conn):
+
+    return {row[0]: row[1] for row in conn.execute("SELECT job_queue, ligands_completed FROM queue_totals")}
+
+
+def add_snapshot(conn, snapshot, completed_ligands_by_queue):
+
+    conn.execute(
+        f"INSERT OR REPLACE INTO snapshots ({', '.join(snapshot)}) VALUES ({', '.join('?' * len(snapshot))})",
+        list(snapshot.values()))
+    conn.executemany(
+        "INSERT OR REPLACE INTO snapshot_queues (timestamp, job_queue, ligands_completed) VALUES (?, ?, ?)",
+        [(snapshot['timestamp'], job_queue, ligands_completed) for job_queue, ligands_completed in completed_ligands_by_queue.items()])
+
+
+# Keep every snapshot since 'keep_all_since' (the metrics window) and only
+# the first snapshot of every 'interval' seconds before it
+
+def prune_snapshots(conn, keep_all_since, interval):
+
+    conn.execute(
+        """DELETE FROM snapshots WHERE timestamp < ? AND timestamp NOT IN (
+               SELECT MIN(timestamp) FROM snapshots WHERE timestamp < ? GROUP BY CAST(timestamp / ? AS INTEGER))""",
+        (keep_all_since, keep_all_since, interval))
+    conn.execute(
+        """DELETE FROM snapshot_queues WHERE timestamp < ?
+             AND timestamp NOT IN (SELECT timestamp FROM snapshots WHERE timestamp < ?)""",
+        (keep_all_since, keep_all_since))
+
+
+# The oldest snapshot that is not older than 'since' (the start of the window
+# the rates are computed over)
+
+def get_window_start_snapshot(conn, since):
+
+    snapshot = conn.execute(
+        "SELECT * FROM snapshots WHERE timestamp >= ? ORDER BY timestamp LIMIT 1", (since,)).fetchone()
+
+    if snapshot is None:
+        return None, {}
+
+    queues = {row['job_queue']: row['ligands_completed'] for row in conn.execute(
+        "SELECT job_queue, ligands_completed FROM snapshot_queues WHERE timestamp = ?", (snapshot['timestamp'],))}
+
+    return snapshot, queues
+
+
+# Import of a status.json written by earlier versions of the tools
+
+def import_status_json(conn, filename):
+
+    with open(filename, "r") as read_file:
+        status = json.load(read_file)
+
+    reset_state(conn)
+
+    with conn:
+        for workunit_key, workunit in status['workunits'].items():
+            add_workunit(conn, int(workunit_key), workunit['subjobs'])
+
+            if 'status' in workunit:
+                workunit_status = workunit['status']
+                set_workunit_submitted(conn, int(workunit_key), workunit_status['job_arn'],
+                                       workunit_status['job_name'], workunit_status['job_id'])
+                if 'aws_batch_status' in workunit_status:
+                    set_workunit_batch_status(conn, int(workunit_key), workunit_status['aws_batch_status'],
+                                              workunit_status['aws_batch_status_array'])
+
+            for subjob_index, subjob in enumerate(workunit['subjobs'].values()):
+                if(subjob.get('status', 'UNKNOWN') != 'UNKNOWN'):
+                    detailed_status = subjob.get('detailed_status', {})
+                    set_subjob_status(conn, int(workunit_key), subjob_index, subjob['status'],
+                                      detailed_status.get('container', {}).get('vcpus'),
+                                      detailed_status.get('attempts'),
+                                      subjob.get('stats'))
+                if(subjob.get('processed', 0) == 1):
+                    set_subjob_processed(conn, int(workunit_key), subjob_index)
+
+        for collection_key, collection in status['collections'].items():
+            if 'status' in collection:
+                set_collection_status(conn, collection_key,
+                                      {**dict.fromkeys(COLLECTION_EVENT_TYPES, 0), **collection['status']})
+
+    return len(status['workunits']), len(status['collections'])
+
+
+def main():
+
+    parser = argparse.ArgumentParser(
+        description="Manage the AWS Batch run state store")
+    parser.add_argument("--db", default=STATE_DB_PATH,
+                        help=f"path to the state store (default: {STATE_DB_PATH})")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    parser_import = subparsers.add_parser(
+        "import", help="import a status.json written by earlier versions (replaces the store contents)")
+    parser_import.add_argument("filename", nargs="?", default=STATUS_JSON_PATH)
+
+    parser_snapshot = subparsers.add_parser(
+        "snapshot", help="write a consistent copy of the store")
+    parser_snapshot.add_argument("destination")
+
+    args = parser.parse_args()
+
+    conn = open_state(args.db)
+
+    if(args.command == "import"):
+        if not os.path.exists(args.filename):
+            print(f"{args.filename} does not exist")
+            sys.exit(1)
+        workunit_count, collection_count = import_status_json(
+            conn, args.filename)
+        print(
+            f"Imported {workunit_count} workunits and {collection_count} collections into {args.db}")
+    elif(args.command == "snapshot"):
+        snapshot(conn, args.destination)
+        print(f"Wrote {args.destination}")
+
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
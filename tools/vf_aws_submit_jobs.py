@@ -24,162 +24,492 @@
 #
 # Revision history:
 # 2021-06-29  Original version
+# 2026-10-19  Track submissions in the SQLite state store
+# 2026-10-19  Concurrent, rate-limited submission with retries on throttling
+# 2026-10-19  Least-loaded queue placement and per-workunit vCPU/memory sizing
+# 2026-10-19  Added --daemon to keep a target number of vCPUs in flight
 #
 # ---------------------------------------------------------------------------
 
 
-import os
 import json
 import boto3
 import botocore
-import re
 import argparse
-import sys
+import time
+import random
+import math
+import threading
+import concurrent.futures
+import vf_aws_state
+from vf_aws_get_status import batch_job_statuses, update_jobline_status
 from botocore.config import Config
+from vf_controlfile import parse_config
 
 
-def parse_config(filename):
+THROTTLING_ERROR_CODES = ('TooManyRequestsException',
+                          'ThrottlingException', 'Throttling')
+SUBMIT_MAX_ATTEMPTS = 8
+SUBMIT_BASE_BACKOFF = 1.0
+SUBMIT_MAX_BACKOFF = 60.0
 
-    config = {}
+# Job statuses in which an array job still waits for resources in its queue
+QUEUED_JOB_STATUSES = ('SUBMITTED', 'PENDING', 'RUNNABLE')
 
-    with open(filename, "r") as read_file:
-        for index, line in enumerate(read_file):
-            match = re.search(
-                r'^(?P<parameter>.*?)\s*=\s*(?P<parameter_value>.*?)\s*$', line)
-            if(match):
-                matches = match.groupdict()
-                #print(f"found {matches['parameter']}")
-                config[matches['parameter']] = matches['parameter_value']
+# Resources of the '-jobdef8' job definition
+JOBDEF_VCPUS = 8
+JOBDEF_MEMORY_MB = 15000
 
-    return config
 
+# Token bucket shared by the submission threads: at most 'rate' submissions
+# per second on average, with bursts of up to 'burst'
+
+def make_rate_limiter(rate, burst):
+
+    return {
+        'rate': float(rate),
+        'burst': float(burst),
+        'tokens': float(burst),
+        'last': time.monotonic(),
+        'lock': threading.Lock()
+    }
+
+
+def acquire_token(limiter):
+
+    while True:
+        with limiter['lock']:
+            now = time.monotonic()
+            limiter['tokens'] = min(limiter['burst'], limiter['tokens'] +
+                                    (now - limiter['last']) * limiter['rate'])
+            limiter['last'] = now
+
+            if(limiter['tokens'] >= 1):
+                limiter['tokens'] -= 1
+                return
+
+            wait_seconds = (1 - limiter['tokens']) / limiter['rate']
+
+        time.sleep(wait_seconds)
+
+
+def is_throttling_error(error):
+
+    return (error.response['Error']['Code'] in THROTTLING_ERROR_CODES
+            or error.response.get('ResponseMetadata', {}).get('HTTPStatusCode') == 429)
+
+
+def submit_job_with_retry(ctx, request):
+
+    for attempt in range(SUBMIT_MAX_ATTEMPTS):
+        acquire_token(ctx['limiter'])
+
+        try:
+            return ctx['client'].submit_job(**request)
+        except botocore.exceptions.ClientError as error:
+            if(not is_throttling_error(error) or attempt == SUBMIT_MAX_ATTEMPTS - 1):
+                raise error
+
+        # Exponential backoff with jitter
+        backoff = min(SUBMIT_MAX_BACKOFF, SUBMIT_BASE_BACKOFF * (2 ** attempt))
+        time.sleep(backoff * random.uniform(0.5, 1.0))
+
+
+# Size the container from the largest subjob of the workunit. A subjob with
+# ligands_todo_per_queue ligands gets the full job definition (8 vCPUs);
+# smaller ones (usually the tail of the todo list) get proportionally fewer
+# vCPUs, rounded up to a power of two, and memory to match.
+
+def get_workunit_resources(config, max_subjob_ligands):
+
+    min_vcpus = int(config.get('aws_batch_min_vcpus', 1))
+    max_vcpus = int(config.get('aws_batch_max_vcpus', JOBDEF_VCPUS))
+
+    vcpus = math.ceil(JOBDEF_VCPUS * max_subjob_ligands /
+                      int(config['ligands_todo_per_queue']))
+    vcpus = 2 ** math.ceil(math.log2(max(1, vcpus)))
+    vcpus = max(min_vcpus, min(max_vcpus, vcpus))
+
+    memory = int(JOBDEF_MEMORY_MB * vcpus / JOBDEF_VCPUS)
+
+    return vcpus, memory
+
+
+# Number of vCPUs that are waiting for resources in each of the queues
+
+def get_queue_loads(ctx, conn, config):
+
+    job_queues = [f"{config['aws_batch_prefix']}-queue{batch_queue_number}"
+                  for batch_queue_number in range(1, int(config['aws_batch_number_of_queues']) + 1)]
+
+    queue_loads = {}
+
+    for job_queue in job_queues:
+
+        jobs = []
+        paginator = ctx['client'].get_paginator('list_jobs')
+        for job_status in QUEUED_JOB_STATUSES:
+            for page in paginator.paginate(jobQueue=job_queue, jobStatus=job_status):
+                jobs.extend(page['jobSummaryList'])
+
+        # Jobs submitted by VirtualFlow have their vCPUs recorded, others
+        # are counted with the size of the job definition
+        job_vcpus = vf_aws_state.get_job_vcpus(conn, [job['jobId'] for job in jobs])
+
+        queue_loads[job_queue] = 0
+        for job in jobs:
+            array_size = job.get('arrayProperties', {}).get('size', 1)
+            queue_loads[job_queue] += array_size * \
+                (job_vcpus.get(job['jobId']) or JOBDEF_VCPUS)
+
+    return queue_loads
+
+
+def get_submit_request(config, jobline, actual_subjobs_count, job_queue, vcpus, memory):
+
+    # AWS Batch doesn't allow an array job of only 1 -- so if it's one
+    # we will launch 2, but the second will exit quickly since it has
+    # no work
+
+    subjobs_count = actual_subjobs_count
+    if(subjobs_count == 1):
+        subjobs_count = 2
+
+    # Path to the data files
+    object_store_input_path = f"s3://{config['object_store_bucket']}/{config['object_store_job_data_prefix']}/input/vf_input.tar.gz"
+
+    return {
+        'jobName': get_job_name(config, jobline),
+        'jobQueue': job_queue,
+        'arrayProperties': {
+            'size': subjobs_count
+        },
+        'jobDefinition': f"{config['aws_batch_prefix']}-jobdef8",
+        'containerOverrides': {
+            'resourceRequirements': [
+                {
+                    'type': 'VCPU',
+                    'value': str(vcpus),
+                },
+                {
+                    'type': 'MEMORY',
+                    'value': str(memory),
+                },
+            ],
+            'environment': [
+                {
+                    'name': 'VF_CONTAINER_VCPUS',
+                    'value': str(vcpus)
+                },
+                {
+                    'name': 'VF_QUEUE_NO_1',
+                    'value': str(jobline)
+                },
+                {
+                    'name': 'VF_OBJECT_INPUT',
+                    'value': object_store_input_path
+                },
+                {
+                    'name': 'VF_CONFIG_OBJECT',
+                    'value': f"{config['object_store_job_data_prefix']}/input/vf_input.tar.gz"
+                },
+                {
+                    'name': 'VF_CONFIG_BUCKET',
+                    'value': config['object_store_bucket']
+                },
+                {
+                    'name': 'VF_MAX_SUBJOBS',
+                    'value': f"{actual_subjobs_count}"
+                },
+                {
+                    'name': 'VF_TMP_PATH',
+                    'value': f"{config['tempdir_fast']}"
+                }
+            ]
+        }
+    }
+
+
+def get_job_name(config, jobline):
+
+    return f'vf-{config["job_letter"]}-{jobline}'
+
+
+# Joblines left in SUBMITTING by an interrupted run: if AWS Batch accepted
+# the job, record it, otherwise make the jobline available again
+
+def recover_submitting(ctx, conn):
+
+    for workunit in vf_aws_state.get_submitting_workunits(conn):
+
+        jobs = []
+        paginator = ctx['client'].get_paginator('list_jobs')
+        for page in paginator.paginate(
+                jobQueue=workunit['job_queue'],
+                filters=[{'name': 'JOB_NAME', 'values': [workunit['job_name']]}]):
+            jobs.extend(page['jobSummaryList'])
+
+        with conn:
+            if(len(jobs) > 0):
+                job = max(jobs, key=lambda x: x['createdAt'])
+                print(
+                    f"Jobline {workunit['workunit_key']} was submitted by an earlier run as {job['jobId']}")
+                vf_aws_state.set_workunit_submitted(
+                    conn, workunit['workunit_key'], job['jobArn'], job['jobName'], job['jobId'])
+            else:
+                print(
+                    f"Jobline {workunit['workunit_key']} was not submitted by an earlier run")
+                vf_aws_state.set_workunit_unsubmitted(
+                    conn, workunit['workunit_key'])
+
+
+# Only a 4xx response means that AWS Batch rejected the job. After a
+# connection error or a 5xx response it may have accepted it anyway.
+
+def is_rejected(error):
+
+    if not isinstance(error, botocore.exceptions.ClientError):
+        return False
+
+    status_code = error.response.get('ResponseMetadata', {}).get('HTTPStatusCode', 0)
+
+    return 400 <= status_code < 500
+
+
+# Record each submission as soon as it is accepted so an interrupted run does
+# not lose track of what was submitted
+
+def record_submission(conn, future, jobline, counts):
+
+    try:
+        response = future.result()
+    except (botocore.exceptions.ClientError, botocore.exceptions.BotoCoreError) as error:
+        counts['failed'] += 1
+        if(is_rejected(error)):
+            print(f"Jobline {jobline} could not be submitted: {error}")
+            with conn:
+                vf_aws_state.set_workunit_unsubmitted(conn, jobline)
+        else:
+            # AWS Batch may have accepted the job: it stays in SUBMITTING and is
+            # looked up by name (recover_submitting) by the next run or cycle
+            print(f"Jobline {jobline} may not have been submitted: {error}")
+        return
+
+    with conn:
+        vf_aws_state.set_workunit_submitted(
+            conn, jobline, response['jobArn'], response['jobName'], response['jobId'])
+    counts['submitted'] += 1
+
+    if(counts['submitted'] % 100 == 0):
+        print(f".... {counts['submitted']} submitted")
 
-def process(config, start, stop):
+
+def make_submit_context(config):
+
+    submit_threads = int(config.get('aws_batch_submit_threads', 8))
+    submit_rate = float(config.get('aws_batch_submit_rate', 10))
 
     aws_config = Config(
-        region_name=config['aws_region']
+        region_name=config['aws_region'],
+        max_pool_connections=submit_threads
     )
-    client = boto3.client('batch', config=aws_config)
 
-    status = {}
+    return {
+        'client': boto3.client('batch', config=aws_config),
+        'limiter': make_rate_limiter(submit_rate, max(1, submit_rate)),
+        'submit_threads': submit_threads,
+        'queue_placement': config.get('aws_batch_queue_placement', 'least_loaded')
+    }
 
-    # load the status file that is keeping track of the data
-    with open("../workflow/status.json", "r") as read_file:
-        status = json.load(read_file)
-        collections = status['collections']
-        workunits = status['workunits']
 
-    for jobline in range(start, stop + 1):
+def submit_joblines(ctx, conn, config, joblines):
 
-        jobline_str = str(jobline)
-        if jobline_str not in workunits:
-            print(f"Jobline {jobline_str} was not found")
-        else:
-            current_workunit = workunits[jobline_str]
+    if(ctx['queue_placement'] == "least_loaded"):
+        queue_loads = get_queue_loads(ctx, conn, config)
 
-            print(f"Submitting jobline {jobline_str}... ")
+    counts = {'submitted': 0, 'failed': 0}
 
-            # Now see if any of them have been submitted before
-            if 'status' in current_workunit:
-                print("jobs were already submitted for this....")
-            else:
+    with concurrent.futures.ThreadPoolExecutor(max_workers=ctx['submit_threads']) as executor:
+
+        futures = {}
 
-                # how many jobs are there that we need to submit?
-                subjobs_count = actual_subjobs_count = len(current_workunit['subjobs'])
+        for jobline in joblines:
 
-                # AWS Batch doesn't allow an array job of only 1 -- so if it's one
-                # we will launch 2, but the second will exit quickly since it has
-                # no work
+            jobline_str = str(jobline)
+            current_workunit = vf_aws_state.get_workunit(conn, jobline)
+            if current_workunit is None:
+                print(f"Jobline {jobline_str} was not found")
+                continue
 
-                if(subjobs_count == 1):
-                    subjobs_count = 2
+            # Now see if any of them have been submitted before
+            if current_workunit['vf_job_status'] is not None:
+                print(f"Jobline {jobline_str}: jobs were already submitted for this....")
+                continue
 
-                # Path to the data files
-                object_store_input_path = f"s3://{config['object_store_bucket']}/{config['object_store_job_data_prefix']}/input/vf_input.tar.gz"
+            # how many jobs are there that we need to submit?
+            actual_subjobs_count = vf_aws_state.get_subjob_count(conn, jobline)
 
-                # Which queue to submit to
+            # How large does the container need to be?
+            vcpus, memory = get_workunit_resources(
+                config, vf_aws_state.get_max_subjob_ligand_count(conn, jobline))
+
+            # Which queue to submit to
+            if(ctx['queue_placement'] == "least_loaded"):
+                job_queue = min(queue_loads, key=lambda x: queue_loads[x])
+                queue_loads[job_queue] += max(2, actual_subjobs_count) * vcpus
+            else:
                 batch_queue_number = (
                     (jobline - 1) % int(config['aws_batch_number_of_queues'])) + 1
+                job_queue = f"{config['aws_batch_prefix']}-queue{batch_queue_number}"
+
+            request = get_submit_request(
+                config, jobline, actual_subjobs_count, job_queue, vcpus, memory)
+
+            with conn:
+                vf_aws_state.set_workunit_submitting(
+                    conn, jobline, request['jobName'], job_queue, vcpus)
+
+            futures[executor.submit(submit_job_with_retry, ctx, request)] = jobline
+
+            # Keep only a few submissions in flight per thread, so that few
+            # joblines are left in SUBMITTING if the run is interrupted
+            if(len(futures) >= ctx['submit_threads'] * 4):
+                done, pending = concurrent.futures.wait(
+                    futures, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    record_submission(conn, future, futures.pop(future), counts)
+
+        for future in concurrent.futures.as_completed(futures):
+            record_submission(conn, future, futures[future], counts)
+
+    return counts
+
+
+def process(config, start, stop):
+
+    ctx = make_submit_context(config)
+
+    # open the state store that is keeping track of the data
+    conn = vf_aws_state.open_state()
+
+    recover_submitting(ctx, conn)
+
+    counts = submit_joblines(ctx, conn, config, range(start, stop + 1))
+
+    print(f"Submitted {counts['submitted']} joblines, {counts['failed']} failed")
+
+    vf_aws_state.snapshot(conn, "../workflow/status.submission.db")
+    conn.close()
+
 
-                try:
-                    response = client.submit_job(
-                        jobName=f'vf-{config["job_letter"]}-{jobline}',
-                        jobQueue=f"{config['aws_batch_prefix']}-queue{batch_queue_number}",
-                        arrayProperties={
-                            'size': subjobs_count
-                        },
-                        jobDefinition=f"{config['aws_batch_prefix']}-jobdef8",
-                        containerOverrides={
-                            'resourceRequirements': [
-                                {
-                                    'type': 'VCPU',
-                                    'value': '8',
-                                },
-                                {
-                                    'type': 'MEMORY',
-                                    'value': '15000',
-                                },
-                            ],
-                            'environment': [
-                                {
-                                    'name': 'VF_CONTAINER_VCPUS',
-                                    'value': "8"
-                                },
-                                {
-                                    'name': 'VF_QUEUE_NO_1',
-                                    'value': jobline_str
-                                },
-                                {
-                                    'name': 'VF_OBJECT_INPUT',
-                                    'value': object_store_input_path
-                                },
-                                {
-                                    'name': 'VF_CONFIG_OBJECT',
-                                    'value': f"{config['object_store_job_data_prefix']}/input/vf_input.tar.gz"
-                                },
-                                {
-                                    'name': 'VF_CONFIG_BUCKET',
-                                    'value': config['object_store_bucket']
-                                },
-                                {
-                                    'name': 'VF_MAX_SUBJOBS',
-                                    'value': f"{actual_subjobs_count}"
-                                },
-                                {
-                                    'name': 'VF_TMP_PATH',
-                                    'value': f"{config['tempdir_fast']}"
-                                }
-                            ]
-                        }
-                    )
-
-                    current_workunit['status'] = {
-                        'vf_job_status': 'SUBMITTED',
-                        'job_arn': response['jobArn'],
-                        'job_name': response['jobName'],
-                        'job_id': response['jobId']
-                    }
-
-                except botocore.exceptions.ClientError as error:
-                    print("invalid")
-                    raise error
-
-    # Output all of the information about the workunits into JSON so we can easily grab this data in the future
-    with open("../workflow/status.json", "w") as json_out:
-        json.dump(status, json_out, indent=4)
-
-    os.system('cp ../workflow/status.json ../workflow/status.submission.json')
+# vCPUs that are held or requested by submitted joblines: every child that
+# has not completed yet counts (RUNNABLE, STARTING and RUNNING, as well as
+# SUBMITTED and PENDING so that fresh submissions are not submitted again
+# before AWS Batch has moved them along)
+
+def get_in_flight_vcpus(conn):
+
+    in_flight_vcpus = 0
+
+    for workunit in vf_aws_state.get_active_workunits(conn):
+
+        status_array = json.loads(workunit['aws_batch_status_array'] or "{}")
+        array_size = max(2, workunit['subjob_count'])
+
+        if(sum(status_array.values()) > 0):
+            active_children = 0
+            for job_status, count in status_array.items():
+                if(job_status in batch_job_statuses and batch_job_statuses[job_status]['completed'] == 0):
+                    active_children += count
+        else:
+            active_children = array_size
+
+        in_flight_vcpus += active_children * \
+            (workunit['vcpus'] or JOBDEF_VCPUS)
+
+    # Joblines whose submission is not resolved yet may already be running
+    for workunit in vf_aws_state.get_submitting_workunits(conn):
+        in_flight_vcpus += max(2, vf_aws_state.get_subjob_count(conn, workunit['workunit_key'])) * \
+            (workunit['vcpus'] or JOBDEF_VCPUS)
+
+    return in_flight_vcpus
+
+
+# Long-running mode: refresh the jobline status and submit the next joblines
+# whenever the vCPUs in flight drop below the target
+
+def run_daemon(config, target_vcpus, interval):
+
+    ctx = make_submit_context(config)
+
+    conn = vf_aws_state.open_state()
+
+    while True:
+
+        # Joblines left in SUBMITTING by an earlier run or by the last cycle
+        recover_submitting(ctx, conn)
+
+        update_jobline_status(ctx['client'], conn)
+
+        in_flight_vcpus = get_in_flight_vcpus(conn)
+        unsubmitted = vf_aws_state.get_unsubmitted_workunit_keys(conn)
+        submitting = vf_aws_state.get_submitting_workunits(conn)
+
+        print(
+            f"{time.strftime('%Y-%m-%d %H:%M:%S')} vCPUs in flight: {in_flight_vcpus}/{target_vcpus}, joblines left to submit: {len(unsubmitted)}, "
+            f"unresolved submissions: {len(submitting)}")
+
+        if(len(unsubmitted) == 0):
+            if(in_flight_vcpus == 0 and len(submitting) == 0):
+                print("All joblines have been submitted and completed")
+                break
+        elif(in_flight_vcpus < target_vcpus):
+
+            joblines = []
+            for jobline in unsubmitted:
+                if(in_flight_vcpus >= target_vcpus):
+                    break
+                vcpus, memory = get_workunit_resources(
+                    config, vf_aws_state.get_max_subjob_ligand_count(conn, jobline))
+                in_flight_vcpus += max(2, vf_aws_state.get_subjob_count(conn, jobline)) * vcpus
+                joblines.append(jobline)
+
+            counts = submit_joblines(ctx, conn, config, joblines)
+            print(
+                f"Submitted {counts['submitted']} joblines ({joblines[0]} to {joblines[-1]}), {counts['failed']} failed")
+
+        time.sleep(interval)
+
+    vf_aws_state.snapshot(conn, "../workflow/status.submission.db")
+    conn.close()
 
 
 def main():
 
-    if len(sys.argv) != 3:
-        print('You must supply exactly two arguments -- the start jobline and the end jobline.')
-        print('Joblines start from 1')
-        sys.exit()
+    parser = argparse.ArgumentParser(
+        description="Submit joblines to AWS Batch. Joblines start from 1")
+    parser.add_argument("start", type=int, nargs="?", help="first jobline to submit")
+    parser.add_argument("stop", type=int, nargs="?", help="last jobline to submit")
+    parser.add_argument("--daemon", action="store_true",
+                        help="keep running and submit the next joblines whenever the vCPUs in flight drop below --target-vcpus")
+    parser.add_argument("--target-vcpus", type=int,
+                        help="number of vCPUs to keep in flight in daemon mode (default: aws_batch_target_vcpus)")
+    parser.add_argument("--interval", type=int,
+                        help="seconds between checks in daemon mode (default: aws_batch_daemon_interval)")
+    args = parser.parse_args()
 
     config = parse_config("../workflow/control/all.ctrl")
-    process(config, int(sys.argv[1]), int(sys.argv[2]))
+
+    if(args.daemon):
+        target_vcpus = args.target_vcpus or int(config.get('aws_batch_target_vcpus', 0))
+        interval = args.interval or int(config.get('aws_batch_daemon_interval', 60))
+        if(target_vcpus <= 0):
+            parser.error("daemon mode needs --target-vcpus or aws_batch_target_vcpus in the control file")
+        run_daemon(config, target_vcpus, interval)
+    else:
+        if(args.start is None or args.stop is None):
+            parser.error("You must supply exactly two arguments -- the start jobline and the end jobline.")
+        process(config, args.start, args.stop)
 
 
 if __name__ == '__main__':
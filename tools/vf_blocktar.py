@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+
+# Copyright (C) 2019 Christoph Gorgulla
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# This file is part of VirtualFlow.
+#
+# VirtualFlow is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# VirtualFlow is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with VirtualFlow.  If not, see <https://www.gnu.org/licenses/>.
+
+# ---------------------------------------------------------------------------
+#
+# Description: Results archives with random access to single members
+#
+#              'create' writes a .tar.gz in which every tar member (header
+#              and data) is compressed as its own gzip member. The archive
+#              is still a regular .tar.gz for tar, zcat and tarfile. Next to
+#              it, <archive>.idx.json maps each member name to the byte
+#              offset and length of its gzip member, so one member can be
+#              read with a single range request or seek.
+#
+#              'get' fetches the poses of a list of ligands (for example the
+#              output of vf_rank.py or vf_score_index.py) from the local
+#              output folders or the object store, reading only the byte
+#              ranges of the members needed, several at a time. Archives
+#              without an index are downloaded whole as before.
+#
+#              Usage:
+#                vf_blocktar.py create <archive.tar.gz> -C <dir> <member>
+#                vf_blocktar.py get <scenario> <collection> <ligand>[:<replica>] ...
+#                vf_blocktar.py get <scenario> --hits <ranking.tsv>
+#
+# Revision history:
+# 2026-10-19  Original version
+#
+# ---------------------------------------------------------------------------
+
+
+import os
+import io
+import sys
+import gzip
+import json
+import tarfile
+import argparse
+import concurrent.futures
+from vf_controlfile import parse_config
+
+
+INDEX_SUFFIX = ".idx.json"
+INDEX_VERSION = 1
+
+OUTPUT_DIR = "../output-files/poses"
+FETCH_THREADS = 16
+
+
+# Archive creation
+
+def iterate_paths(base_dir, member):
+
+    # Same order as 'tar -c': the directory first, then its contents sorted
+    yield member
+    path = os.path.join(base_dir, member)
+    if os.path.isdir(path) and not os.path.islink(path):
+        for name in sorted(os.listdir(path)):
+            yield from iterate_paths(base_dir, os.path.join(member, name))
+
+
+def create_archive(archive_path, base_dir, member):
+
+    index = {}
+
+    with open(f"{archive_path}.tmp", "xb") as out:
+        packer = tarfile.TarFile(fileobj=io.BytesIO(), mode="w", format=tarfile.GNU_FORMAT)
+
+        for name in iterate_paths(base_dir, member):
+            tarinfo = packer.gettarinfo(os.path.join(base_dir, name), arcname=name)
+
+            block = io.BytesIO()
+            block.write(tarinfo.tobuf(tarfile.GNU_FORMAT, tarfile.ENCODING, "surrogateescape"))
+            if tarinfo.isreg():
+                with open(os.path.join(base_dir, name), "rb") as f:
+                    block.write(f.read())
+                remainder = tarinfo.size % tarfile.BLOCKSIZE
+                if(remainder > 0):
+                    block.write(tarfile.NUL * (tarfile.BLOCKSIZE - remainder))
+
+            compressed = gzip.compress(block.getvalue(), mtime=0)
+            index[name] = [out.tell(), len(compressed)]
+            out.write(compressed)
+
+        # End of archive marker
+        out.write(gzip.compress(tarfile.NUL * (2 * tarfile.BLOCKSIZE), mtime=0))
+
+    with open(f"{archive_path}{INDEX_SUFFIX}.tmp", "w") as f:
+        json.dump({'version': INDEX_VERSION, 'members': index}, f)
+
+    os.replace(f"{archive_path}.tmp", archive_path)
+    os.replace(f"{archive_path}{INDEX_SUFFIX}.tmp", f"{archive_path}{INDEX_SUFFIX}")
+
+    return archive_path, f"{archive_path}{INDEX_SUFFIX}"
+
+
+def read_member_block(data):
+
+    # A single tar member without the end of archive marker
+    with tarfile.open(fileobj=io.BytesIO(gzip.decompress(data)), mode="r:") as tar:
+        for tarinfo in tar:
+            if tarinfo.isreg():
+                return tarinfo.name, tar.extractfile(tarinfo).read()
+
+    return None, None
+
+
+# Retrieval
+
+def match_member(name, ligand, replica):
+
+    base = os.path.basename(name)
+
+    if(replica is not None):
+        prefix = f"{ligand}_replica-{replica}"
+        return base == prefix or base.startswith(f"{prefix}.")
+
+    return base.startswith(f"{ligand}_replica-") or base.split(".", 1)[0] == ligand
+
+
+# Each archive location knows how to read a byte range of the archive and
+# its index: a .tar.gz on disk, a .tar.gz inside a tranche .tar
+# (outputfiles_level=tranche), a segment of a tranche (outputfiles_level=
+# segments, not compacted yet) or an object in the object store
+
+def get_local_archive(scenario, collection_full_name, status="complete"):
+
+    tranche, collection_number = collection_full_name.split("_", 1)
+    folder = os.path.join("../output-files", status, scenario, "results", tranche[:2])
+
+    path = os.path.join(folder, tranche, f"{collection_number}.tar.gz")
+    if os.path.exists(path):
+        return {'type': 'file', 'path': path, 'offset': 0,
+                'index_path': f"{path}{INDEX_SUFFIX}"}
+
+    path = os.path.join(folder, f"{tranche}.segments", f"{collection_number}.tar.gz")
+    if os.path.exists(path):
+        return {'type': 'file', 'path': path, 'offset': 0,
+                'index_path': f"{path}{INDEX_SUFFIX}"}
+
+    tranche_path = os.path.join(folder, f"{tranche}.tar")
+    if os.path.exists(tranche_path):
+        with tarfile.open(tranche_path, "r:") as tar:
+            members = {tarinfo.name: tarinfo for tarinfo in tar}
+            archive = members.get(f"{tranche}/{collection_number}.tar.gz")
+            if(archive is None):
+                return None
+            location = {'type': 'file', 'path': tranche_path,
+                        'offset': archive.offset_data, 'size': archive.size}
+            index = members.get(f"{tranche}/{collection_number}.tar.gz{INDEX_SUFFIX}")
+            if(index is not None):
+                location['index'] = json.loads(tar.extractfile(index).read())
+            return location
+
+    return None
+
+
+def get_s3_archive(s3, config, scenario, collection_full_name):
+
+    tranche, collection_number = collection_full_name.split("_", 1)
+    key = f"{config['object_store_job_data_prefix']}/output/{scenario}/results/{tranche[:2]}/{tranche}/{collection_number}.tar.gz"
+
+    location = {'type': 's3', 's3': s3,
+                'bucket': config['object_store_bucket'], 'key': key, 'offset': 0}
+
+    try:
+        response = s3.get_object(Bucket=location['bucket'], Key=f"{key}{INDEX_SUFFIX}")
+        location['index'] = json.loads(response['Body'].read())
+    except s3.exceptions.NoSuchKey:
+        pass
+
+    return location
+
+
+def read_range(location, start, length):
+
+    if(location['type'] == 's3'):
+        if(length is None):
+            response = location['s3'].get_object(
+                Bucket=location['bucket'], Key=location['key'])
+        else:
+            response = location['s3'].get_object(
+                Bucket=location['bucket'], Key=location['key'],
+                Range=f"bytes={start}-{start + length - 1}")
+        return response['Body'].read()
+
+    with open(location['path'], "rb") as f:
+        f.seek(location['offset'] + start)
+        if(length is None):
+            length = location.get('size', -1)
+        return f.read(length)
+
+
+def get_index(location):
+
+    if 'index' in location:
+        return location['index']
+
+    if 'index_path' in location and os.path.exists(location['index_path']):
+        with open(location['index_path'], "r") as f:
+            location['index'] = json.load(f)
+        return location['index']
+
+    return None
+
+
+def fetch_collection(location, hits, output_dir):
+
+    written = []
+
+    index = get_index(location)
+
+    if(index is not None):
+        for name, (offset, length) in index['members'].items():
+            if not any(match_member(name, ligand, replica) for ligand, replica in hits):
+                continue
+            member_name, data = read_member_block(read_range(location, offset, length))
+            if(member_name is not None):
+                written.append(write_pose(output_dir, member_name, data))
+        return written
+
+    # No index (archive written by an older version), read all of it
+    with tarfile.open(fileobj=io.BytesIO(read_range(location, 0, None)), mode="r:gz") as tar:
+        for tarinfo in tar:
+            if tarinfo.isreg() and any(match_member(tarinfo.name, ligand, replica) for ligand, replica in hits):
+                written.append(write_pose(output_dir, tarinfo.name,
+                                          tar.extractfile(tarinfo).read()))
+
+    return written
+
+
+def write_pose(output_dir, member_name, data):
+
+    path = os.path.join(output_dir, os.path.basename(member_name))
+    os.makedirs(output_dir, exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+    return path
+
+
+def read_hits(filename):
+
+    # Ranking files of vf_rank.py / vf_score_index.py: rank ligand collection score
+    with open(filename, "r") as f:
+        for line in f:
+            fields = line.split()
+            if(len(fields) >= 3 and fields[0] != "rank"):
+                yield fields[2], fields[1], None
+
+
+def get_poses(scenario, hits, use_s3, output_dir, threads):
+
+    by_collection = {}
+    for collection_full_name, ligand, replica in hits:
+        by_collection.setdefault(collection_full_name, []).append((ligand, replica))
+
+    if(use_s3):
+        import boto3
+        s3 = boto3.client('s3')
+        config = parse_config("../workflow/control/all.ctrl")
+
+    def fetch(collection_full_name):
+        if(use_s3):
+            location = get_s3_archive(s3, config, scenario, collection_full_name)
+        else:
+            location = get_local_archive(scenario, collection_full_name) or \
+                get_local_archive(scenario, collection_full_name, status="incomplete")
+        if(location is None):
+            print(f"No results archive found for {collection_full_name}")
+            return []
+        return fetch_collection(location, by_collection[collection_full_name],
+                                os.path.join(output_dir, scenario, collection_full_name))
+
+    written = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as executor:
+        futures = {executor.submit(fetch, collection_full_name): collection_full_name
+                   for collection_full_name in by_collection}
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                written.extend(future.result())
+            except Exception as err:
+                print(f"Error reading the results of {futures[future]}: {err}")
+
+    return written
+
+
+def main():
+
+    parser = argparse.ArgumentParser(
+        description="Results archives with an index for reading single poses")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    create_parser = subparsers.add_parser("create", help="create an archive and its index")
+    create_parser.add_argument("archive")
+    create_parser.add_argument("-C", dest="directory", default=".",
+                               help="directory the member is relative to")
+    create_parser.add_argument("member")
+
+    get_parser = subparsers.add_parser("get", help="extract the poses of some ligands")
+    get_parser.add_argument("scenario", help="docking scenario name")
+    get_parser.add_argument("collection", nargs="?", help="collection, e.g. AACAAA_00000")
+    get_parser.add_argument("ligands", nargs="*", help="ligand or ligand:replica")
+    get_parser.add_argument("--hits", help="ranking file (rank ligand collection score)")
+    get_parser.add_argument("--s3", action="store_true",
+                            help="read the archives from the object store instead of ../output-files")
+    get_parser.add_argument("--output-dir", default=OUTPUT_DIR,
+                            help=f"where to write the poses (default: {OUTPUT_DIR})")
+    get_parser.add_argument("--threads", type=int, default=FETCH_THREADS)
+
+    args = parser.parse_args()
+
+    if(args.command == "create"):
+        create_archive(args.archive, args.directory, args.member)
+        return
+
+    hits = []
+    if(args.hits):
+        hits.extend(read_hits(args.hits))
+    if(args.collection):
+        for ligand in args.ligands:
+            ligand, _, replica = ligand.partition(":")
+            hits.append((args.collection, ligand, replica or None))
+
+    if(len(hits) == 0):
+        print("No ligands given")
+        sys.exit(1)
+
+    written = get_poses(args.scenario, hits, args.s3, args.output_dir, args.threads)
+    print(f"Wrote {len(written)} poses to {os.path.join(args.output_dir, args.scenario)}")
+
+
+if __name__ == '__main__':
+    main()
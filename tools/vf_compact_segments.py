@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+
+# Copyright (C) 2019 Christoph Gorgulla
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# This file is part of VirtualFlow.
+#
+# VirtualFlow is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# VirtualFlow is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with VirtualFlow.  If not, see <https://www.gnu.org/licenses/>.
+
+# ---------------------------------------------------------------------------
+#
+# Description: Compaction of the output segments into tranche archives
+#
+#              With outputfiles_level=segments the queues do not rewrite the
+#              tranche archives. Each completed collection is stored as one
+#              file (segment) next to where the tranche archive would be:
+#
+#                <metatranche>/<tranche>.segments/<collection number>.<ext>
+#                <metatranche>/<tranche>.segments/manifest
+#
+#              The segment is copied under a temporary name and renamed, then
+#              a line '<segment> <size> <queue> <time>' is appended to the
+#              manifest. Segments are never changed after they are written.
+#
+#              This tool merges the segments listed in the manifests into the
+#              tranche archives (<metatranche>/<tranche>.tar, with the same
+#              member names as outputfiles_level=tranche) and removes them.
+#              It can run while the workflow is running: the manifest is
+#              renamed before the merge, so segments written in the meantime
+#              are listed in a new manifest and merged the next time. Members
+#              already in the archive with the same size (an interrupted
+#              compaction) are not added again.
+#
+#              Usage:
+#                vf_compact_segments.py [--dry-run] [--include-unlisted [--min-age S]] [<output folder> ...]
+#
+#              The default output folder is ../output-files/complete.
+#
+# Revision history:
+# 2026-10-19  Original version
+#
+# ---------------------------------------------------------------------------
+
+
+import os
+import sys
+import glob
+import time
+import shutil
+import tarfile
+import argparse
+
+
+SEGMENTS_SUFFIX = ".segments"
+MANIFEST = "manifest"
+COMPACTING_SUFFIX = ".compacting"
+
+OUTPUT_FOLDER = "../output-files/complete"
+OUTPUT_KINDS = ["results", "summaries", "logfiles", "ligand-lists"]
+
+
+def get_segment_folder(shared_folder, tranche):
+
+    # shared_folder is the metatranche folder of the output files
+    return os.path.join(shared_folder, f"{tranche}{SEGMENTS_SUFFIX}")
+
+
+def add_segment(path, shared_folder, tranche, queue):
+
+    # Stores one completed collection file as a segment of its tranche
+    segment_folder = get_segment_folder(shared_folder, tranche)
+    os.makedirs(segment_folder, exist_ok=True)
+
+    name = os.path.basename(path)
+    tmp_path = os.path.join(segment_folder, f".{name}.{queue}.tmp")
+    shutil.copyfile(path, tmp_path)
+    os.replace(tmp_path, os.path.join(segment_folder, name))
+
+    with open(os.path.join(segment_folder, MANIFEST), "a") as write_file:
+        write_file.write(f"{name} {os.path.getsize(path)} {queue} {int(time.time())}\n")
+
+
+def read_manifest(filename):
+
+    names = []
+    try:
+        with open(filename, "r") as read_file:
+            for line in read_file:
+                fields = line.split()
+                if(len(fields) > 0 and fields[0] not in names):
+                    names.append(fields[0])
+    except FileNotFoundError:
+        pass
+
+    return names
+
+
+def find_segment_folders(output_folders):
+
+    for output_folder in output_folders:
+        for kind in OUTPUT_KINDS:
+            yield from sorted(glob.glob(os.path.join(output_folder, "*", kind, "*", f"*{SEGMENTS_SUFFIX}")))
+
+
+def get_unlisted_segments(segment_folder, listed, min_age):
+
+    # Segments without a manifest line (e.g. a queue stopped between writing
+    # the segment and the manifest), if they are old enough
+    now = time.time()
+    names = []
+    for name in sorted(os.listdir(segment_folder)):
+        path = os.path.join(segment_folder, name)
+        if(name.startswith(".") or name == MANIFEST or name.startswith(f"{MANIFEST}.") or name in listed):
+            continue
+        if os.path.isfile(path) and now - os.path.getmtime(path) >= min_age:
+            names.append(name)
+
+    return names
+
+
+def compact_segment_folder(segment_folder, include_unlisted=False, min_age=3600, dry_run=False):
+
+    # Returns the number of segments merged into the tranche archive
+    tranche = os.path.basename(segment_folder)[:-len(SEGMENTS_SUFFIX)]
+    tranche_archive = os.path.join(os.path.dirname(segment_folder), f"{tranche}.tar")
+    manifest = os.path.join(segment_folder, MANIFEST)
+    compacting = f"{manifest}{COMPACTING_SUFFIX}"
+
+    # A manifest left by an interrupted compaction is merged first
+    if not dry_run and os.path.isfile(manifest):
+        if os.path.isfile(compacting):
+            with open(compacting, "a") as write_file, open(manifest, "r") as read_file:
+                write_file.write(read_file.read())
+            os.remove(manifest)
+        else:
+            os.replace(manifest, compacting)
+
+    names = read_manifest(compacting)
+    if(dry_run):
+        names += [name for name in read_manifest(manifest) if name not in names]
+    if(include_unlisted):
+        names += get_unlisted_segments(segment_folder, set(names) | set(read_manifest(manifest)), min_age)
+    names = [name for name in names if os.path.isfile(os.path.join(segment_folder, name))]
+
+    if(dry_run or len(names) == 0):
+        if not dry_run and os.path.isfile(compacting):
+            os.remove(compacting)
+        return len(names)
+
+    tmp_archive = f"{tranche_archive}.tmp"
+    if os.path.isfile(tranche_archive):
+        shutil.copyfile(tranche_archive, tmp_archive)
+    elif os.path.exists(tmp_archive):
+        os.remove(tmp_archive)
+
+    with tarfile.open(tmp_archive, "a", format=tarfile.GNU_FORMAT) as tar:
+        sizes = {member.name: member.size for member in tar.getmembers()}
+        for name in names:
+            path = os.path.join(segment_folder, name)
+            arcname = f"{tranche}/{name}"
+            if(sizes.get(arcname) == os.path.getsize(path)):
+                continue
+            tar.add(path, arcname=arcname)
+
+    with open(tmp_archive, "rb") as read_file:
+        os.fsync(read_file.fileno())
+    os.replace(tmp_archive, tranche_archive)
+
+    for name in names:
+        os.remove(os.path.join(segment_folder, name))
+    if os.path.isfile(compacting):
+        os.remove(compacting)
+
+    return len(names)
+
+
+def main():
+
+    parser = argparse.ArgumentParser(
+        description="Merge the output segments (outputfiles_level=segments) into tranche archives")
+    parser.add_argument("folders", nargs="*", default=[OUTPUT_FOLDER],
+                        help=f"output folders with <scenario>/<kind>/<metatranche> below them (default: {OUTPUT_FOLDER})")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="only print the number of segments of each tranche")
+    parser.add_argument("--include-unlisted", action="store_true",
+                        help="also merge segments which are not in the manifest")
+    parser.add_argument("--min-age", type=int, default=3600,
+                        help="minimum age in seconds of unlisted segments (default: 3600)")
+    args = parser.parse_args()
+
+    counts = {'tranches': 0, 'segments': 0}
+    for segment_folder in find_segment_folders(args.folders):
+        try:
+            segments = compact_segment_folder(segment_folder, args.include_unlisted, args.min_age, args.dry_run)
+        except (OSError, tarfile.TarError) as err:
+            print(f"Error compacting {segment_folder}: {err}", file=sys.stderr)
+            continue
+        if(segments > 0):
+            print(f"{segment_folder}: {segments} segments{' to merge' if args.dry_run else ' merged'}")
+            counts['tranches'] += 1
+            counts['segments'] += segments
+
+    print(f"{'Found' if args.dry_run else 'Merged'} {counts['segments']} segments of {counts['tranches']} tranche archives")
+
+
+if __name__ == '__main__':
+    main()
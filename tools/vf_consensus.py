@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+
+# Copyright (C) 2019 Christoph Gorgulla
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# This file is part of VirtualFlow.
+#
+# VirtualFlow is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# VirtualFlow is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with VirtualFlow.  If not, see <https://www.gnu.org/licenses/>.
+
+# ---------------------------------------------------------------------------
+#
+# Description: Consensus scores over several docking scenarios
+#
+#              Combines the summary files (create_summary_file in
+#              vf_aws_run.py, or one-queue.sh) of several docking scenarios
+#              into one table with, per ligand, the score of each scenario
+#              and the consensus scores
+#                min          best score of any scenario
+#                mean         mean score over the scenarios
+#                zscore       mean of the per-scenario z-scores
+#                rankproduct  geometric mean of the per-scenario rank
+#                             fractions (rank / ligands in the scenario)
+#              Lower is better for all of them, like the docking scores.
+#              Ligands not (yet) docked in every scenario get the consensus
+#              of the scenarios they have, but are left out of --top.
+#
+#              The first pass streams the summaries of each scenario into
+#              hash partitions by ligand on disk and collects the score
+#              counts of the scenario (scores are written with one decimal,
+#              so the ranks from the counts are exact). The second pass
+#              loads one partition at a time into arrays aligned by ligand
+#              and computes the consensus with NumPy, so only one partition
+#              needs to fit in memory.
+#
+# Revision history:
+# 2026-10-19  Original version
+#
+# ---------------------------------------------------------------------------
+
+
+import os
+import gzip
+import shutil
+import zlib
+import argparse
+import multiprocessing
+import numpy as np
+from vf_rank import parse_summary_lines, open_summary_lines, init_s3_worker, \
+    find_local_summaries, find_s3_summaries, batched, push_bounded, SCORE_COLUMNS
+from vf_controlfile import parse_config
+
+
+CONSENSUS_PATH = "../workflow/consensus.tsv.gz"
+PARTITION_DIR = "../workflow/consensus.tmp"
+PARTITIONS = 64
+FILES_PER_BATCH = 64
+
+CONSENSUS_COLUMNS = ["min", "mean", "zscore", "rankproduct"]
+
+# Scores are counted in steps of 0.1 over this range
+SCORE_STEPS = 10
+SCORE_MIN = -1000.0
+SCORE_MAX = 1000.0
+
+
+def parse_batch(args):
+
+    sources, score_column = args
+
+    rows = []
+    for source in sources:
+        try:
+            for collection, ligand, average, maximum in parse_summary_lines(open_summary_lines(source)):
+                rows.append((ligand, collection, average if score_column == "average" else maximum))
+        except Exception as err:
+            print(f"Error reading {source[1]}: {err}")
+
+    return rows
+
+
+def get_score_bins(scores):
+
+    return np.clip(np.rint((scores - SCORE_MIN) * SCORE_STEPS), 0,
+                   (SCORE_MAX - SCORE_MIN) * SCORE_STEPS).astype(np.int64)
+
+
+# First pass: partition the ligands of one scenario and count its scores
+
+def partition_scenario(sources, scenario_dir, score_column, partitions, processes, initializer=None):
+
+    os.makedirs(scenario_dir, exist_ok=True)
+    partition_files = [open(os.path.join(scenario_dir, f"{index}.tsv"), "w")
+                       for index in range(partitions)]
+
+    stats = {
+        'ligands': 0,
+        'sum': 0.0,
+        'sum_squares': 0.0,
+        'counts': np.zeros(int((SCORE_MAX - SCORE_MIN) * SCORE_STEPS) + 1, dtype=np.int64)
+    }
+
+    with multiprocessing.Pool(processes=processes, initializer=initializer) as pool:
+        for rows in pool.imap_unordered(parse_batch, ((batch, score_column) for batch in batched(sources, FILES_PER_BATCH))):
+            if(len(rows) == 0):
+                continue
+
+            for ligand, collection, score in rows:
+                partition_files[zlib.crc32(ligand.encode()) % partitions].write(
+                    f"{ligand}\t{collection}\t{score}\n")
+
+            scores = np.fromiter((row[2] for row in rows), dtype=np.float64, count=len(rows))
+            stats['ligands'] += len(scores)
+            stats['sum'] += scores.sum()
+            stats['sum_squares'] += np.square(scores).sum()
+            stats['counts'] += np.bincount(get_score_bins(scores), minlength=len(stats['counts']))
+
+    for partition_file in partition_files:
+        partition_file.close()
+
+    mean = stats['sum'] / max(stats['ligands'], 1)
+    stats['mean'] = mean
+    stats['std'] = np.sqrt(max(stats['sum_squares'] / max(stats['ligands'], 1) - mean * mean, 0.0))
+    # Number of ligands with a better (lower) score than each bin
+    stats['better'] = np.concatenate(([0], np.cumsum(stats['counts'])[:-1]))
+
+    return stats
+
+
+def load_partition(path):
+
+    ligands = []
+    collections = []
+    scores = []
+
+    with open(path, "r") as f:
+        for line in f:
+            ligand, collection, score = line.rstrip("\n").split("\t")
+            ligands.append(ligand)
+            collections.append(collection)
+            scores.append(float(score))
+
+    return np.array(ligands, dtype=object), np.array(collections, dtype=object), np.array(scores, dtype=np.float64)
+
+
+# Second pass: consensus of one partition
+
+def score_partition(partition_paths, scenario_stats):
+
+    loaded = [load_partition(path) for path in partition_paths]
+
+    all_ligands = np.concatenate([ligands for ligands, collections, scores in loaded])
+    if(len(all_ligands) == 0):
+        return None
+
+    unique_ligands, first_index, inverse = np.unique(
+        all_ligands, return_index=True, return_inverse=True)
+    all_collections = np.concatenate([collections for ligands, collections, scores in loaded])
+
+    scores = np.full((len(unique_ligands), len(loaded)), np.nan)
+    zscores = np.full_like(scores, np.nan)
+    rank_fractions = np.full_like(scores, np.nan)
+
+    offset = 0
+    for scenario_index, (ligands, collections, scenario_scores) in enumerate(loaded):
+        rows = inverse[offset:offset + len(ligands)]
+        offset += len(ligands)
+
+        stats = scenario_stats[scenario_index]
+        scores[rows, scenario_index] = scenario_scores
+        if(stats['std'] > 0):
+            zscores[rows, scenario_index] = (scenario_scores - stats['mean']) / stats['std']
+        else:
+            zscores[rows, scenario_index] = 0.0
+        rank_fractions[rows, scenario_index] = (
+            stats['better'][get_score_bins(scenario_scores)] + 1) / stats['ligands']
+
+    consensus = {
+        'min': np.nanmin(scores, axis=1),
+        'mean': np.nanmean(scores, axis=1),
+        'zscore': np.nanmean(zscores, axis=1),
+        'rankproduct': np.exp(np.nanmean(np.log(rank_fractions), axis=1)),
+    }
+
+    return unique_ligands, all_collections[first_index], scores, consensus
+
+
+def process(scenarios, sources_by_scenario, output_path, score_column, partitions, partition_dir,
+            processes, initializer=None, top_k=None, top_by="rankproduct"):
+
+    scenario_stats = []
+    for scenario in scenarios:
+        print(f"Partitioning the summaries of {scenario}....")
+        scenario_stats.append(partition_scenario(sources_by_scenario[scenario], os.path.join(partition_dir, scenario),
+                                                 score_column, partitions, processes, initializer))
+        print(f"  {scenario_stats[-1]['ligands']} ligands, mean score {scenario_stats[-1]['mean']:.2f}")
+
+    heap = []
+    written = 0
+
+    with gzip.open(f"{output_path}.tmp", "wt") as out:
+        out.write("\t".join(["ligand", "collection", "scenarios"] +
+                            [f"score-{scenario}" for scenario in scenarios] + CONSENSUS_COLUMNS) + "\n")
+
+        for partition in range(partitions):
+            result = score_partition([os.path.join(partition_dir, scenario, f"{partition}.tsv")
+                                      for scenario in scenarios], scenario_stats)
+            if(result is None):
+                continue
+
+            ligands, collections, scores, consensus = result
+            scenario_counts = np.sum(~np.isnan(scores), axis=1)
+
+            for row in range(len(ligands)):
+                values = [f"{value:.1f}" if not np.isnan(value) else "NA" for value in scores[row]]
+                values.extend(f"{consensus[column][row]:.4g}" for column in CONSENSUS_COLUMNS)
+                out.write(f"{ligands[row]}\t{collections[row]}\t{scenario_counts[row]}\t" + "\t".join(values) + "\n")
+
+            if(top_k):
+                # Only ligands with scores in all scenarios compete for the top
+                complete_rows = np.flatnonzero(scenario_counts == len(scenarios))
+                for row in complete_rows[np.argsort(consensus[top_by][complete_rows])[:top_k]]:
+                    push_bounded(heap, top_k, (-consensus[top_by][row], consensus[top_by][row],
+                                               collections[row], ligands[row]))
+
+            written += len(ligands)
+
+    os.replace(f"{output_path}.tmp", output_path)
+    shutil.rmtree(partition_dir, ignore_errors=True)
+
+    return written, [(score, collection, ligand) for sort_key, score, collection, ligand in sorted(heap, reverse=True)]
+
+
+def find_local_scenario_summaries(scenario):
+
+    for status in ("complete", "incomplete"):
+        yield from find_local_summaries(f"../output-files/{status}/{scenario}/summaries")
+
+
+def main():
+
+    parser = argparse.ArgumentParser(
+        description="Consensus scores of the ligands over several docking scenarios")
+    parser.add_argument("scenarios", nargs="*",
+                        help="docking scenario names (default: all docking_scenario_names in all.ctrl)")
+    parser.add_argument("--score", choices=sorted(SCORE_COLUMNS), default="maximum",
+                        help="score column of the summaries to use (default: maximum)")
+    parser.add_argument("--s3", action="store_true",
+                        help="read the summaries from the object store instead of ../output-files")
+    parser.add_argument("--output", default=CONSENSUS_PATH,
+                        help=f"consensus table to write (default: {CONSENSUS_PATH})")
+    parser.add_argument("--partitions", type=int, default=PARTITIONS,
+                        help=f"number of ligand partitions, raise it if a partition does not fit in memory (default: {PARTITIONS})")
+    parser.add_argument("--partition-dir", default=PARTITION_DIR,
+                        help=f"scratch folder for the partitions (default: {PARTITION_DIR})")
+    parser.add_argument("--processes", type=int, default=os.cpu_count(),
+                        help="number of parsing processes")
+    parser.add_argument("-k", "--top", type=int, default=0,
+                        help="also print the best ligands by consensus")
+    parser.add_argument("--top-by", choices=CONSENSUS_COLUMNS, default="rankproduct",
+                        help="consensus score for --top (default: rankproduct)")
+    args = parser.parse_args()
+
+    config = {}
+    if os.path.exists("../workflow/control/all.ctrl"):
+        config = parse_config("../workflow/control/all.ctrl")
+
+    scenarios = args.scenarios or config.get('docking_scenario_names', "").split(":")
+    scenarios = [scenario for scenario in scenarios if scenario != ""]
+    if(len(scenarios) == 0):
+        print("No docking scenarios given")
+        exit(1)
+
+    if(args.s3):
+        sources_by_scenario = {scenario: find_s3_summaries(config, scenario) for scenario in scenarios}
+        initializer = init_s3_worker
+    else:
+        sources_by_scenario = {scenario: find_local_scenario_summaries(scenario) for scenario in scenarios}
+        initializer = None
+
+    written, ranked = process(scenarios, sources_by_scenario, args.output, args.score, args.partitions,
+                              args.partition_dir, args.processes, initializer, args.top, args.top_by)
+
+    print(f"Wrote consensus scores of {written} ligands to {args.output}")
+
+    if(args.top):
+        print(f"\nTop {len(ranked)} ligands by {args.top_by}:\n")
+        print("      Rank       Ligand           Collection       Consensus")
+        for rank, (score, collection, ligand) in enumerate(ranked, start=1):
+            print(f"    {rank:5d}    {ligand:>10s}     {collection}            {score:.4g}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+
+# Copyright (C) 2019 Christoph Gorgulla
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# This file is part of VirtualFlow.
+#
+# VirtualFlow is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# VirtualFlow is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with VirtualFlow.  If not, see <https://www.gnu.org/licenses/>.
+
+# ---------------------------------------------------------------------------
+#
+# Description: Control file parser shared by the tools
+#
+#              Reads all.ctrl or the range control file of a jobline
+#              (../workflow/control/<first>-<last>.ctrl) with the same rules
+#              as the shell scripts (grep -m 1 "^key=" | tr -d '[[:space:]]' |
+#              awk -F '[=#]' '{print $2}'): the first line of a key wins,
+#              whitespace is removed and the value ends at the next '=' or
+#              '#'. Parsed files are cached by path and modification time, so
+#              repeated lookups do not read the file again.
+#
+#              get_typed_config() converts the known keys (numbers, true/false
+#              flags, ':' separated lists) and validate_config() checks them
+#              against their possible values.
+#
+#              The 'export' command prints all values as shell assignments,
+#              so that shell scripts can read the control file with one call:
+#                eval "$(python3 vf_controlfile.py export --array control_values <file>)"
+#
+#              Usage:
+#                vf_controlfile.py export [--jobline N | <controlfile>] [--array <name>]
+#                vf_controlfile.py get <key> [--jobline N | <controlfile>]
+#                vf_controlfile.py validate [--jobline N | <controlfile>]
+#
+# Revision history:
+# 2026-10-19  Original version
+#
+# ---------------------------------------------------------------------------
+
+
+import os
+import re
+import sys
+import shlex
+import argparse
+
+
+CONTROL_DIR = "../workflow/control"
+ALL_CTRL = f"{CONTROL_DIR}/all.ctrl"
+
+INT_KEYS = {
+    "steps_per_job", "cpus_per_step", "queues_per_step", "cpus_per_queue",
+    "aws_batch_number_of_queues", "aws_batch_array_job_size", "aws_batch_submit_threads",
+    "aws_batch_submit_rate", "aws_batch_min_vcpus", "aws_batch_max_vcpus",
+    "aws_batch_target_vcpus", "aws_batch_daemon_interval",
+    "aws_batch_drain_after_seconds", "aws_batch_drain_grace_seconds",
+    "central_todo_list_splitting_size", "ligands_todo_per_queue", "ligands_per_refilling_step",
+    "minimum_time_remaining", "dispersion_time_min", "dispersion_time_max",
+    "energy_max", "ligand_check_interval"
+}
+
+BOOL_KEYS = {
+    "keep_ligand_summary_logs", "prepare_queue_todolists", "energy_check",
+    "stop_after_next_check_interval", "stop_after_collection", "stop_after_job"
+}
+
+LIST_KEYS = {
+    "docking_scenario_names", "docking_scenario_programs",
+    "docking_scenario_replicas", "docking_scenario_inputfolders"
+}
+
+CHOICES = {
+    "aws_batch_queue_placement": {"least_loaded", "round_robin"},
+    "object_store_type": {"none", "s3"},
+    "todo_dispatcher": {"files", "sqlite"},
+    "ligand_library_format": {"pdbqt", "mol2", "pdb"},
+    "verbosity_commands": {"standard", "debug"},
+    "verbosity_logfiles": {"standard", "debug"},
+    "queue_runner": {"bash", "python"},
+    "error_sensitivity": {"normal", "high"},
+    "error_response": {"ignore", "next_job", "fail"},
+    "outputfiles_level": {"collection", "tranche", "segments"}
+}
+
+_controlfiles = {}
+_control_dirs = {}
+
+
+def read_controlfile(filename):
+
+    config = {}
+
+    with open(filename, "r") as read_file:
+        for line in read_file:
+            line = re.sub(r'\s', "", line)
+            if(line.startswith("#") or "=" not in line):
+                continue
+            key, value = line.split("=", 1)
+            if(key not in config):
+                config[key] = re.split(r'[=#]', value, 1)[0]
+
+    return config
+
+
+def parse_controlfile(filename):
+
+    stat = os.stat(filename)
+    cached = _controlfiles.get(filename)
+    if(cached is not None and cached[0] == (stat.st_mtime_ns, stat.st_size)):
+        return cached[1]
+
+    config = read_controlfile(filename)
+    _controlfiles[filename] = ((stat.st_mtime_ns, stat.st_size), config)
+
+    return config
+
+
+def parse_config(filename):
+
+    # Plain dictionary of the values, as used by the tools so far
+    return dict(parse_controlfile(filename))
+
+
+def get_control_value(filename, key, default=""):
+
+    return parse_controlfile(filename).get(key, default)
+
+
+def find_controlfile(jobline_no, control_dir=CONTROL_DIR):
+
+    # The range files only change when files are added or renamed, which
+    # changes the modification time of the folder
+    mtime = os.stat(control_dir).st_mtime_ns
+    cached = _control_dirs.get(control_dir)
+    if(cached is None or cached[0] != mtime):
+        ranges = []
+        for name in sorted(os.listdir(control_dir)):
+            jobline_range = name.split(".")[0]
+            if "-" not in jobline_range:
+                continue
+            try:
+                jobline_no_start, jobline_no_end = [int(value) for value in jobline_range.split("-", 1)]
+            except ValueError:
+                continue
+            ranges.append((jobline_no_start, jobline_no_end, os.path.join(control_dir, name)))
+        cached = (mtime, ranges)
+        _control_dirs[control_dir] = cached
+
+    if(jobline_no is not None):
+        for jobline_no_start, jobline_no_end, filename in cached[1]:
+            if(jobline_no_start <= jobline_no <= jobline_no_end):
+                return filename
+
+    filename = os.path.join(control_dir, "all.ctrl")
+    if not os.path.isfile(filename):
+        raise FileNotFoundError("No relevant control file was found")
+
+    return filename
+
+
+def get_typed_config(config):
+
+    typed = {}
+
+    for key, value in config.items():
+        if(key in INT_KEYS):
+            try:
+                typed[key] = int(value)
+            except ValueError:
+                typed[key] = value
+        elif(key in BOOL_KEYS):
+            typed[key] = value.lower() == "true"
+        elif(key in LIST_KEYS):
+            typed[key] = value.split(":")
+        else:
+            typed[key] = value
+
+    return typed
+
+
+def validate_config(config):
+
+    errors = []
+
+    for key, value in config.items():
+        if(key in INT_KEYS and not re.fullmatch(r'-?[0-9]+', value)):
+            errors.append(f"{key}={value} is not an integer")
+        elif(key in BOOL_KEYS and value.lower() not in ("true", "false")):
+            errors.append(f"{key}={value} is neither true nor false")
+        elif(key in CHOICES and value not in CHOICES[key]):
+            errors.append(f"{key}={value} is not one of {', '.join(sorted(CHOICES[key]))}")
+
+    list_lengths = {key: len(config[key].split(":")) for key in LIST_KEYS if key in config}
+    if(len(set(list_lengths.values())) > 1):
+        errors.append("The docking_scenario_* settings have different numbers of entries: " +
+                      ", ".join(f"{key}={length}" for key, length in sorted(list_lengths.items())))
+
+    if(config.get("ligands_per_refilling_step") == "0"):
+        errors.append("ligands_per_refilling_step has to be positive")
+
+    return errors
+
+
+def get_shell_assignments(config, array=None):
+
+    lines = []
+    for key, value in config.items():
+        if not re.fullmatch(r'[A-Za-z_][A-Za-z0-9_]*', key):
+            continue
+        if(array is None):
+            lines.append(f"{key}={shlex.quote(value)}")
+        else:
+            lines.append(f"{array}[{key}]={shlex.quote(value)}")
+
+    return lines
+
+
+def main():
+
+    parser = argparse.ArgumentParser(
+        description="Read, check and export the control file of a jobline")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    def add_source_arguments(subparser):
+        subparser.add_argument("controlfile", nargs="?",
+                               help="control file to read (default: the one of --jobline, or all.ctrl)")
+        subparser.add_argument("--jobline", type=int,
+                               help="use the range control file of this jobline if there is one")
+
+    export_parser = subparsers.add_parser("export", help="print all values as shell assignments")
+    add_source_arguments(export_parser)
+    export_parser.add_argument("--array", help="assign to this associative array instead of one variable per key")
+
+    get_parser = subparsers.add_parser("get", help="print one value")
+    get_parser.add_argument("key")
+    add_source_arguments(get_parser)
+
+    validate_parser = subparsers.add_parser("validate", help="check the values of the control file")
+    add_source_arguments(validate_parser)
+
+    args = parser.parse_args()
+
+    try:
+        controlfile = args.controlfile or find_controlfile(args.jobline)
+        config = parse_controlfile(controlfile)
+    except OSError as err:
+        print(f"Error: {err}", file=sys.stderr)
+        sys.exit(1)
+
+    if(args.command == "export"):
+        print(f"VF_CONTROLFILE_RESOLVED={shlex.quote(controlfile)}")
+        print("\n".join(get_shell_assignments(config, args.array)))
+
+    elif(args.command == "get"):
+        if(args.key not in config):
+            sys.exit(1)
+        print(config[args.key])
+
+    elif(args.command == "validate"):
+        errors = validate_config(config)
+        for error in errors:
+            print(f"{controlfile}: {error}")
+        if(len(errors) > 0):
+            sys.exit(1)
+        print(f"{controlfile}: OK")
+
+
+if __name__ == '__main__':
+    main()
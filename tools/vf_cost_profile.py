@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+
+# Copyright (C) 2019 Christoph Gorgulla
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# This file is part of VirtualFlow.
+#
+# VirtualFlow is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# VirtualFlow is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with VirtualFlow.  If not, see <https://www.gnu.org/licenses/>.
+
+# ---------------------------------------------------------------------------
+#
+# Description: Docking cost profile from the harvested ligand-list files
+#
+#              Streams the ligand-list files that vf_aws_get_status.py
+#              downloads to ../workflow/completed_status and computes the
+#              distribution of the docking time ('seconds' of each succeeded
+#              docking; failed dockings and stopped workers would pull the
+#              figures down) per metatranche (first two letters of the tranche) and per
+#              tranche, for each docking scenario and program. Collections
+#              that take much longer than the rest of their tranche are
+#              reported as outliers.
+#
+#              The cost table is a tab separated file with the columns
+#                level key scenario program events ligands seconds_per_ligand
+#                mean p50 p95 max
+#              where level is 'all', 'metatranche' or 'tranche' and the rows
+#              with scenario '*' cover all scenarios of a key together.
+#              Percentiles are estimated from log-spaced histograms
+#              (about 4% resolution). Use load_cost_table() and
+#              get_ligand_cost() to read it.
+#
+# Revision history:
+# 2026-10-19  Original version
+# 2026-10-19  Only succeeded dockings are profiled
+#
+# ---------------------------------------------------------------------------
+
+
+import os
+import gzip
+import json
+import math
+import argparse
+import multiprocessing
+from vf_controlfile import parse_config
+
+
+COST_TABLE_PATH = "../workflow/cost_table.tsv"
+OUTLIERS_PATH = "../workflow/cost_outliers.tsv"
+STATUS_DIR = "../workflow/completed_status"
+
+HISTOGRAM_MIN_SECONDS = 0.01
+HISTOGRAM_RATIO = 1.08
+HISTOGRAM_BINS = 250
+
+
+def get_scenario_programs(config):
+
+    scenario_programs = {}
+
+    if('docking_scenario_names' in config and 'docking_scenario_programs' in config):
+        for scenario, program in zip(config['docking_scenario_names'].split(":"), config['docking_scenario_programs'].split(":")):
+            scenario_programs[scenario] = program
+
+    return scenario_programs
+
+
+# Streaming statistics: count, sum, max and a log-spaced histogram
+
+def new_stats():
+
+    return {'events': 0, 'ligands': 0, 'sum': 0.0, 'max': 0.0, 'histogram': [0] * HISTOGRAM_BINS}
+
+
+def add_to_stats(stats, seconds):
+
+    stats['events'] += 1
+    stats['sum'] += seconds
+    stats['max'] = max(stats['max'], seconds)
+
+    if(seconds <= HISTOGRAM_MIN_SECONDS):
+        bin_index = 0
+    else:
+        bin_index = min(HISTOGRAM_BINS - 1, 1 + int(math.log(seconds /
+                        HISTOGRAM_MIN_SECONDS) / math.log(HISTOGRAM_RATIO)))
+    stats['histogram'][bin_index] += 1
+
+
+def merge_stats(stats, other):
+
+    stats['events'] += other['events']
+    stats['ligands'] += other['ligands']
+    stats['sum'] += other['sum']
+    stats['max'] = max(stats['max'], other['max'])
+    for bin_index, count in enumerate(other['histogram']):
+        stats['histogram'][bin_index] += count
+
+
+def get_percentile(stats, fraction):
+
+    if(stats['events'] == 0):
+        return 0.0
+
+    target = fraction * stats['events']
+    cumulative = 0
+    for bin_index, count in enumerate(stats['histogram']):
+        cumulative += count
+        if(cumulative >= target):
+            # Upper edge of the bin, but never more than the maximum seen
+            upper_edge = HISTOGRAM_MIN_SECONDS * (HISTOGRAM_RATIO ** bin_index)
+            return min(upper_edge, stats['max'])
+
+    return stats['max']
+
+
+# Aggregate a list of ligand-list files (runs in a worker process)
+
+def profile_files(args):
+
+    status_paths, scenario_programs = args
+
+    groups = {}
+    collection_costs = {}
+
+    def group_stats(level, key, scenario):
+        group_key = (level, key, scenario, scenario_programs.get(
+            scenario, "unknown") if scenario != "*" else "*")
+        if group_key not in groups:
+            groups[group_key] = new_stats()
+        return groups[group_key]
+
+    for status_path, collection_full_name in status_paths:
+
+        try:
+            with gzip.open(status_path, 'rt') as f:
+                log_events = json.load(f)
+        except Exception as err:
+            print(f"Error opening {status_path}: {err}")
+            continue
+
+        tranche = collection_full_name.split("_", 1)[0]
+        metatranche = tranche[:2]
+
+        ligands_by_scenario = {}
+        ligands = set()
+
+        for event in log_events:
+            if(event.get('status') != "succeeded" or 'seconds' not in event):
+                continue
+
+            seconds = float(event['seconds'])
+            scenario = event.get('scenario_key', "unknown")
+
+            for level, key in (("all", "all"), ("metatranche", metatranche), ("tranche", tranche)):
+                add_to_stats(group_stats(level, key, scenario), seconds)
+                add_to_stats(group_stats(level, key, "*"), seconds)
+
+            ligands_by_scenario.setdefault(scenario, set()).add(event['ligand'])
+            ligands.add(event['ligand'])
+
+            collection_cost = collection_costs.setdefault(
+                (collection_full_name, scenario), [0, 0.0])
+            collection_cost[0] += 1
+            collection_cost[1] += seconds
+
+        for level, key in (("all", "all"), ("metatranche", metatranche), ("tranche", tranche)):
+            for scenario, scenario_ligands in ligands_by_scenario.items():
+                group_stats(level, key, scenario)[
+                    'ligands'] += len(scenario_ligands)
+            if(len(ligands) > 0):
+                group_stats(level, key, "*")['ligands'] += len(ligands)
+
+    return groups, collection_costs
+
+
+def find_status_files(status_dir):
+
+    # {tranche prefix}/{tranche}/{collection number}.json.gz
+    for metatranche_entry in os.scandir(status_dir):
+        if not metatranche_entry.is_dir():
+            continue
+        for tranche_entry in os.scandir(metatranche_entry.path):
+            if not tranche_entry.is_dir():
+                continue
+            for collection_entry in os.scandir(tranche_entry.path):
+                if collection_entry.name.endswith(".json.gz"):
+                    collection_number = collection_entry.name[:-len(".json.gz")]
+                    yield collection_entry.path, f"{tranche_entry.name}_{collection_number}"
+
+
+def chunked(iterable, size):
+
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if(len(chunk) == size):
+            yield chunk
+            chunk = []
+    if(len(chunk) > 0):
+        yield chunk
+
+
+def process(status_dir, scenario_programs, processes, outlier_factor, min_outlier_events):
+
+    groups = {}
+    collection_costs = {}
+
+    with multiprocessing.Pool(processes=processes) as pool:
+        for partial_groups, partial_collection_costs in pool.imap_unordered(
+                profile_files, ((chunk, scenario_programs) for chunk in chunked(find_status_files(status_dir), 200))):
+
+            for group_key, stats in partial_groups.items():
+                if group_key not in groups:
+                    groups[group_key] = new_stats()
+                merge_stats(groups[group_key], stats)
+
+            for cost_key, cost in partial_collection_costs.items():
+                total_cost = collection_costs.setdefault(cost_key, [0, 0.0])
+                total_cost[0] += cost[0]
+                total_cost[1] += cost[1]
+
+    # A collection is an outlier if its mean docking time is more than
+    # outlier_factor times the median of its tranche for that scenario
+
+    outliers = []
+    for (collection_full_name, scenario), (events, seconds) in collection_costs.items():
+        if(events < min_outlier_events):
+            continue
+        tranche = collection_full_name.split("_", 1)[0]
+        group_key = ("tranche", tranche, scenario,
+                     scenario_programs.get(scenario, "unknown"))
+        median = get_percentile(groups[group_key], 0.5)
+        mean = seconds / events
+        if(median > 0 and mean > outlier_factor * median):
+            outliers.append((collection_full_name, scenario,
+                            events, mean, median, mean / median))
+
+    outliers.sort(key=lambda x: x[5], reverse=True)
+
+    return groups, outliers
+
+
+def write_cost_table(filename, groups):
+
+    level_order = {"all": 0, "metatranche": 1, "tranche": 2}
+
+    with open(f"{filename}.tmp", "w") as out:
+        out.write("level\tkey\tscenario\tprogram\tevents\tligands\tseconds_per_ligand\tmean\tp50\tp95\tmax\n")
+        for group_key in sorted(groups, key=lambda x: (level_order[x[0]], x[1], x[2])):
+            level, key, scenario, program = group_key
+            stats = groups[group_key]
+            if(stats['events'] == 0):
+                continue
+            seconds_per_ligand = stats['sum'] / \
+                stats['ligands'] if stats['ligands'] > 0 else 0.0
+            out.write(f"{level}\t{key}\t{scenario}\t{program}\t{stats['events']}\t{stats['ligands']}\t{seconds_per_ligand:.3f}\t"
+                      f"{stats['sum'] / stats['events']:.3f}\t{get_percentile(stats, 0.5):.3f}\t{get_percentile(stats, 0.95):.3f}\t{stats['max']:.3f}\n")
+
+    os.replace(f"{filename}.tmp", filename)
+
+
+def write_outliers(filename, outliers):
+
+    with open(f"{filename}.tmp", "w") as out:
+        out.write("collection\tscenario\tevents\tmean\ttranche_p50\tratio\n")
+        for collection_full_name, scenario, events, mean, median, ratio in outliers:
+            out.write(
+                f"{collection_full_name}\t{scenario}\t{events}\t{mean:.3f}\t{median:.3f}\t{ratio:.2f}\n")
+
+    os.replace(f"{filename}.tmp", filename)
+
+
+# Reading the cost table (used by the tools that pack or order work)
+
+def load_cost_table(filename=COST_TABLE_PATH):
+
+    cost_table = {}
+
+    with open(filename, "r") as read_file:
+        header = read_file.readline().rstrip("\n").split("\t")
+        for line in read_file:
+            row = dict(zip(header, line.rstrip("\n").split("\t")))
+            for column in ('events', 'ligands'):
+                row[column] = int(row[column])
+            for column in ('seconds_per_ligand', 'mean', 'p50', 'p95', 'max'):
+                row[column] = float(row[column])
+            cost_table[(row['level'], row['key'], row['scenario'])] = row
+
+    return cost_table
+
+
+# Expected docking seconds per ligand (all scenarios) of a collection or
+# tranche: from its tranche if it was profiled, otherwise its metatranche,
+# otherwise the overall value. Returns None if the table has none of these.
+
+def get_ligand_cost(cost_table, collection_full_name, scenario="*"):
+
+    tranche = collection_full_name.split("_", 1)[0]
+
+    for level, key in (("tranche", tranche), ("metatranche", tranche[:2]), ("all", "all")):
+        if (level, key, scenario) in cost_table:
+            row = cost_table[(level, key, scenario)]
+            return row['seconds_per_ligand'] if scenario == "*" else row['mean']
+
+    return None
+
+
+def main():
+
+    parser = argparse.ArgumentParser(
+        description="Build a docking cost table from the harvested ligand-list files")
+    parser.add_argument("--status-dir", default=STATUS_DIR,
+                        help=f"directory with the harvested ligand-list files (default: {STATUS_DIR})")
+    parser.add_argument("--output", default=COST_TABLE_PATH,
+                        help=f"cost table to write (default: {COST_TABLE_PATH})")
+    parser.add_argument("--outliers", default=OUTLIERS_PATH,
+                        help=f"outlier collections to write (default: {OUTLIERS_PATH})")
+    parser.add_argument("--outlier-factor", type=float, default=3.0,
+                        help="flag collections whose mean time is this many times their tranche median (default: 3)")
+    parser.add_argument("--min-outlier-events", type=int, default=10,
+                        help="only consider collections with at least this many events (default: 10)")
+    parser.add_argument("--processes", type=int, default=os.cpu_count(),
+                        help="number of parsing processes")
+    args = parser.parse_args()
+
+    scenario_programs = {}
+    if os.path.exists("../workflow/control/all.ctrl"):
+        scenario_programs = get_scenario_programs(
+            parse_config("../workflow/control/all.ctrl"))
+
+    groups, outliers = process(args.status_dir, scenario_programs,
+                               args.processes, args.outlier_factor, args.min_outlier_events)
+
+    write_cost_table(args.output, groups)
+    write_outliers(args.outliers, outliers)
+
+    print(f"Wrote {args.output} ({len(groups)} rows)")
+    print(f"Wrote {args.outliers} ({len(outliers)} outlier collections)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+
+# Copyright (C) 2019 Christoph Gorgulla
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# This file is part of VirtualFlow.
+#
+# VirtualFlow is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# VirtualFlow is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with VirtualFlow.  If not, see <https://www.gnu.org/licenses/>.
+
+# ---------------------------------------------------------------------------
+#
+# Description: Dispatcher for the central todo list of the HPC workflow
+#
+#              Keeps the collections of the central todo list (todo.all and
+#              todo.all.<index>) in an SQLite database
+#              (../workflow/ligand-collections/todo/dispatcher.db). The queues
+#              claim collections from it in one short transaction instead of
+#              locking, copying and splitting the whole todo.all file, so
+#              refilling does not depend on the length of the list or the
+#              number of joblines. It is used when todo_dispatcher=sqlite is
+#              set in the control file and the database exists; otherwise
+#              prepare-todolists.sh uses the todo.all files as before.
+#
+#              'load' moves the collections of the todo.all files into the
+#              database (the files are emptied), 'unload' moves the remaining
+#              ones back to todo.all to return to the file protocol.
+#
+#              The database uses WAL journaling by default. On shared file
+#              systems without working file locks or shared memory across
+#              nodes, load it with --journal-mode delete instead.
+#
+#              Usage:
+#                vf_dispatcher.py load [--journal-mode wal|delete]
+#                vf_dispatcher.py claim --ligands-per-queue N --ligands-per-step M <queue>[:<ligands>] ...
+#                vf_dispatcher.py unload
+#                vf_dispatcher.py status
+#
+# Revision history:
+# 2026-10-19  Original version
+#
+# ---------------------------------------------------------------------------
+
+
+import os
+import sys
+import glob
+import time
+import sqlite3
+import argparse
+
+
+TODO_DIR = "../workflow/ligand-collections/todo"
+DISPATCHER_PATH = f"{TODO_DIR}/dispatcher.db"
+SCHEMA_VERSION = 1
+
+SCHEMA = [
+    # Collections not yet handed out, in the order of the todo lists
+    """CREATE TABLE IF NOT EXISTS pending (
+        seq INTEGER PRIMARY KEY,
+        collection TEXT NOT NULL UNIQUE,
+        length INTEGER NOT NULL
+    )""",
+    """CREATE TABLE IF NOT EXISTS claimed (
+        collection TEXT PRIMARY KEY,
+        length INTEGER NOT NULL,
+        queue TEXT NOT NULL,
+        claimed REAL NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS claimed_queue ON claimed (queue)"
+]
+
+
+def open_dispatcher(path=DISPATCHER_PATH, journal_mode=None):
+
+    conn = sqlite3.connect(path, timeout=60, isolation_level=None)
+    conn.execute("PRAGMA busy_timeout = 60000")
+    if(journal_mode is not None):
+        conn.execute(f"PRAGMA journal_mode = {journal_mode}")
+    conn.execute("PRAGMA synchronous = NORMAL")
+
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if(version > SCHEMA_VERSION):
+        raise RuntimeError(
+            f"Dispatcher schema version {version} is newer than this tool supports ({SCHEMA_VERSION})")
+    if(version < 1):
+        conn.execute("BEGIN IMMEDIATE")
+        for statement in SCHEMA:
+            conn.execute(statement)
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        conn.execute("COMMIT")
+
+    return conn
+
+
+def get_todo_files(todo_dir=TODO_DIR):
+
+    # todo.all can be a symlink to one of the todo.all.<index> files
+    files = sorted(path for path in glob.glob(f"{todo_dir}/todo.all.[0-9]*")
+                   if not os.path.islink(path))
+    todo_all = f"{todo_dir}/todo.all"
+    if os.path.isfile(todo_all) and not os.path.islink(todo_all):
+        files.insert(0, todo_all)
+
+    return files
+
+
+def read_todo_file(filename):
+
+    with open(filename, "r") as read_file:
+        for line in read_file:
+            fields = line.split()
+            if(len(fields) >= 2 and fields[1].isdigit()):
+                yield fields[0], int(fields[1])
+
+
+def load(conn, todo_dir=TODO_DIR):
+
+    if os.path.lexists(f"{todo_dir}/todo.all.locked"):
+        raise RuntimeError(f"{todo_dir}/todo.all.locked exists, a jobline is refilling its todo lists")
+
+    counts = {'files': 0, 'collections': 0}
+
+    for filename in get_todo_files(todo_dir):
+        rows = list(read_todo_file(filename))
+        conn.execute("BEGIN IMMEDIATE")
+        cursor = conn.executemany("INSERT OR IGNORE INTO pending (collection, length) VALUES (?, ?)", rows)
+        conn.execute("COMMIT")
+        # Emptied only after the collections are in the database
+        with open(filename, "w"):
+            pass
+        counts['files'] += 1
+        counts['collections'] += cursor.rowcount
+
+    return counts
+
+
+def unload(conn, todo_dir=TODO_DIR):
+
+    todo_all = f"{todo_dir}/todo.all"
+
+    conn.execute("BEGIN IMMEDIATE")
+    rows = conn.execute("SELECT collection, length FROM pending ORDER BY seq").fetchall()
+    with open(f"{todo_all}.tmp", "w") as write_file:
+        if os.path.isfile(todo_all):
+            with open(todo_all, "r") as read_file:
+                write_file.writelines(line for line in read_file if line.strip() != "")
+        for collection, length in rows:
+            write_file.write(f"{collection} {length}\n")
+    os.replace(f"{todo_all}.tmp", todo_all)
+    conn.execute("DELETE FROM pending")
+    conn.execute("COMMIT")
+
+    return len(rows)
+
+
+def claim(conn, queues, ligands_per_queue, ligands_per_step):
+
+    # Same order of filling as prepare-todolists.sh: in every refill step each
+    # queue gets collections until it has step * ligands_per_step ligands
+    # queues: list of [queue, ligands already in the todo lists of the queue]
+
+    claims = []
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        pending = conn.execute("SELECT seq, collection, length FROM pending ORDER BY seq")
+        last_seq = None
+        exhausted = False
+
+        for step in range(1, max(ligands_per_queue // ligands_per_step, 1) + 1):
+            step_limit = step * ligands_per_step
+            for queue in queues:
+                while(queue[1] < step_limit):
+                    row = pending.fetchone()
+                    if(row is None):
+                        exhausted = True
+                        break
+                    last_seq, collection, length = row
+                    claims.append((collection, length, queue[0]))
+                    queue[1] += length
+                if(exhausted):
+                    break
+            if(exhausted):
+                break
+        pending.close()
+
+        if(last_seq is not None):
+            now = time.time()
+            conn.execute("DELETE FROM pending WHERE seq <= ?", (last_seq,))
+            conn.executemany("INSERT OR REPLACE INTO claimed (collection, length, queue, claimed) VALUES (?, ?, ?, ?)",
+                             [(collection, length, queue, now) for collection, length, queue in claims])
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+
+    return claims
+
+
+def claim_for_queue(queue_no, todo_path, ligands, path=DISPATCHER_PATH):
+
+    # Used by the queues when their own todo list runs empty
+    # Returns the number of collections appended to todo_path
+
+    conn = open_dispatcher(path)
+    try:
+        claims = claim(conn, [[queue_no, 0]], ligands, ligands)
+    finally:
+        conn.close()
+
+    with open(todo_path, "a") as write_file:
+        for collection, length, queue in claims:
+            write_file.write(f"{collection} {length}\n")
+
+    return len(claims)
+
+
+def get_status(conn):
+
+    pending = conn.execute("SELECT COUNT(*), COALESCE(SUM(length), 0) FROM pending").fetchone()
+    claimed = conn.execute("SELECT COUNT(*), COALESCE(SUM(length), 0), MAX(claimed) FROM claimed").fetchone()
+
+    return {
+        'pending_collections': pending[0],
+        'pending_ligands': pending[1],
+        'claimed_collections': claimed[0],
+        'claimed_ligands': claimed[1],
+        'last_claim': claimed[2]
+    }
+
+
+def parse_queue(value):
+
+    queue, _, ligands = value.partition(":")
+    return [queue, int(ligands or 0)]
+
+
+def main():
+
+    parser = argparse.ArgumentParser(
+        description="Dispatcher for the central todo list of the HPC workflow")
+    parser.add_argument("--db", default=DISPATCHER_PATH,
+                        help=f"path of the dispatcher database (default: {DISPATCHER_PATH})")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    load_parser = subparsers.add_parser("load", help="move the collections of the todo.all files into the dispatcher")
+    load_parser.add_argument("--journal-mode", choices=["wal", "delete"], default="wal",
+                             help="journal mode of the database (default: wal)")
+
+    claim_parser = subparsers.add_parser("claim", help="claim collections for queues and print them as 'queue collection length'")
+    claim_parser.add_argument("--ligands-per-queue", type=int, required=True,
+                              help="ligands_todo_per_queue of the control file")
+    claim_parser.add_argument("--ligands-per-step", type=int, required=True,
+                              help="ligands_per_refilling_step of the control file")
+    claim_parser.add_argument("queues", nargs="+",
+                              help="queue number and the ligands it already has, e.g. 1-1-1:12000")
+
+    subparsers.add_parser("unload", help="move the pending collections back to todo.all")
+    subparsers.add_parser("status", help="number of pending and claimed collections")
+
+    args = parser.parse_args()
+
+    if(args.command != "load" and not os.path.isfile(args.db)):
+        print(f"The dispatcher database {args.db} does not exist", file=sys.stderr)
+        sys.exit(1)
+
+    conn = open_dispatcher(args.db, args.journal_mode if args.command == "load" else None)
+
+    if(args.command == "load"):
+        counts = load(conn, os.path.dirname(args.db) or ".")
+        print(f"Loaded {counts['collections']} collections from {counts['files']} todo files into {args.db}")
+
+    elif(args.command == "claim"):
+        if(args.ligands_per_step <= 0):
+            print("--ligands-per-step has to be positive", file=sys.stderr)
+            sys.exit(1)
+        for collection, length, queue in claim(conn, [parse_queue(value) for value in args.queues],
+                                               args.ligands_per_queue, args.ligands_per_step):
+            print(f"{queue} {collection} {length}")
+
+    elif(args.command == "unload"):
+        print(f"Moved {unload(conn, os.path.dirname(args.db) or '.')} collections back to todo.all")
+
+    elif(args.command == "status"):
+        status = get_status(conn)
+        print(f"Pending: {status['pending_collections']} collections ({status['pending_ligands']} ligands)")
+        print(f"Claimed: {status['claimed_collections']} collections ({status['claimed_ligands']} ligands)")
+        if(status['last_claim'] is not None):
+            print(f"Last claim: {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(status['last_claim']))}")
+
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
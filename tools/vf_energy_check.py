@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+
+# Copyright (C) 2019 Christoph Gorgulla
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# This file is part of VirtualFlow.
+#
+# VirtualFlow is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# VirtualFlow is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with VirtualFlow.  If not, see <https://www.gnu.org/licenses/>.
+
+# ---------------------------------------------------------------------------
+#
+# Description: Batched potential energy check of docking poses
+#
+#              Computes the potential energy of the best pose (everything up
+#              to the first ENDMDL, as 'grep -m 1 ENDMDL -B 10000' in
+#              one-queue.sh) of many pdbqt result files at once. The poses
+#              are written into one multi-model file per batch and evaluated
+#              with a single obenergy call, which prints one TOTAL ENERGY line
+#              per model. If the number of energies does not match the number
+#              of poses (a pose obenergy could not read), the batch is split
+#              in halves until the failing poses are found, so every pose
+#              gets the same result as if it was evaluated alone. If the
+#              evaluator is not installed or crashes, RuntimeError is raised
+#              instead of failing every pose.
+#
+#              Evaluators are functions taking a list of pose texts and a
+#              scratch folder and returning a list with one energy (or None)
+#              per pose. Others can be added to EVALUATORS.
+#
+#              Used by one-queue.py and vf_aws_run.py (energy_check and
+#              energy_max in the control file), and through the command line
+#              by one-queue.sh, which prints
+#                <result file> <energy|NA> energy-check:success|failed
+#              for each file.
+#
+#              Usage:
+#                vf_energy_check.py --energy-max <value> <result file> ...
+#                vf_energy_check.py --energy-max <value> --list <file with result paths>
+#
+# Revision history:
+# 2026-10-19  Original version
+# 2026-10-19  Raise if obenergy is missing or crashes
+#
+# ---------------------------------------------------------------------------
+
+
+import os
+import re
+import sys
+import shutil
+import tempfile
+import argparse
+import subprocess
+import concurrent.futures
+
+
+BATCH_SIZE = 200
+THREADS = 4
+
+ENERGY_PATTERN = re.compile(r'TOTAL ENERGY\s*=\s*(?P<energy>\S+)')
+
+
+def get_first_pose(filename):
+
+    lines = []
+
+    try:
+        with open(filename, "r", errors="replace") as read_file:
+            for line in read_file:
+                lines.append(line)
+                if "ENDMDL" in line:
+                    return "".join(lines[-10001:])
+    except OSError:
+        pass
+
+    return None
+
+
+def run_obenergy(poses, work_dir):
+
+    with tempfile.NamedTemporaryFile("w", suffix=".pdbqt", dir=work_dir, delete=False) as write_file:
+        for pose in poses:
+            write_file.write(pose)
+            if not pose.endswith("\n"):
+                write_file.write("\n")
+        batch_path = write_file.name
+
+    try:
+        result = subprocess.run(["obenergy", batch_path], stdout=subprocess.PIPE,
+                                stderr=subprocess.DEVNULL, universal_newlines=True)
+    except OSError as err:
+        raise RuntimeError(f"obenergy could not be run: {err}")
+    finally:
+        os.remove(batch_path)
+
+    # A pose that cannot be read is left out of the output, a signal is a crash
+    if(result.returncode < 0):
+        raise RuntimeError(f"obenergy was stopped by signal {-result.returncode}")
+    output = result.stdout
+
+    energies = []
+    for match in ENERGY_PATTERN.finditer(output):
+        try:
+            energies.append(float(match.group('energy')))
+        except ValueError:
+            energies.append(None)
+
+    return energies
+
+
+def evaluate_obenergy(poses, work_dir):
+
+    energies = run_obenergy(poses, work_dir)
+    if(len(energies) == len(poses)):
+        return energies
+
+    if(len(poses) == 1):
+        return [None]
+
+    # Some pose could not be read, the energies cannot be matched to the poses
+    middle = len(poses) // 2
+    return evaluate_obenergy(poses[:middle], work_dir) + evaluate_obenergy(poses[middle:], work_dir)
+
+
+EVALUATORS = {
+    'obenergy': evaluate_obenergy
+}
+
+# Program each evaluator needs
+EVALUATOR_PROGRAMS = {
+    'obenergy': "obenergy"
+}
+
+
+def get_energies(result_paths, evaluator="obenergy", batch_size=BATCH_SIZE, threads=THREADS, work_dir=None):
+
+    # Returns {result path: energy of the first pose, or None}. Raises
+    # RuntimeError if the evaluator cannot run
+
+    program = EVALUATOR_PROGRAMS.get(evaluator)
+    if(program is not None and shutil.which(program) is None):
+        raise RuntimeError(f"{program} was not found, the energy check cannot run")
+
+    energies = {path: None for path in result_paths}
+    poses = []
+    for path in result_paths:
+        pose = get_first_pose(path)
+        if(pose is not None):
+            poses.append((path, pose))
+
+    batches = [poses[start:start + batch_size] for start in range(0, len(poses), batch_size)]
+    evaluate = EVALUATORS[evaluator]
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(threads, 1)) as executor:
+        futures = {executor.submit(evaluate, [pose for path, pose in batch], work_dir): batch for batch in batches}
+        for future in concurrent.futures.as_completed(futures):
+            batch = futures[future]
+            batch_energies = future.result()
+            for (path, pose), energy in zip(batch, batch_energies):
+                energies[path] = energy
+
+    return energies
+
+
+def check_energies(result_paths, energy_max, evaluator="obenergy", batch_size=BATCH_SIZE, threads=THREADS, work_dir=None):
+
+    # Returns {result path: (passed, energy)}, poses without an energy fail
+    energies = get_energies(result_paths, evaluator, batch_size, threads, work_dir)
+
+    return {path: (energy is not None and energy <= energy_max, energy) for path, energy in energies.items()}
+
+
+def main():
+
+    parser = argparse.ArgumentParser(
+        description="Check the potential energy of the best pose of docking results")
+    parser.add_argument("results", nargs="*", help="docking result files (pdbqt)")
+    parser.add_argument("--list", help="file with one result path per line")
+    parser.add_argument("--energy-max", type=float, required=True,
+                        help="maximum allowed energy (energy_max of the control file)")
+    parser.add_argument("--evaluator", choices=sorted(EVALUATORS), default="obenergy")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE,
+                        help=f"poses per evaluator call (default: {BATCH_SIZE})")
+    parser.add_argument("--threads", type=int, default=THREADS,
+                        help=f"evaluator calls running at the same time (default: {THREADS})")
+    args = parser.parse_args()
+
+    result_paths = list(args.results)
+    if(args.list):
+        with open(args.list, "r") as read_file:
+            result_paths.extend(line.strip() for line in read_file if line.strip() != "")
+
+    try:
+        results = check_energies(result_paths, args.energy_max, args.evaluator, args.batch_size, args.threads)
+    except RuntimeError as err:
+        print(f"Error: {err}", file=sys.stderr)
+        sys.exit(1)
+    for path in result_paths:
+        passed, energy = results[path]
+        print(f"{path} {'NA' if energy is None else energy} energy-check:{'success' if passed else 'failed'}")
+
+
+if __name__ == '__main__':
+    main()
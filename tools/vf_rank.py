@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+
+# Copyright (C) 2019 Christoph Gorgulla
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# This file is part of VirtualFlow.
+#
+# VirtualFlow is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# VirtualFlow is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with VirtualFlow.  If not, see <https://www.gnu.org/licenses/>.
+
+# ---------------------------------------------------------------------------
+#
+# Description: Top-K ranking of the ligands of a docking scenario
+#
+#              Streams the summary files of a docking scenario, either from
+#              the local output folders (../output-files/{complete,incomplete}
+#              including the per-tranche .tar files) or from the object store
+#              (output/<scenario>/summaries), parses them in a process pool
+#              and keeps only the best K ligands. Each worker returns a
+#              bounded heap per batch of files and the batches are merged into
+#              the global top-K, so memory is O(K) regardless of the size of
+#              the campaign.
+#
+#              Lower scores rank first (as in vf_report.sh), use
+#              --highest-first for scoring functions where higher is better.
+#              The score columns are found from the header of each file since
+#              the summaries written on AWS have no SMILES column.
+#
+# Revision history:
+# 2026-10-19  Original version
+#
+# ---------------------------------------------------------------------------
+
+
+import os
+import io
+import gzip
+import heapq
+import tarfile
+import argparse
+import multiprocessing
+from vf_controlfile import parse_config
+
+
+SCORE_COLUMNS = {
+    'average': "average-score",
+    'maximum': "maximum-score"
+}
+
+FILES_PER_BATCH = 64
+
+s3_client = None
+
+
+# The heap holds (sort key, score, collection, ligand) and its root is the
+# worst entry kept, so it can be replaced as soon as a better one shows up
+
+def push_bounded(heap, top_k, entry):
+
+    if(len(heap) < top_k):
+        heapq.heappush(heap, entry)
+    elif(entry[0] > heap[0][0]):
+        heapq.heapreplace(heap, entry)
+
+
+# Yields (collection, ligand, average score, maximum score) of each ligand
+
+def parse_summary_lines(lines):
+
+    columns = None
+
+    for line in lines:
+        fields = line.split()
+        if(len(fields) == 0):
+            continue
+
+        if(fields[0] == "Tranch"):
+            columns = (fields.index(SCORE_COLUMNS['average']),
+                       fields.index(SCORE_COLUMNS['maximum']))
+            continue
+
+        if(columns is None or len(fields) <= max(columns)):
+            continue
+
+        try:
+            yield fields[0], fields[1], float(fields[columns[0]]), float(fields[columns[1]])
+        except ValueError:
+            continue
+
+
+def rank_summary_lines(heap, top_k, lines, score_column, highest_first):
+
+    for collection, ligand, average, maximum in parse_summary_lines(lines):
+        score = average if score_column == "average" else maximum
+        push_bounded(heap, top_k, (score if highest_first else -score,
+                                   score, collection, ligand))
+
+
+def open_summary_lines(source):
+
+    source_type, location = source[:2]
+
+    if(source_type == "s3"):
+        bucket, key = location
+        response = s3_client.get_object(Bucket=bucket, Key=key)
+        yield from gzip.open(io.BytesIO(response['Body'].read()), 'rt')
+
+    elif(location.endswith(".tar")):
+        # outputfiles_level=tranche keeps the summaries of a tranche in a tar
+        with tarfile.open(location, 'r') as tar:
+            for member in tar:
+                if member.isfile() and member.name.endswith(".txt.gz"):
+                    yield from gzip.open(tar.extractfile(member), 'rt')
+
+    else:
+        with gzip.open(location, 'rt') as f:
+            yield from f
+
+
+def rank_batch(args):
+
+    sources, top_k, score_column, highest_first = args
+
+    heap = []
+    files = 0
+
+    for source in sources:
+        try:
+            rank_summary_lines(heap, top_k, open_summary_lines(
+                source), score_column, highest_first)
+            files += 1
+        except Exception as err:
+            print(f"Error reading {source[1]}: {err}")
+
+    return heap, files
+
+
+def init_s3_worker():
+
+    global s3_client
+
+    import boto3
+    s3_client = boto3.client('s3')
+
+
+# Sources are (type, location, version) where the version changes whenever
+# the file does (mtime and size, or the ETag in the object store)
+
+def find_local_summaries(folder):
+
+    for root, dirs, files in os.walk(folder):
+        for filename in files:
+            if filename.endswith(".txt.gz") or filename.endswith(".tar"):
+                path = os.path.join(root, filename)
+                stat = os.stat(path)
+                yield ("local", path, f"{stat.st_mtime_ns}-{stat.st_size}")
+
+
+def find_s3_summaries(config, scenario):
+
+    import boto3
+
+    s3 = boto3.client('s3')
+    prefix = f"{config['object_store_job_data_prefix']}/output/{scenario}/summaries/"
+
+    paginator = s3.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=config['object_store_bucket'], Prefix=prefix):
+        for item in page.get('Contents', []):
+            if item['Key'].endswith(".txt.gz"):
+                yield ("s3", (config['object_store_bucket'], item['Key']), item['ETag'])
+
+
+def batched(sources, size):
+
+    batch = []
+    for source in sources:
+        batch.append(source)
+        if(len(batch) == size):
+            yield batch
+            batch = []
+    if(len(batch) > 0):
+        yield batch
+
+
+def process(sources, top_k, score_column, highest_first, processes, initializer=None):
+
+    heap = []
+    files = 0
+
+    with multiprocessing.Pool(processes=processes, initializer=initializer) as pool:
+        for batch_heap, batch_files in pool.imap_unordered(
+                rank_batch, ((batch, top_k, score_column, highest_first) for batch in batched(sources, FILES_PER_BATCH))):
+            for entry in batch_heap:
+                push_bounded(heap, top_k, entry)
+            files += batch_files
+
+    ranked = sorted(heap, reverse=True)
+
+    return [(score, collection, ligand) for sort_key, score, collection, ligand in ranked], files
+
+
+def main():
+
+    parser = argparse.ArgumentParser(
+        description="Rank the best ligands of a docking scenario from its summary files")
+    parser.add_argument("scenario", help="docking scenario name")
+    parser.add_argument("-k", "--top", type=int, default=100,
+                        help="number of ligands to report (default: 100)")
+    parser.add_argument("--score", choices=sorted(SCORE_COLUMNS), default="maximum",
+                        help="score column to rank by (default: maximum)")
+    parser.add_argument("--highest-first", action="store_true",
+                        help="rank higher scores first")
+    parser.add_argument("--s3", action="store_true",
+                        help="read the summaries from the object store instead of ../output-files")
+    parser.add_argument("--path", action="append",
+                        help="local folder with summaries (can be repeated)")
+    parser.add_argument("--processes", type=int, default=os.cpu_count(),
+                        help="number of parsing processes")
+    parser.add_argument("--output", help="also write the ranking to this tab separated file")
+    args = parser.parse_args()
+
+    if(args.s3):
+        config = parse_config("../workflow/control/all.ctrl")
+        sources = find_s3_summaries(config, args.scenario)
+        initializer = init_s3_worker
+    else:
+        folders = args.path or [
+            f"../output-files/complete/{args.scenario}/summaries",
+            f"../output-files/incomplete/{args.scenario}/summaries"
+        ]
+        sources = (source for folder in folders for source in find_local_summaries(folder))
+        initializer = None
+
+    ranked, files = process(sources, args.top, args.score,
+                            args.highest_first, args.processes, initializer)
+
+    print(f"\nRanked {files} summary files, top {len(ranked)} ligands by {args.score} score:\n")
+    print("      Rank       Ligand           Collection       Score")
+    for rank, (score, collection, ligand) in enumerate(ranked, start=1):
+        print(f"    {rank:5d}    {ligand:>10s}     {collection}            {score:5.1f}")
+
+    if(args.output):
+        with open(args.output, "w") as out:
+            out.write("rank\tligand\tcollection\tscore\n")
+            for rank, (score, collection, ligand) in enumerate(ranked, start=1):
+                out.write(f"{rank}\t{ligand}\t{collection}\t{score}\n")
+
+
+if __name__ == '__main__':
+    main()
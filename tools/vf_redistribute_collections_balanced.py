@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+
+# Copyright (C) 2019 Christoph Gorgulla
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# This file is part of VirtualFlow.
+#
+# VirtualFlow is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# VirtualFlow is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with VirtualFlow.  If not, see <https://www.gnu.org/licenses/>.
+
+# ---------------------------------------------------------------------------
+#
+# Description: Distribution of collections to the queues by predicted cost
+#
+#              Like vf_redistribute_collections_single.sh and
+#              vf_redistribute_collections_multiple.sh, but the collections
+#              are not dealt out by count. The predicted cost of a collection
+#              is its number of ligands (second column of the todo lists)
+#              times the docking seconds per ligand of its tranche from the
+#              cost table of vf_cost_profile.py (optional, without it every
+#              ligand costs the same). The collections are assigned from the
+#              most to the least expensive, each to the queue with the least
+#              predicted work so far (longest processing time first), so all
+#              queues are predicted to finish at about the same time.
+#
+#              The queue files are written as <jobline>-<step>-<queue> into
+#              the output folder with one '<collection> <ligands>' line per
+#              collection (in the order of the input), or with --nested as
+#              <jobline>/<step>/<jobline>-<step>-<queue> as in
+#              ../workflow/ligand-collections/todo. Files of queues in the
+#              jobline range that get no collections are removed, so no
+#              collections of an earlier distribution are left behind.
+#
+#              Usage:
+#                vf_redistribute_collections_balanced.py <collection file> ... --joblines <first>-<last> <output folder>
+#                  [--steps-per-job N] [--queues-per-step N] [--cost-table <file>] [--nested]
+#
+#              steps_per_job and queues_per_step default to the values of
+#              the control file.
+#
+# Revision history:
+# 2026-10-19  Original version
+# 2026-10-19  Remove the files of queues without collections
+#
+# ---------------------------------------------------------------------------
+
+
+import os
+import sys
+import heapq
+import argparse
+
+from vf_controlfile import parse_config
+from vf_cost_profile import load_cost_table, get_ligand_cost
+
+
+CONTROLFILE = "../workflow/control/all.ctrl"
+
+
+def read_collections(filenames):
+
+    # Returns [(collection, ligands)] in the order of the files, without duplicates
+    collections = []
+    seen = set()
+
+    for filename in filenames:
+        with open(filename, "r") as read_file:
+            for line in read_file:
+                fields = line.split()
+                if(len(fields) == 0 or fields[0] in seen):
+                    continue
+                ligands = int(fields[1]) if len(fields) > 1 and fields[1].isdigit() else 1
+                collections.append((fields[0], ligands))
+                seen.add(fields[0])
+
+    return collections
+
+
+def get_costs(collections, cost_table=None):
+
+    # Predicted seconds (or ligands without a cost table) of each collection
+    costs = []
+    for collection, ligands in collections:
+        seconds_per_ligand = None
+        if(cost_table is not None):
+            seconds_per_ligand = get_ligand_cost(cost_table, collection)
+        costs.append(ligands * (seconds_per_ligand if seconds_per_ligand is not None else 1.0))
+
+    return costs
+
+
+def get_queues(jobline_no_start, jobline_no_end, steps_per_job, queues_per_step):
+
+    return [f"{jobline_no}-{step_no}-{queue_no}"
+            for jobline_no in range(jobline_no_start, jobline_no_end + 1)
+            for step_no in range(1, steps_per_job + 1)
+            for queue_no in range(1, queues_per_step + 1)]
+
+
+def distribute(costs, queue_count):
+
+    # Longest processing time first: returns the queue index of each
+    # collection and the predicted work of each queue
+    assignment = [None] * len(costs)
+    loads = [0.0] * queue_count
+    heap = [(0.0, queue_index) for queue_index in range(queue_count)]
+
+    for index in sorted(range(len(costs)), key=lambda index: -costs[index]):
+        load, queue_index = heapq.heappop(heap)
+        assignment[index] = queue_index
+        loads[queue_index] = load + costs[index]
+        heapq.heappush(heap, (loads[queue_index], queue_index))
+
+    return assignment, loads
+
+
+def write_queue_files(output_folder, queues, collections, assignment, nested=False):
+
+    lines = {queue: [] for queue in queues}
+    for (collection, ligands), queue_index in zip(collections, assignment):
+        lines[queues[queue_index]].append(f"{collection} {ligands}\n")
+
+    for queue, queue_lines in lines.items():
+        if(nested):
+            jobline_no, step_no, _ = queue.split("-")
+            folder = os.path.join(output_folder, jobline_no, step_no)
+        else:
+            folder = output_folder
+        path = os.path.join(folder, queue)
+        if(len(queue_lines) == 0):
+            if os.path.isfile(path):
+                os.remove(path)
+            continue
+        os.makedirs(folder, exist_ok=True)
+        with open(f"{path}.tmp", "w") as write_file:
+            write_file.writelines(queue_lines)
+        os.replace(f"{path}.tmp", path)
+
+
+def print_balance(name, loads):
+
+    if(len(loads) == 0):
+        return
+    mean = sum(loads) / len(loads)
+    print(f" * {name}: min {min(loads):.1f}, mean {mean:.1f}, max {max(loads):.1f}"
+          f" (max/mean {max(loads) / mean if mean > 0 else 0:.2f})")
+
+
+def main():
+
+    parser = argparse.ArgumentParser(
+        description="Distribute collections to the queues of joblines by predicted docking cost")
+    parser.add_argument("collection_files", nargs="+",
+                        help="todo lists with '<collection> <ligands>' lines (e.g. todo.all)")
+    parser.add_argument("output_folder", help="folder for the queue todo files")
+    parser.add_argument("--joblines", required=True,
+                        help="range of joblines, e.g. 1-100")
+    parser.add_argument("--steps-per-job", type=int,
+                        help="steps per job (default: steps_per_job of the control file)")
+    parser.add_argument("--queues-per-step", type=int,
+                        help="queues per step (default: queues_per_step of the control file)")
+    parser.add_argument("--cost-table",
+                        help="cost table of vf_cost_profile.py (default: cost by number of ligands)")
+    parser.add_argument("--nested", action="store_true",
+                        help="write <jobline>/<step>/<queue> as in ../workflow/ligand-collections/todo")
+    parser.add_argument("--controlfile", default=CONTROLFILE,
+                        help=f"control file for the defaults (default: {CONTROLFILE})")
+    args = parser.parse_args()
+
+    try:
+        jobline_no_start, jobline_no_end = [int(value) for value in args.joblines.split("-", 1)]
+    except ValueError:
+        print(f"Invalid jobline range {args.joblines}, expected <first>-<last>", file=sys.stderr)
+        sys.exit(1)
+
+    steps_per_job = args.steps_per_job
+    queues_per_step = args.queues_per_step
+    if(steps_per_job is None or queues_per_step is None):
+        config = parse_config(args.controlfile)
+        steps_per_job = steps_per_job or int(config['steps_per_job'])
+        queues_per_step = queues_per_step or int(config['queues_per_step'])
+
+    queues = get_queues(jobline_no_start, jobline_no_end, steps_per_job, queues_per_step)
+    if(len(queues) == 0):
+        print("No queues in the given range", file=sys.stderr)
+        sys.exit(1)
+
+    collections = read_collections(args.collection_files)
+    cost_table = load_cost_table(args.cost_table) if args.cost_table else None
+    costs = get_costs(collections, cost_table)
+
+    print(f" *** Distributing {len(collections)} collections to {len(queues)} queues ***\n")
+    assignment, loads = distribute(costs, len(queues))
+    write_queue_files(args.output_folder, queues, collections, assignment, args.nested)
+
+    unit = "seconds" if cost_table is not None else "ligands"
+    round_robin_loads = [0.0] * len(queues)
+    for index, cost in enumerate(costs):
+        round_robin_loads[index % len(queues)] += cost
+    print_balance(f"Predicted {unit} per queue", loads)
+    print_balance(f"Predicted {unit} per queue when distributed by count", round_robin_loads)
+
+    print("\n * Redistribution complete\n")
+
+
+if __name__ == '__main__':
+    main()
@@ -212,6 +212,16 @@ echo "                                  $(date)
 # Checking the category
 if [[ "${category}" = "workflow" ]]; then
 
+    # Counting the collections, ligands and dockings
+    # vf_workflow_status.py caches the counts of each file and only reads the files which have changed since the last report
+    status_scanned="false"
+    if command -v python3 &> /dev/null; then
+        if status_values="$(python3 vf_workflow_status.py --shell)"; then
+            eval "${status_values}"
+            status_scanned="true"
+        fi
+    fi
+
     # Displaying the information
     echo
     echo
@@ -269,7 +279,10 @@ if [[ "${category}" = "workflow" ]]; then
         echo " Number of joblines in the batch system currently not running: $(bin/sqs 2>/dev/null | grep "${job_letter}\-" | grep "${USER:0:8}" | grep -i  " qw " | grep -c "" 2>/dev/null || true)"
     fi
     if [[ "$verbosity" -gt "2" ]]; then
-        echo " Number of collections which are currently assigned to more than one queue: $(awk -F '.' '{print $1}' ../workflow/ligand-collections/current/*/*/* 2>/dev/null | sort -S 80% | uniq -c | grep " [2-9] " | grep -c "" 2>/dev/null || true)"
+        if [ "${status_scanned}" == "false" ]; then
+            ligand_collections_multiple_queues="$(awk -F '.' '{print $1}' ../workflow/ligand-collections/current/*/*/* 2>/dev/null | sort -S 80% | uniq -c | grep " [2-9] " | grep -c "" 2>/dev/null || true)"
+        fi
+        echo " Number of collections which are currently assigned to more than one queue: ${ligand_collections_multiple_queues}"
     fi
     if [[ "${batchsystem}" == "LSF" || "${batchsystem}" == "SLURM" || "{batchsystem}" == "SGE" ]]; then
         if [[ "${batchsystem}" == "SLURM" ]]; then
@@ -297,47 +310,56 @@ if [[ "${category}" = "workflow" ]]; then
     echo "                                            Collections    "
     echo "................................................................................................"
     echo
-    echo " Total number of ligand collections: $(grep -c "" ../workflow/ligand-collections/var/todo.original 2>/dev/null || true )"
-
-    ligand_collections_completed=0
-    for folder1 in $(find ../workflow/ligand-collections/done/ -mindepth 1 -maxdepth 1 -type d -printf "%f\n"); do
-        for folder2 in $(find ../workflow/ligand-collections/done/$folder1/ -mindepth 1 -maxdepth 1 -type d -printf "%f\n"); do
-            ligand_collections_completed_toadd="$(grep -ch "" ../workflow/ligand-collections/done/$folder1/$folder2/* 2>/dev/null | paste -sd+ 2>/dev/null | bc )"
-            if [[ -z "${ligand_collections_completed_toadd// }" ]]; then
-                ligand_collections_completed_toadd=0
-            fi
-            ligand_collections_completed=$((ligand_collections_completed + ligand_collections_completed_toadd))
+    if [ "${status_scanned}" == "false" ]; then
+        ligand_collections_total="$(grep -c "" ../workflow/ligand-collections/var/todo.original 2>/dev/null || true )"
+    fi
+    echo " Total number of ligand collections: ${ligand_collections_total}"
+
+    if [ "${status_scanned}" == "false" ]; then
+        ligand_collections_completed=0
+        for folder1 in $(find ../workflow/ligand-collections/done/ -mindepth 1 -maxdepth 1 -type d -printf "%f\n"); do
+            for folder2 in $(find ../workflow/ligand-collections/done/$folder1/ -mindepth 1 -maxdepth 1 -type d -printf "%f\n"); do
+                ligand_collections_completed_toadd="$(grep -ch "" ../workflow/ligand-collections/done/$folder1/$folder2/* 2>/dev/null | paste -sd+ 2>/dev/null | bc )"
+                if [[ -z "${ligand_collections_completed_toadd// }" ]]; then
+                    ligand_collections_completed_toadd=0
+                fi
+                ligand_collections_completed=$((ligand_collections_completed + ligand_collections_completed_toadd))
+            done
         done
-    done
+    fi
     echo " Number of ligand collections completed: ${ligand_collections_completed}"
 
-    ligand_collections_processing=0
-    for folder1 in $(find ../workflow/ligand-collections/current/ -mindepth 1 -maxdepth 1 -type d -printf "%f\n"); do
-        for folder2 in $(find ../workflow/ligand-collections/current/$folder1/ -mindepth 1 -maxdepth 1 -type d -printf "%f\n"); do
-            ligand_collections_processing_toadd=$(grep -ch "" ../workflow/ligand-collections/current/$folder1/$folder2/* 2>/dev/null | paste -sd+ 2>/dev/null | bc )
-            if [[ -z "${ligand_collections_processing_toadd// }" ]]; then
-                ligand_collections_processing_toadd=0
-            fi
-            ligand_collections_processing=$((ligand_collections_processing + ligand_collections_processing_toadd))
+    if [ "${status_scanned}" == "false" ]; then
+        ligand_collections_processing=0
+        for folder1 in $(find ../workflow/ligand-collections/current/ -mindepth 1 -maxdepth 1 -type d -printf "%f\n"); do
+            for folder2 in $(find ../workflow/ligand-collections/current/$folder1/ -mindepth 1 -maxdepth 1 -type d -printf "%f\n"); do
+                ligand_collections_processing_toadd=$(grep -ch "" ../workflow/ligand-collections/current/$folder1/$folder2/* 2>/dev/null | paste -sd+ 2>/dev/null | bc )
+                if [[ -z "${ligand_collections_processing_toadd// }" ]]; then
+                    ligand_collections_processing_toadd=0
+                fi
+                ligand_collections_processing=$((ligand_collections_processing + ligand_collections_processing_toadd))
+            done
         done
-    done
+    fi
     echo " Number of ligand collections in state \"processing\": ${ligand_collections_processing}"
 
-    ligand_collections_todo=0
-    for folder1 in $(find ../workflow/ligand-collections/todo/ -mindepth 1 -maxdepth 1 -type d -printf "%f\n"); do
-        for folder2 in $(find ../workflow/ligand-collections/todo/$folder1/ -mindepth 1 -maxdepth 1 -type d -printf "%f\n"); do
-            ligand_collections_todo_toadd=$(grep -ch "" ../workflow/ligand-collections/todo/$folder1/$folder2/* 2>/dev/null | paste -sd+ 2>/dev/null | bc )
-            if [[ -z "${ligand_collections_todo_toadd// }" ]]; then
-                ligand_collections_todo_toadd=0
-            fi
-            ligand_collections_todo=$((ligand_collections_todo + ligand_collections_todo_toadd))
+    if [ "${status_scanned}" == "false" ]; then
+        ligand_collections_todo=0
+        for folder1 in $(find ../workflow/ligand-collections/todo/ -mindepth 1 -maxdepth 1 -type d -printf "%f\n"); do
+            for folder2 in $(find ../workflow/ligand-collections/todo/$folder1/ -mindepth 1 -maxdepth 1 -type d -printf "%f\n"); do
+                ligand_collections_todo_toadd=$(grep -ch "" ../workflow/ligand-collections/todo/$folder1/$folder2/* 2>/dev/null | paste -sd+ 2>/dev/null | bc )
+                if [[ -z "${ligand_collections_todo_toadd// }" ]]; then
+                    ligand_collections_todo_toadd=0
+                fi
+                ligand_collections_todo=$((ligand_collections_todo + ligand_collections_todo_toadd))
+            done
         done
-    done
-    ligand_collections_todo_toadd=$(grep -ch "" ../workflow/ligand-collections/todo/todo.all.[0-9]* 2>/dev/null | paste -sd+ 2>/dev/null | bc )
-    if [[ -z "${ligand_collections_todo_toadd// }" ]]; then
-        ligand_collections_todo_toadd=0
+        ligand_collections_todo_toadd=$(grep -ch "" ../workflow/ligand-collections/todo/todo.all.[0-9]* 2>/dev/null | paste -sd+ 2>/dev/null | bc )
+        if [[ -z "${ligand_collections_todo_toadd// }" ]]; then
+            ligand_collections_todo_toadd=0
+        fi
+        ligand_collections_todo=$((ligand_collections_todo + ligand_collections_todo_toadd))
     fi
-    ligand_collections_todo=$((ligand_collections_todo + ligand_collections_todo_toadd))
     echo " Number of ligand collections not yet started: ${ligand_collections_todo}"
     echo
     echo
@@ -346,49 +368,57 @@ if [[ "${category}" = "workflow" ]]; then
     echo "................................................................................................"
     echo
 
-    ligands_total=0
-    if [ -s ../workflow/ligand-collections/var/todo.original ]; then
-        ligands_total="$(awk '{print $2}' ../workflow/ligand-collections/var/todo.original | paste -sd+ | bc -l 2>/dev/null || true)"
-        if [[ -z "${ligands_total// }" ]]; then
-            ligands_total=0
+    if [ "${status_scanned}" == "false" ]; then
+        ligands_total=0
+        if [ -s ../workflow/ligand-collections/var/todo.original ]; then
+            ligands_total="$(awk '{print $2}' ../workflow/ligand-collections/var/todo.original | paste -sd+ | bc -l 2>/dev/null || true)"
+            if [[ -z "${ligands_total// }" ]]; then
+                ligands_total=0
+            fi
         fi
     fi
     echo " Total number of ligands: ${ligands_total}"
 
-    ligands_started=0
-    for folder1 in $(find ../workflow/ligand-collections/done/ -mindepth 1 -maxdepth 1 -type d -printf "%f\n"); do
-        for folder2 in $(find ../workflow/ligand-collections/done/$folder1/ -mindepth 1 -maxdepth 1 -type d -printf "%f\n"); do
-            ligands_started_to_add="$(grep -ho "Ligands-started:[0-9]\+" ../workflow/ligand-collections/done/$folder1/$folder2/* 2>/dev/null | awk -F ':' '{print $2}' | sed "/^$/d" |  paste -sd+ | bc -l 2>/dev/null || true)"
-            if [[ -z "${ligands_started_to_add// }" ]]; then
-                ligands_started_to_add=0
-            fi
-            ligands_started=$((ligands_started + ligands_started_to_add))
+    if [ "${status_scanned}" == "false" ]; then
+        ligands_started=0
+        for folder1 in $(find ../workflow/ligand-collections/done/ -mindepth 1 -maxdepth 1 -type d -printf "%f\n"); do
+            for folder2 in $(find ../workflow/ligand-collections/done/$folder1/ -mindepth 1 -maxdepth 1 -type d -printf "%f\n"); do
+                ligands_started_to_add="$(grep -ho "Ligands-started:[0-9]\+" ../workflow/ligand-collections/done/$folder1/$folder2/* 2>/dev/null | awk -F ':' '{print $2}' | sed "/^$/d" |  paste -sd+ | bc -l 2>/dev/null || true)"
+                if [[ -z "${ligands_started_to_add// }" ]]; then
+                    ligands_started_to_add=0
+                fi
+                ligands_started=$((ligands_started + ligands_started_to_add))
+            done
         done
-    done
+    fi
     echo " Number of ligands started: ${ligands_started}"
 
-    ligands_success=0
-    for folder1 in $(find ../workflow/ligand-collections/done/ -mindepth 1 -maxdepth 1 -type d -printf "%f\n"); do
-        for folder2 in $(find ../workflow/ligand-collections/done/$folder1/ -mindepth 1 -maxdepth 1 -type d -printf "%f\n"); do
-            ligands_success_to_add="$(grep -ho "Ligands-succeeded:[0-9]\+" ../workflow/ligand-collections/done/$folder1/$folder2/* 2>/dev/null | awk -F ':' '{print $2}' | sed "/^$/d" |  paste -sd+ | bc -l 2>/dev/null || true)"
-            if [[ -z "${ligands_success_to_add// }" ]]; then
-                ligands_success_to_add=0
-            fi
-            ligands_success=$((ligands_success + ligands_success_to_add))
+    if [ "${status_scanned}" == "false" ]; then
+        ligands_success=0
+        for folder1 in $(find ../workflow/ligand-collections/done/ -mindepth 1 -maxdepth 1 -type d -printf "%f\n"); do
+            for folder2 in $(find ../workflow/ligand-collections/done/$folder1/ -mindepth 1 -maxdepth 1 -type d -printf "%f\n"); do
+                ligands_success_to_add="$(grep -ho "Ligands-succeeded:[0-9]\+" ../workflow/ligand-collections/done/$folder1/$folder2/* 2>/dev/null | awk -F ':' '{print $2}' | sed "/^$/d" |  paste -sd+ | bc -l 2>/dev/null || true)"
+                if [[ -z "${ligands_success_to_add// }" ]]; then
+                    ligands_success_to_add=0
+                fi
+                ligands_success=$((ligands_success + ligands_success_to_add))
+            done
         done
-    done
+    fi
     echo " Number of ligands successfully completed: ${ligands_success}"
 
-    ligands_failed=0
-    for folder1 in $(find ../workflow/ligand-collections/done/ -mindepth 1 -maxdepth 1 -type d -printf "%f\n"); do
-        for folder2 in $(find ../workflow/ligand-collections/done/$folder1/ -mindepth 1 -maxdepth 1 -type d -printf "%f\n"); do
-            ligands_failed_to_add="$(grep -ho "Ligands-failed:[0-9]\+" ../workflow/ligand-collections/done/$folder1/$folder2/* 2>/dev/null | awk -F ':' '{print $2}' | sed "/^$/d" | paste -sd+ | bc -l 2>/dev/null || true)"
-            if [[ -z "${ligands_failed_to_add// }" ]]; then
-                ligands_failed_to_add=0
-            fi
-            ligands_failed=$((ligands_failed + ligands_failed_to_add))
+    if [ "${status_scanned}" == "false" ]; then
+        ligands_failed=0
+        for folder1 in $(find ../workflow/ligand-collections/done/ -mindepth 1 -maxdepth 1 -type d -printf "%f\n"); do
+            for folder2 in $(find ../workflow/ligand-collections/done/$folder1/ -mindepth 1 -maxdepth 1 -type d -printf "%f\n"); do
+                ligands_failed_to_add="$(grep -ho "Ligands-failed:[0-9]\+" ../workflow/ligand-collections/done/$folder1/$folder2/* 2>/dev/null | awk -F ':' '{print $2}' | sed "/^$/d" | paste -sd+ | bc -l 2>/dev/null || true)"
+                if [[ -z "${ligands_failed_to_add// }" ]]; then
+                    ligands_failed_to_add=0
+                fi
+                ligands_failed=$((ligands_failed + ligands_failed_to_add))
+            done
         done
-    done
+    fi
     echo " Number of ligands failed: ${ligands_failed}"
 
     echo
@@ -399,40 +429,46 @@ if [[ "${category}" = "workflow" ]]; then
     echo
     echo " Docking runs per ligand: ${docking_runs_perligand}"
 
-    dockings_started=0
-    for folder1 in $(find ../workflow/ligand-collections/done/ -mindepth 1 -maxdepth 1 -type d -printf "%f\n"); do
-        for folder2 in $(find ../workflow/ligand-collections/done/$folder1/ -mindepth 1 -maxdepth 1 -type d -printf "%f\n"); do
-            dockings_started_to_add="$(grep -ho "Dockings-started:[0-9]\+" ../workflow/ligand-collections/done/$folder1/$folder2/* 2>/dev/null | awk -F ':' '{print $2}' | sed "/^$/d" |  paste -sd+ | bc -l 2>/dev/null || true)"
-            if [[ -z "${dockings_started_to_add// }" ]]; then
-                dockings_started_to_add=0
-            fi
-            dockings_started=$((dockings_started + dockings_started_to_add))
+    if [ "${status_scanned}" == "false" ]; then
+        dockings_started=0
+        for folder1 in $(find ../workflow/ligand-collections/done/ -mindepth 1 -maxdepth 1 -type d -printf "%f\n"); do
+            for folder2 in $(find ../workflow/ligand-collections/done/$folder1/ -mindepth 1 -maxdepth 1 -type d -printf "%f\n"); do
+                dockings_started_to_add="$(grep -ho "Dockings-started:[0-9]\+" ../workflow/ligand-collections/done/$folder1/$folder2/* 2>/dev/null | awk -F ':' '{print $2}' | sed "/^$/d" |  paste -sd+ | bc -l 2>/dev/null || true)"
+                if [[ -z "${dockings_started_to_add// }" ]]; then
+                    dockings_started_to_add=0
+                fi
+                dockings_started=$((dockings_started + dockings_started_to_add))
+            done
         done
-    done
+    fi
     echo " Number of dockings started: ${dockings_started}"
 
-    dockings_success=0
-    for folder1 in $(find ../workflow/ligand-collections/done/ -mindepth 1 -maxdepth 1 -type d -printf "%f\n"); do
-        for folder2 in $(find ../workflow/ligand-collections/done/$folder1/ -mindepth 1 -maxdepth 1 -type d -printf "%f\n"); do
-            dockings_success_to_add="$(grep -ho "Dockings-succeeded:[0-9]\+" ../workflow/ligand-collections/done/$folder1/$folder2/* 2>/dev/null | awk -F ':' '{print $2}' | sed "/^$/d" |  paste -sd+ | bc -l 2>/dev/null || true)"
-            if [[ -z "${dockings_success_to_add// }" ]]; then
-                dockings_success_to_add=0
-            fi
-            dockings_success=$((dockings_success + dockings_success_to_add))
+    if [ "${status_scanned}" == "false" ]; then
+        dockings_success=0
+        for folder1 in $(find ../workflow/ligand-collections/done/ -mindepth 1 -maxdepth 1 -type d -printf "%f\n"); do
+            for folder2 in $(find ../workflow/ligand-collections/done/$folder1/ -mindepth 1 -maxdepth 1 -type d -printf "%f\n"); do
+                dockings_success_to_add="$(grep -ho "Dockings-succeeded:[0-9]\+" ../workflow/ligand-collections/done/$folder1/$folder2/* 2>/dev/null | awk -F ':' '{print $2}' | sed "/^$/d" |  paste -sd+ | bc -l 2>/dev/null || true)"
+                if [[ -z "${dockings_success_to_add// }" ]]; then
+                    dockings_success_to_add=0
+                fi
+                dockings_success=$((dockings_success + dockings_success_to_add))
+            done
         done
-    done
+    fi
     echo " Number of dockings successfully completed: ${dockings_success}"
 
-    dockings_failed=0
-    for folder1 in $(find ../workflow/ligand-collections/done/ -mindepth 1 -maxdepth 1 -type d -printf "%f\n"); do
-        for folder2 in $(find ../workflow/ligand-collections/done/$folder1/ -mindepth 1 -maxdepth 1 -type d -printf "%f\n"); do
-            dockings_failed_to_add="$(grep -ho "Dockings-failed:[0-9]\+" ../workflow/ligand-collections/done/$folder1/$folder2/* 2>/dev/null | awk -F ':' '{print $2}' | sed "/^$/d" | paste -sd+ | bc -l 2>/dev/null || true)"
-            if [[ -z "${dockings_failed_to_add// }" ]]; then
-                dockings_failed_to_add=0
-            fi
-            dockings_failed=$((dockings_failed + dockings_failed_to_add))
+    if [ "${status_scanned}" == "false" ]; then
+        dockings_failed=0
+        for folder1 in $(find ../workflow/ligand-collections/done/ -mindepth 1 -maxdepth 1 -type d -printf "%f\n"); do
+            for folder2 in $(find ../workflow/ligand-collections/done/$folder1/ -mindepth 1 -maxdepth 1 -type d -printf "%f\n"); do
+                dockings_failed_to_add="$(grep -ho "Dockings-failed:[0-9]\+" ../workflow/ligand-collections/done/$folder1/$folder2/* 2>/dev/null | awk -F ':' '{print $2}' | sed "/^$/d" | paste -sd+ | bc -l 2>/dev/null || true)"
+                if [[ -z "${dockings_failed_to_add// }" ]]; then
+                    dockings_failed_to_add=0
+                fi
+                dockings_failed=$((dockings_failed + dockings_failed_to_add))
+            done
         done
-    done
+    fi
     echo " Number of dockings failed: ${dockings_failed}"
 
     echo
@@ -478,6 +514,21 @@ if [[ "${category}" = "vs" ]]; then
                 done
             fi
         fi
+    elif [ "${outputfiles_level}" == "segments" ]; then
+        if [ -d ${folder}/summaries/ ]; then
+            for metatranch in $(ls -A ${folder}/summaries/); do
+                # Tranche archives of compacted segments (vf_compact_segments.py)
+                for file in $(ls -A ${folder}/summaries/${metatranch} | grep "\.tar$" || true); do
+                    tar -xOf ${folder}/summaries/${metatranch}/${file} 2>/dev/null | zcat 2>/dev/null | awk '{print $1, $2, $4}' >> ${tempdir}/summaries.all || true
+                    summary_flag="true"
+                done
+                # Segments which are not compacted yet
+                for file in $(ls -A ${folder}/summaries/${metatranch}/*.segments/*.txt.gz 2>/dev/null || true); do
+                    zcat ${file} 2>/dev/null | awk '{print $1, $2, $4}' >> ${tempdir}/summaries.all 2>/dev/null || true
+                    summary_flag="true"
+                done
+            done
+        fi
     elif [ "${outputfiles_level}" == "collection" ]; then
         for metatranch in $(ls -A ${folder}/summaries/); do
             for tranch in $(ls -A ${folder}/summaries/${metatranch}); do
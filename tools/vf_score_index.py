@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+
+# Copyright (C) 2019 Christoph Gorgulla
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# This file is part of VirtualFlow.
+#
+# VirtualFlow is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# VirtualFlow is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with VirtualFlow.  If not, see <https://www.gnu.org/licenses/>.
+
+# ---------------------------------------------------------------------------
+#
+# Description: Score index of a docking scenario
+#
+#              One SQLite database per docking scenario
+#              (../workflow/scores/<scenario>.db) with the scores of every
+#              docked ligand, indexed by ligand, collection and both scores.
+#              'update' merges only the summary files that are new or changed
+#              since the last update (local output folders or the object
+#              store, see vf_rank.py), so it can be run whenever collections
+#              complete. Top-K, threshold and per-tranche queries walk the
+#              score or collection index and point lookups the primary key,
+#              so they do not depend on the size of the campaign. Ranks and
+#              threshold counts are read from a histogram of the scores (the
+#              number of ligands per score value, which the summary files
+#              give with one decimal) that triggers keep up to date.
+#
+#              Usage:
+#                vf_score_index.py <scenario> update [--s3] [--path <folder>]
+#                vf_score_index.py <scenario> top [-k N]
+#                vf_score_index.py <scenario> threshold <score> [--count]
+#                vf_score_index.py <scenario> tranche <tranche> [-k N]
+#                vf_score_index.py <scenario> lookup <ligand>
+#
+# Revision history:
+# 2026-10-19  Original version
+# 2026-10-19  Schema 2: score histogram for ranks and threshold counts
+#
+# ---------------------------------------------------------------------------
+
+
+import os
+import sys
+import time
+import sqlite3
+import argparse
+import multiprocessing
+from vf_rank import parse_config, parse_summary_lines, open_summary_lines, init_s3_worker, \
+    find_local_summaries, find_s3_summaries, batched, SCORE_COLUMNS
+
+
+SCORE_INDEX_DIR = "../workflow/scores"
+SCHEMA_VERSION = 2
+
+FILES_PER_BATCH = 64
+
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS scores (
+        ligand TEXT NOT NULL,
+        collection TEXT NOT NULL,
+        average REAL NOT NULL,
+        maximum REAL NOT NULL,
+        PRIMARY KEY (ligand, collection)
+    ) WITHOUT ROWID""",
+    "CREATE INDEX IF NOT EXISTS scores_average ON scores (average)",
+    "CREATE INDEX IF NOT EXISTS scores_maximum ON scores (maximum)",
+    "CREATE INDEX IF NOT EXISTS scores_collection ON scores (collection)",
+    # Summary files already merged and the version merged
+    """CREATE TABLE IF NOT EXISTS sources (
+        source TEXT PRIMARY KEY,
+        version TEXT NOT NULL,
+        updated REAL NOT NULL
+    )"""
+]
+
+
+def get_histogram_schema():
+
+    def histogram_delta(row, sign):
+        statements = []
+        for column in SCORE_COLUMNS:
+            # No INSERT OR IGNORE: under the INSERT OR REPLACE of update_index
+            # it would become a REPLACE and reset the count
+            statements.append(
+                f"""INSERT INTO score_counts (score_column, score, ligands)
+                     SELECT '{column}', {row}.{column}, 0 WHERE NOT EXISTS (
+                         SELECT 1 FROM score_counts WHERE score_column = '{column}' AND score = {row}.{column});
+                   UPDATE score_counts SET ligands = ligands {sign} 1
+                     WHERE score_column = '{column}' AND score = {row}.{column};""")
+        return " ".join(statements)
+
+    return [
+        """CREATE TABLE score_counts (
+            score_column TEXT NOT NULL,
+            score REAL NOT NULL,
+            ligands INTEGER NOT NULL,
+            PRIMARY KEY (score_column, score)
+        ) WITHOUT ROWID""",
+        f"CREATE TRIGGER scores_histogram_insert AFTER INSERT ON scores BEGIN {histogram_delta('NEW', '+')} END",
+        f"CREATE TRIGGER scores_histogram_delete AFTER DELETE ON scores BEGIN {histogram_delta('OLD', '-')} END",
+        f"""CREATE TRIGGER scores_histogram_update AFTER UPDATE OF {', '.join(SCORE_COLUMNS)} ON scores
+           BEGIN {histogram_delta('OLD', '-')} {histogram_delta('NEW', '+')} END""",
+    ]
+
+
+def get_index_path(scenario):
+
+    return os.path.join(SCORE_INDEX_DIR, f"{scenario}.db")
+
+
+def open_index(scenario, path=None):
+
+    if(path is None):
+        os.makedirs(SCORE_INDEX_DIR, exist_ok=True)
+        path = get_index_path(scenario)
+
+    conn = sqlite3.connect(path, timeout=60)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute("PRAGMA busy_timeout = 60000")
+    # INSERT OR REPLACE has to run the delete trigger of the histogram
+    conn.execute("PRAGMA recursive_triggers = ON")
+
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if(version > SCHEMA_VERSION):
+        raise RuntimeError(
+            f"Score index schema version {version} is newer than this tool supports ({SCHEMA_VERSION})")
+    if(version < 1):
+        with conn:
+            for statement in SCHEMA:
+                conn.execute(statement)
+            conn.execute("PRAGMA user_version = 1")
+    if(version < 2):
+        with conn:
+            for statement in get_histogram_schema():
+                conn.execute(statement)
+            # Fill the histogram from the existing scores once
+            for column in SCORE_COLUMNS:
+                conn.execute(f"""INSERT INTO score_counts (score_column, score, ligands)
+                                  SELECT '{column}', {column}, COUNT(*) FROM scores GROUP BY {column}""")
+            conn.execute("PRAGMA user_version = 2")
+
+    return conn
+
+
+def get_source_name(source):
+
+    source_type, location = source[:2]
+    if(source_type == "s3"):
+        return f"s3://{location[0]}/{location[1]}"
+    return location
+
+
+# Ingest
+
+def parse_batch(sources):
+
+    results = []
+
+    for source in sources:
+        try:
+            rows = list(parse_summary_lines(open_summary_lines(source)))
+        except Exception as err:
+            print(f"Error reading {source[1]}: {err}")
+            continue
+        results.append((get_source_name(source), source[2], rows))
+
+    return results
+
+
+def get_changed_sources(conn, sources):
+
+    # Read up front, the pool consumes the sources from its own thread
+    versions = dict(conn.execute("SELECT source, version FROM sources"))
+
+    return (source for source in sources if versions.get(get_source_name(source)) != source[2])
+
+
+def update_index(conn, sources, processes, initializer=None):
+
+    counts = {'files': 0, 'ligands': 0}
+
+    # Each source and its ligands go in together, so an interrupted update
+    # just picks up the remaining files the next time
+
+    with multiprocessing.Pool(processes=processes, initializer=initializer) as pool:
+        for results in pool.imap_unordered(parse_batch, batched(get_changed_sources(conn, sources), FILES_PER_BATCH)):
+            with conn:
+                for source_name, version, rows in results:
+                    conn.executemany("INSERT OR REPLACE INTO scores (collection, ligand, average, maximum) VALUES (?, ?, ?, ?)",
+                                     rows)
+                    conn.execute("INSERT OR REPLACE INTO sources (source, version, updated) VALUES (?, ?, ?)",
+                                 (source_name, version, time.time()))
+                    counts['files'] += 1
+                    counts['ligands'] += len(rows)
+
+    return counts
+
+
+# Queries
+
+def get_order(score, highest_first):
+
+    if(score not in SCORE_COLUMNS):
+        raise ValueError(f"Unknown score column '{score}'")
+
+    return f"{score} {'DESC' if highest_first else 'ASC'}"
+
+
+def get_top(conn, top_k, score="maximum", highest_first=False):
+
+    return conn.execute(f"SELECT * FROM scores ORDER BY {get_order(score, highest_first)} LIMIT ?",
+                        (top_k,)).fetchall()
+
+
+def get_threshold(conn, threshold, score="maximum", highest_first=False, limit=None):
+
+    comparison = ">=" if highest_first else "<="
+    return conn.execute(f"SELECT * FROM scores WHERE {score} {comparison} ? ORDER BY {get_order(score, highest_first)} LIMIT ?",
+                        (threshold, -1 if limit is None else limit)).fetchall()
+
+
+# Number of ligands with a score for which the comparison holds, from the
+# histogram (a few hundred score values instead of every ligand)
+
+def count_scores(conn, score, comparison, value):
+
+    return conn.execute(f"SELECT COALESCE(SUM(ligands), 0) FROM score_counts WHERE score_column = ? AND score {comparison} ?",
+                        (score, value)).fetchone()[0]
+
+
+def get_threshold_count(conn, threshold, score="maximum", highest_first=False):
+
+    get_order(score, highest_first)
+    return count_scores(conn, score, ">=" if highest_first else "<=", threshold)
+
+
+def get_tranche(conn, tranche, top_k=None, score="maximum", highest_first=False):
+
+    # Collections of a tranche are '<tranche>_<number>', and '`' follows '_'
+    return conn.execute(f"SELECT * FROM scores WHERE collection >= ? AND collection < ? ORDER BY {get_order(score, highest_first)} LIMIT ?",
+                        (f"{tranche}_", f"{tranche}`", -1 if top_k is None else top_k)).fetchall()
+
+
+def get_ligand(conn, ligand, score="maximum", highest_first=False):
+
+    get_order(score, highest_first)
+
+    results = []
+
+    comparison = ">" if highest_first else "<"
+    for row in conn.execute("SELECT * FROM scores WHERE ligand = ?", (ligand,)).fetchall():
+        rank = count_scores(conn, score, comparison, row[score]) + 1
+        results.append((row, rank))
+
+    return results
+
+
+def print_rows(rows, score):
+
+    print("      Rank       Ligand           Collection       Score")
+    for rank, row in enumerate(rows, start=1):
+        print(f"    {rank:5d}    {row['ligand']:>10s}     {row['collection']}            {row[score]:5.1f}")
+
+
+def main():
+
+    parser = argparse.ArgumentParser(
+        description="Maintain and query the score index of a docking scenario")
+    parser.add_argument("scenario", help="docking scenario name")
+    parser.add_argument("--score", choices=sorted(SCORE_COLUMNS), default="maximum",
+                        help="score column to rank by (default: maximum)")
+    parser.add_argument("--highest-first", action="store_true",
+                        help="rank higher scores first")
+    parser.add_argument("--index", help="path of the index database")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    update_parser = subparsers.add_parser("update", help="merge new and changed summary files")
+    update_parser.add_argument("--s3", action="store_true",
+                               help="read the summaries from the object store instead of ../output-files")
+    update_parser.add_argument("--path", action="append",
+                               help="local folder with summaries (can be repeated)")
+    update_parser.add_argument("--processes", type=int, default=os.cpu_count(),
+                               help="number of parsing processes")
+
+    top_parser = subparsers.add_parser("top", help="best ligands")
+    top_parser.add_argument("-k", "--top", type=int, default=100)
+
+    threshold_parser = subparsers.add_parser("threshold", help="ligands scoring at least as well as a threshold")
+    threshold_parser.add_argument("threshold", type=float)
+    threshold_parser.add_argument("-k", "--top", type=int, help="report at most this many ligands")
+    threshold_parser.add_argument("--count", action="store_true", help="only print the number of ligands")
+
+    tranche_parser = subparsers.add_parser("tranche", help="ligands of a tranche")
+    tranche_parser.add_argument("tranche")
+    tranche_parser.add_argument("-k", "--top", type=int)
+
+    lookup_parser = subparsers.add_parser("lookup", help="scores and rank of a ligand")
+    lookup_parser.add_argument("ligand")
+
+    args = parser.parse_args()
+
+    conn = open_index(args.scenario, args.index)
+
+    if(args.command == "update"):
+        if(args.s3):
+            config = parse_config("../workflow/control/all.ctrl")
+            sources = find_s3_summaries(config, args.scenario)
+            initializer = init_s3_worker
+        else:
+            folders = args.path or [
+                f"../output-files/complete/{args.scenario}/summaries",
+                f"../output-files/incomplete/{args.scenario}/summaries"
+            ]
+            sources = (source for folder in folders for source in find_local_summaries(folder))
+            initializer = None
+
+        counts = update_index(conn, sources, args.processes, initializer)
+        print(f"Merged {counts['files']} summary files ({counts['ligands']} ligands) into {args.index or get_index_path(args.scenario)}")
+
+    elif(args.command == "top"):
+        print_rows(get_top(conn, args.top, args.score, args.highest_first), args.score)
+
+    elif(args.command == "threshold"):
+        if(args.count):
+            print(get_threshold_count(conn, args.threshold, args.score, args.highest_first))
+        else:
+            print_rows(get_threshold(conn, args.threshold, args.score, args.highest_first, args.top), args.score)
+
+    elif(args.command == "tranche"):
+        print_rows(get_tranche(conn, args.tranche, args.top, args.score, args.highest_first), args.score)
+
+    elif(args.command == "lookup"):
+        results = get_ligand(conn, args.ligand, args.score, args.highest_first)
+        if(len(results) == 0):
+            print(f"Ligand {args.ligand} is not in the index")
+            conn.close()
+            sys.exit(1)
+        for row, rank in results:
+            print(f"{row['ligand']} {row['collection']} average-score {row['average']:3.1f} maximum-score {row['maximum']:3.1f} rank {rank}")
+
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+
+# Copyright (C) 2019 Christoph Gorgulla
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# This file is part of VirtualFlow.
+#
+# VirtualFlow is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or
+# (at your option) any later version.
+#
+# VirtualFlow is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with VirtualFlow.  If not, see <https://www.gnu.org/licenses/>.
+
+# ---------------------------------------------------------------------------
+#
+# Description: Collection, ligand and docking counts of the HPC workflow
+#
+#              Computes the figures of the workflow status of vf_report.sh
+#              from ../workflow/ligand-collections/{done,current,todo}. The
+#              queue folders are scanned in parallel with os.scandir, and the
+#              counts of each file are cached with its modification time and
+#              size (../workflow/ligand-collections/var/status-cache.json), so
+#              repeated reports only read the files which changed since the
+#              last one. Collections in the todo list of the dispatcher
+#              (vf_dispatcher.py) are counted as not yet started.
+#
+#              Usage:
+#                vf_workflow_status.py [--shell] [--threads N] [--no-cache]
+#
+#              --shell prints the figures as shell assignments for
+#              vf_report.sh.
+#
+# Revision history:
+# 2026-10-19  Original version
+#
+# ---------------------------------------------------------------------------
+
+
+import os
+import re
+import sys
+import json
+import sqlite3
+import argparse
+import collections
+import concurrent.futures
+
+import vf_dispatcher
+
+
+COLLECTIONS_DIR = "../workflow/ligand-collections"
+CACHE_PATH = f"{COLLECTIONS_DIR}/var/status-cache.json"
+THREADS = 8
+
+DONE_COUNTERS = ["Ligands-started", "Ligands-succeeded", "Ligands-failed",
+                 "Dockings-started", "Dockings-succeeded", "Dockings-failed"]
+DONE_PATTERN = re.compile(r'(?P<counter>' + "|".join(DONE_COUNTERS) + r'):(?P<value>[0-9]+)')
+TODO_ALL_PATTERN = re.compile(r'todo\.all\.[0-9].*')
+ORIGINAL_PATTERN = re.compile(r'todo\.original')
+
+
+def count_lines(content):
+
+    # Same as grep -c "": a last line without a newline is counted too
+    return content.count("\n") + (1 if content and not content.endswith("\n") else 0)
+
+
+def read_counts(kind, path):
+
+    with open(path, "r", errors="replace") as read_file:
+        content = read_file.read()
+
+    counts = {'lines': count_lines(content)}
+
+    if(kind == "done"):
+        for counter in DONE_COUNTERS:
+            counts[counter] = 0
+        for match in DONE_PATTERN.finditer(content):
+            counts[match.group('counter')] += int(match.group('value'))
+
+    elif(kind == "current"):
+        # Collections held by the queue (as awk -F '.' '{print $1}')
+        counts['collections'] = [line.split(".", 1)[0] for line in content.splitlines() if line.strip() != ""]
+
+    elif(kind == "original"):
+        counts['ligands'] = 0
+        for line in content.splitlines():
+            fields = line.split()
+            if(len(fields) >= 2 and fields[1].isdigit()):
+                counts['ligands'] += int(fields[1])
+
+    return counts
+
+
+def scan_folder(kind, folder, cache, name_pattern=None):
+
+    # Returns {path: [mtime_ns, size, counts]} of the files in the folder
+    results = {}
+
+    try:
+        entries = list(os.scandir(folder))
+    except OSError:
+        return results
+
+    for entry in entries:
+        if(name_pattern is not None and not name_pattern.fullmatch(entry.name)):
+            continue
+        try:
+            if not entry.is_file():
+                continue
+            stat = entry.stat()
+        except OSError:
+            continue
+        cached = cache.get(entry.path)
+        if(cached is not None and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size):
+            results[entry.path] = cached
+            continue
+        try:
+            results[entry.path] = [stat.st_mtime_ns, stat.st_size, read_counts(kind, entry.path)]
+        except OSError:
+            continue
+
+    return results
+
+
+def get_queue_folders(kind_dir):
+
+    # Files are in <kind>/<queue_no_1>/<queue_no_2>/<queue_no>
+    folders = []
+    for level1 in os.scandir(kind_dir) if os.path.isdir(kind_dir) else []:
+        if not level1.is_dir():
+            continue
+        for level2 in os.scandir(level1.path):
+            if level2.is_dir():
+                folders.append(level2.path)
+
+    return folders
+
+
+def read_cache(cache_path):
+
+    try:
+        with open(cache_path, "r") as read_file:
+            return json.load(read_file)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_cache(cache_path, cache):
+
+    try:
+        with open(f"{cache_path}.tmp", "w") as write_file:
+            json.dump(cache, write_file)
+        os.replace(f"{cache_path}.tmp", cache_path)
+    except OSError as err:
+        print(f"Could not write the status cache {cache_path}: {err}", file=sys.stderr)
+
+
+def get_dispatcher_pending(collections_dir):
+
+    path = f"{collections_dir}/todo/dispatcher.db"
+    if not os.path.isfile(path):
+        return 0
+
+    try:
+        conn = vf_dispatcher.open_dispatcher(path)
+        try:
+            return vf_dispatcher.get_status(conn)['pending_collections']
+        finally:
+            conn.close()
+    except (sqlite3.Error, RuntimeError):
+        return 0
+
+
+def get_workflow_status(collections_dir=COLLECTIONS_DIR, cache_path=CACHE_PATH, threads=THREADS):
+
+    cache = read_cache(cache_path) if cache_path else {}
+
+    folders = [(kind, folder, None) for kind in ["done", "current", "todo"]
+               for folder in get_queue_folders(f"{collections_dir}/{kind}")]
+    # The split central todo lists (todo.all.[0-9]*) and the complete list
+    folders.append(("todo.all", f"{collections_dir}/todo", TODO_ALL_PATTERN))
+    folders.append(("original", f"{collections_dir}/var", ORIGINAL_PATTERN))
+
+    files = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(threads, 1)) as executor:
+        futures = {executor.submit(scan_folder, kind, folder, cache, name_pattern): kind
+                   for kind, folder, name_pattern in folders}
+        for future in concurrent.futures.as_completed(futures):
+            kind = futures[future]
+            for path, entry in future.result().items():
+                files[path] = (kind, entry)
+
+    status = {
+        'collections_total': 0,
+        'ligands_total': 0,
+        'collections_completed': 0,
+        'collections_processing': 0,
+        'collections_todo': get_dispatcher_pending(collections_dir),
+        'collections_multiple_queues': 0
+    }
+    for counter in DONE_COUNTERS:
+        status[counter] = 0
+
+    held = collections.Counter()
+    for path, (kind, (mtime, size, counts)) in files.items():
+        if(kind == "done"):
+            status['collections_completed'] += counts['lines']
+            for counter in DONE_COUNTERS:
+                status[counter] += counts[counter]
+        elif(kind == "current"):
+            status['collections_processing'] += counts['lines']
+            held.update(counts['collections'])
+        elif(kind == "original"):
+            status['collections_total'] = counts['lines']
+            status['ligands_total'] = counts['ligands']
+        else:
+            status['collections_todo'] += counts['lines']
+    status['collections_multiple_queues'] = sum(1 for count in held.values() if count > 1)
+
+    if(cache_path):
+        write_cache(cache_path, {path: entry for path, (kind, entry) in files.items()})
+
+    return status
+
+
+def get_shell_names(status):
+
+    # Variable names used by vf_report.sh
+    return {
+        'ligand_collections_total': status['collections_total'],
+        'ligand_collections_completed': status['collections_completed'],
+        'ligand_collections_processing': status['collections_processing'],
+        'ligand_collections_todo': status['collections_todo'],
+        'ligand_collections_multiple_queues': status['collections_multiple_queues'],
+        'ligands_total': status['ligands_total'],
+        'ligands_started': status['Ligands-started'],
+        'ligands_success': status['Ligands-succeeded'],
+        'ligands_failed': status['Ligands-failed'],
+        'dockings_started': status['Dockings-started'],
+        'dockings_success': status['Dockings-succeeded'],
+        'dockings_failed': status['Dockings-failed']
+    }
+
+
+def main():
+
+    parser = argparse.ArgumentParser(
+        description="Collection, ligand and docking counts of the workflow")
+    parser.add_argument("--shell", action="store_true",
+                        help="print the counts as shell assignments (used by vf_report.sh)")
+    parser.add_argument("--threads", type=int, default=THREADS,
+                        help=f"folders scanned at the same time (default: {THREADS})")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="read all files and do not use or update the cache")
+    args = parser.parse_args()
+
+    status = get_workflow_status(cache_path=None if args.no_cache else CACHE_PATH, threads=args.threads)
+
+    if(args.shell):
+        for name, value in get_shell_names(status).items():
+            print(f"{name}={value}")
+        return
+
+    print(f" Total number of ligand collections: {status['collections_total']}")
+    print(f" Number of ligand collections completed: {status['collections_completed']}")
+    print(f" Number of ligand collections in state \"processing\": {status['collections_processing']}")
+    print(f" Number of ligand collections not yet started: {status['collections_todo']}")
+    print(f" Number of collections which are currently assigned to more than one queue: {status['collections_multiple_queues']}")
+    print(f" Total number of ligands: {status['ligands_total']}")
+    print(f" Number of ligands started: {status['Ligands-started']}")
+    print(f" Number of ligands successfully completed: {status['Ligands-succeeded']}")
+    print(f" Number of ligands failed: {status['Ligands-failed']}")
+    print(f" Number of dockings started: {status['Dockings-started']}")
+    print(f" Number of dockings successfully completed: {status['Dockings-succeeded']}")
+    print(f" Number of dockings failed: {status['Dockings-failed']}")
+
+
+if __name__ == '__main__':
+    main()